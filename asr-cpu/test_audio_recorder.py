@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+import wave
+
+import numpy as np
+
+from audio_recorder import AudioRecorder, FileInputDevice, RingBuffer
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wraps_around(self):
+        """Reads return frames in write order across the end of the buffer."""
+        ring = RingBuffer(8)
+        ring.write(np.arange(6, dtype=np.int16).tobytes())
+        self.assertEqual(np.frombuffer(ring.read(4), dtype=np.int16).tolist(), [0, 1, 2, 3])
+        # Positions 6, 7, then 0..3 again
+        ring.write(np.arange(6, 12, dtype=np.int16).tobytes())
+        self.assertEqual(ring.available, 8)
+        self.assertEqual(np.frombuffer(ring.read(8), dtype=np.int16).tolist(), list(range(4, 12)))
+        self.assertEqual(ring.overruns, 0)
+
+    def test_overrun_drops_newest_frames(self):
+        """A write larger than the free space keeps the unread frames and counts what was dropped."""
+        ring = RingBuffer(4)
+        ring.write(np.arange(3, dtype=np.int16).tobytes())
+        ring.write(np.arange(3, 6, dtype=np.int16).tobytes())
+        self.assertEqual(ring.overruns, 1)
+        self.assertEqual(ring.dropped_frames, 2)
+        self.assertEqual(np.frombuffer(ring.read(4), dtype=np.int16).tolist(), [0, 1, 2, 3])
+
+    def test_underrun_on_timeout(self):
+        """A read that times out short of the requested frames counts an underrun and returns what there is."""
+        ring = RingBuffer(8)
+        ring.write(np.arange(2, dtype=np.int16).tobytes())
+        self.assertEqual(np.frombuffer(ring.read(4, timeout=0.01), dtype=np.int16).tolist(), [0, 1])
+        self.assertEqual(ring.underruns, 1)
+        self.assertEqual(ring.read(4), b'')
+
+class TestFileInputRecording(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmpdir.name, "input.wav")
+        self.output_path = os.path.join(self.tmpdir.name, "output.wav")
+        # One second of a 440 Hz tone
+        t = np.arange(16000) / 16000
+        self.samples = (np.sin(2 * np.pi * 440 * t) * 10000).astype(np.int16)
+        with wave.open(self.input_path, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(self.samples.tobytes())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        """Audio replayed through FileInputDevice is recorded and saved unchanged."""
+        recorder = AudioRecorder(chunk_size=512, audio=FileInputDevice(self.input_path, realtime=False))
+        recorder.start_recording()
+        self.assertAlmostEqual(recorder.duration, 1.0)
+        self.assertEqual(recorder.stats['overruns'], 0)
+        self.assertEqual(recorder.stats['dropped_frames'], 0)
+
+        self.assertTrue(recorder.save_recording(self.output_path))
+        with wave.open(self.output_path, 'rb') as wf:
+            self.assertEqual(wf.getframerate(), 16000)
+            recorded = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        np.testing.assert_array_equal(recorded, self.samples)
+
+if __name__ == "__main__":
+    unittest.main()
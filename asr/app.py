@@ -2,16 +2,26 @@ import nemo.collections.asr as nemo_asr
 import gradio as gr
 import soundfile as sf
 import numpy as np
-import os
-import tempfile
 import logging
+import os
+import time
+import types
+from functools import lru_cache
+from math import gcd
 import torch
-import librosa # For audio resampling
+from scipy import signal # For polyphase resampling filters
 
 # --- Configuration ---
 MODEL_NAME = "nvidia/parakeet-tdt-0.6b-v2"
 TARGET_SAMPLE_RATE = 16000  # Expected sample rate by the model
-TEMP_AUDIO_DIR = "temp_audio" # Directory to store temporary audio files
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "16"))  # Max queued requests run in one forward pass
+QUEUE_MAX_SIZE = int(os.environ.get("QUEUE_MAX_SIZE", "256"))  # Requests waiting before new ones are rejected
+# Clips longer than this are transcribed in overlapping chunks so GPU memory stays bounded
+LONG_AUDIO_THRESHOLD_S = float(os.environ.get("LONG_AUDIO_THRESHOLD_S", "300"))
+CHUNK_LENGTH_S = float(os.environ.get("CHUNK_LENGTH_S", "120"))
+CHUNK_OVERLAP_S = float(os.environ.get("CHUNK_OVERLAP_S", "10"))
+CHUNK_BATCH_SIZE = int(os.environ.get("CHUNK_BATCH_SIZE", "4"))  # Chunks per forward pass
+DECODE_BLOCK_FRAMES = 65536  # Frames read from soundfile per block while decoding uploads
 
 # --- Setup Logging ---
 logging.basicConfig(
@@ -20,18 +30,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- Ensure Temporary Directory Exists ---
-if not os.path.exists(TEMP_AUDIO_DIR):
-    try:
-        os.makedirs(TEMP_AUDIO_DIR)
-        logger.info(f"Created temporary audio directory: {TEMP_AUDIO_DIR}")
-    except OSError as e:
-        logger.error(f"Could not create temporary audio directory {TEMP_AUDIO_DIR}: {e}")
-        # Fallback to system's default temp directory if custom one fails
-        TEMP_AUDIO_DIR = tempfile.gettempdir()
-        logger.info(f"Using system default temporary directory: {TEMP_AUDIO_DIR}")
-
-
 # --- GPU Check ---
 if torch.cuda.is_available():
     GPU_NAME = torch.cuda.get_device_name(0)
@@ -65,130 +63,329 @@ def format_timestamps_display(timestamps_dict):
         formatted_lines.append(f"[{start:>6.2f}s - {end:>6.2f}s]: {word}")
     return "\n".join(formatted_lines)
 
-def transcribe_audio_input(audio_source_type, audio_input_data):
+@lru_cache(maxsize=None)
+def polyphase_filter(up, down):
+    """
+    Designs the anti-aliasing FIR for an up/down rate change once per ratio.
+    Same filter as scipy.signal.resample_poly's default Kaiser window.
+    Returns (taps, delay) where delay is the filter's group delay in
+    upsampled samples.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * up
+    return h.astype(np.float32), half_len
+
+class PolyphaseResampler:
+    """
+    Streaming polyphase resampler. Feed it consecutive blocks with
+    ``process`` and finish with ``process(..., final=True)``; the
+    concatenated output matches scipy.signal.resample_poly on the whole
+    signal, but only one filter length of input history is kept.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        g = gcd(int(orig_sr), int(target_sr))
+        self.up = int(target_sr) // g
+        self.down = int(orig_sr) // g
+        self.h, self.delay = polyphase_filter(self.up, self.down)
+        self.taps = -(-len(self.h) // self.up)  # Input samples under the filter per output
+        # Each block is filtered from an input index s0 with s0 * up == delay (mod down),
+        # so upfirdn's output grid lines up with the global output grid.
+        self.align = (self.delay * pow(self.up, -1, self.down)) % self.down if self.down > 1 else 0
+        # Start with zero history: it stands in for the signal before t=0.
+        self.history = np.zeros(self.taps + self.down, dtype=np.float32)
+        self.consumed = 0  # Input samples received so far
+        self.produced = 0  # Output samples emitted so far
+
+    def process(self, block, final=False):
+        block = np.asarray(block, dtype=np.float32)
+        x = np.concatenate((self.history, block))
+        base = self.consumed - len(self.history)  # Input index of x[0]
+        self.consumed += len(block)
+        self.history = x[-(self.taps + self.down):]
+
+        if final:
+            end = -(-self.consumed * self.up // self.down)
+        else:
+            # Outputs whose newest input sample has already arrived
+            end = max(self.produced, (self.consumed * self.up - 1 - self.delay) // self.down + 1)
+        if end == self.produced:
+            return np.zeros(0, dtype=np.float32)
+
+        newest = (self.produced * self.down + self.delay) // self.up
+        earliest = newest - self.taps + 1
+        s0 = earliest - ((earliest - self.align) % self.down)
+        first_output = (s0 * self.up - self.delay) // self.down  # Output index of upfirdn's y[0]
+        y = signal.upfirdn(self.h, x[s0 - base:], self.up, self.down)
+        y = y[self.produced - first_output:end - first_output]
+        self.produced = end
+        return y.astype(np.float32, copy=False)
+
+def resample_audio(audio_np_array, original_sr, target_sr=TARGET_SAMPLE_RATE):
+    """One-shot polyphase resampling with the cached filter bank."""
+    if original_sr == target_sr:
+        return audio_np_array
+    return PolyphaseResampler(original_sr, target_sr).process(audio_np_array, final=True)
+
+def to_model_audio(audio_np_array, original_sr):
+    """
+    Converts a decoded audio array into what the model expects:
+    float32 in [-1, 1], mono, TARGET_SAMPLE_RATE.
+    Multi-channel input is expected as (samples, channels).
+    """
+    if np.issubdtype(audio_np_array.dtype, np.integer):
+        # Gradio's microphone component returns integer PCM; scale to [-1, 1]
+        # the same way soundfile does when it reads a PCM WAV back.
+        audio_np_array = audio_np_array.astype(np.float32) / -np.iinfo(audio_np_array.dtype).min
+    else:
+        audio_np_array = audio_np_array.astype(np.float32, copy=False)
+
+    # Ensure mono
+    if audio_np_array.ndim > 1:
+        audio_np_array = audio_np_array.mean(axis=1) # Average channels for mono
+
+    if original_sr != TARGET_SAMPLE_RATE:
+        logger.info(f"Resampling audio from {original_sr}Hz to {TARGET_SAMPLE_RATE}Hz...")
+        audio_np_array = resample_audio(audio_np_array, original_sr)
+
+    return np.ascontiguousarray(audio_np_array, dtype=np.float32)
+
+def load_uploaded_audio(uploaded_file_path):
+    """
+    Decodes an uploaded file in a single pass: blocks are streamed from
+    soundfile, downmixed and resampled as they arrive, so only the final
+    16kHz mono buffer is ever held in full.
     """
-    Handles audio transcription from microphone or file upload.
+    original_sr = sf.info(uploaded_file_path).samplerate
+    resampler = PolyphaseResampler(original_sr, TARGET_SAMPLE_RATE) if original_sr != TARGET_SAMPLE_RATE else None
+    if resampler:
+        logger.info(f"Resampling uploaded file from {original_sr}Hz to {TARGET_SAMPLE_RATE}Hz...")
+
+    pieces = []
+    for block in sf.blocks(uploaded_file_path, blocksize=DECODE_BLOCK_FRAMES, dtype="float32", always_2d=True):
+        mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+        pieces.append(resampler.process(mono) if resampler else mono)
+    if resampler:
+        pieces.append(resampler.process(np.zeros(0, dtype=np.float32), final=True))
+
+    if not pieces:
+        return np.zeros(0, dtype=np.float32)
+    return np.ascontiguousarray(np.concatenate(pieces), dtype=np.float32)
+
+def prepare_audio_input(audio_source_type, audio_input_data):
+    """
+    Turns one Gradio input into a model-ready array.
     audio_source_type: "microphone" or "upload"
     audio_input_data: For "microphone", it's (sample_rate, numpy_array).
                        For "upload", it's a Gradio File object (tempfile wrapper).
+    Returns (audio, label, error); exactly one of audio/error is None.
     """
-    if asr_model is None:
-        logger.error("transcribe_audio_input called but ASR model is not loaded.")
-        return "ASR Model not loaded. Please check server logs.", ""
-
-    filepath_to_transcribe = None
-    # Path for a temporary file that might be created and should be deleted.
-    temp_file_to_delete_path = None
-
-    try:
-        if audio_source_type == "microphone" and audio_input_data is not None:
-            original_sr, audio_np_array = audio_input_data
-            logger.info(f"Received audio from microphone. Original SR: {original_sr}, Shape: {audio_np_array.shape}")
-
-            if audio_np_array is None or audio_np_array.size == 0:
-                return "Empty audio received from microphone.", ""
-
-            # Ensure mono
-            if audio_np_array.ndim > 1 and audio_np_array.shape[1] > 1:
-                audio_np_array = np.mean(audio_np_array, axis=1) # Average channels for mono
-                logger.info("Converted stereo microphone input to mono.")
-
-            # Create a temporary WAV file to store the processed audio
-            temp_fd, temp_file_to_delete_path = tempfile.mkstemp(suffix=".wav", dir=TEMP_AUDIO_DIR)
-            os.close(temp_fd) # Close descriptor, soundfile/librosa will handle the file by path
-
-            # Write (potentially resampled) audio to the temp file
-            current_audio_data = audio_np_array
-            current_sample_rate = original_sr
-
-            if original_sr != TARGET_SAMPLE_RATE:
-                logger.info(f"Resampling microphone audio from {original_sr}Hz to {TARGET_SAMPLE_RATE}Hz...")
-                try:
-                    current_audio_data = librosa.resample(y=audio_np_array.astype(np.float32), orig_sr=original_sr, target_sr=TARGET_SAMPLE_RATE)
-                    current_sample_rate = TARGET_SAMPLE_RATE
-                    logger.info("Resampling successful.")
-                except Exception as e:
-                    logger.error(f"Error during librosa resampling: {e}", exc_info=True)
-                    # Fallback to using original audio if resampling fails, NeMo might handle it.
-                    # Or, return error: return f"Error resampling audio: {e}", ""
-
-            sf.write(temp_file_to_delete_path, current_audio_data, current_sample_rate)
-            filepath_to_transcribe = temp_file_to_delete_path
-            logger.info(f"Processed microphone audio saved to temporary file: {filepath_to_transcribe}")
-
-
-        elif audio_source_type == "upload" and audio_input_data is not None:
-            uploaded_file_path = audio_input_data.name # .name gives the path to the temp file Gradio creates
-            logger.info(f"Received audio file for upload: {uploaded_file_path}")
-
-            # Check file extension (basic check)
-            if not (uploaded_file_path.lower().endswith(".wav") or uploaded_file_path.lower().endswith(".flac")):
-                return "Invalid file type. Please upload a .wav or .flac file.", ""
-
-            # Create a local temporary copy to ensure correct processing (especially resampling if needed)
-            # This also helps avoid issues with Gradio's temp file lifecycle if processing is long.
-            temp_fd, temp_file_to_delete_path = tempfile.mkstemp(suffix=os.path.splitext(uploaded_file_path)[1], dir=TEMP_AUDIO_DIR)
-            os.close(temp_fd)
-            import shutil
-            shutil.copy(uploaded_file_path, temp_file_to_delete_path)
-            filepath_to_transcribe = temp_file_to_delete_path
-
-            # Optional: Resample uploaded file if not already 16kHz.
-            # This adds robustness but also processing time.
-            try:
-                y, sr = librosa.load(filepath_to_transcribe, sr=None, mono=False) # Load with original SR and channels
-                if y.ndim > 1: # if stereo
-                    y = librosa.to_mono(y)
-                if sr != TARGET_SAMPLE_RATE:
-                    logger.info(f"Resampling uploaded file from {sr}Hz to {TARGET_SAMPLE_RATE}Hz...")
-                    y = librosa.resample(y=y, orig_sr=sr, target_sr=TARGET_SAMPLE_RATE)
-                    sf.write(filepath_to_transcribe, y, TARGET_SAMPLE_RATE)
-                    logger.info(f"Resampled uploaded file saved to: {filepath_to_transcribe}")
-            except Exception as e:
-                logger.error(f"Could not process/resample uploaded file {filepath_to_transcribe}: {e}", exc_info=True)
-                return f"Error processing uploaded file: {e}", ""
-        else:
-            return "No audio input provided or source type is invalid.", "", ""
-
-        if not filepath_to_transcribe:
-             return "Audio file path could not be determined.", "", ""
+    if audio_source_type == "microphone" and audio_input_data is not None:
+        original_sr, audio_np_array = audio_input_data
+
+        if audio_np_array is None or audio_np_array.size == 0:
+            return None, None, "Empty audio received from microphone."
+
+        logger.info(f"Received audio from microphone. Original SR: {original_sr}, Shape: {audio_np_array.shape}")
+        audio = to_model_audio(audio_np_array, original_sr)
+        source_label = "microphone input"
+
+    elif audio_source_type == "upload" and audio_input_data is not None:
+        uploaded_file_path = audio_input_data.name # .name gives the path to the temp file Gradio creates
+        logger.info(f"Received audio file for upload: {uploaded_file_path}")
+
+        # Check file extension (basic check)
+        if not (uploaded_file_path.lower().endswith(".wav") or uploaded_file_path.lower().endswith(".flac")):
+            return None, None, "Invalid file type. Please upload a .wav or .flac file."
+
+        try:
+            audio = load_uploaded_audio(uploaded_file_path)
+        except Exception as e:
+            logger.error(f"Could not process/resample uploaded file {uploaded_file_path}: {e}", exc_info=True)
+            return None, None, f"Error processing uploaded file: {e}"
+        source_label = uploaded_file_path
+    else:
+        return None, None, "No audio input provided or source type is invalid."
 
-        logger.info(f"Starting transcription for: {filepath_to_transcribe}")
-        # Perform transcription
-        # The model card indicates timestamps=True is default for word, segment, char.
-        transcription_results = asr_model.transcribe([filepath_to_transcribe], timestamps=True)
+    if audio.size == 0:
+        return None, None, "Audio contained no samples."
 
-        if not transcription_results or len(transcription_results) == 0:
-            logger.warning(f"Transcription for {filepath_to_transcribe} yielded no results.")
-            return "Transcription failed or produced no output.", ""
+    return audio, source_label, None
 
-        first_result = transcription_results[0]
-        transcribed_text = first_result.text
-        word_timestamps_dict = first_result.timestamp  # This is the dictionary containing 'word', 'char', 'segment'
+def format_transcription_result(result, source_label):
+    """Extracts (text, formatted timestamps) from one NeMo Hypothesis."""
+    transcribed_text = result.text
+    word_timestamps_dict = result.timestamp  # This is the dictionary containing 'word', 'char', 'segment'
 
-        formatted_timestamps = format_timestamps_display(word_timestamps_dict)
+    formatted_timestamps = format_timestamps_display(word_timestamps_dict)
 
-        if transcribed_text:
-            logger.info(f"Transcription successful for {filepath_to_transcribe}. Text: '{transcribed_text[:100]}...'")
-        else:
-            logger.info(f"Transcription for {filepath_to_transcribe} resulted in empty text.")
-            if not formatted_timestamps: # if text is empty, timestamps might also be empty
-                formatted_timestamps = "Transcription was empty."
+    if transcribed_text:
+        logger.info(f"Transcription successful for {source_label}. Text: '{transcribed_text[:100]}...'")
+    else:
+        logger.info(f"Transcription for {source_label} resulted in empty text.")
+        if not formatted_timestamps: # if text is empty, timestamps might also be empty
+            formatted_timestamps = "Transcription was empty."
+
+    return transcribed_text, formatted_timestamps
+
+def iter_chunk_bounds(num_samples, chunk_samples, overlap_samples):
+    """Yields (start, end) sample indices of overlapping chunks covering the whole clip."""
+    step = chunk_samples - overlap_samples
+    if step <= 0:
+        raise ValueError("CHUNK_OVERLAP_S must be smaller than CHUNK_LENGTH_S")
+    start = 0
+    while True:
+        end = min(start + chunk_samples, num_samples)
+        yield start, end
+        if end >= num_samples:
+            return
+        start += step
+
+def merge_chunk_words(chunk_words, chunk_bounds):
+    """
+    Stitches per-chunk word timestamps (already shifted to absolute time)
+    into one list. Each overlap is split at its midpoint: a word is kept
+    from the chunk whose side of the cut contains the word's midpoint, so
+    words in the overlap are neither dropped nor duplicated.
+    """
+    merged = []
+    for k, words in enumerate(chunk_words):
+        lower = -float("inf")
+        upper = float("inf")
+        if k > 0:
+            lower = (chunk_bounds[k][0] + chunk_bounds[k - 1][1]) / 2 / TARGET_SAMPLE_RATE
+        if k + 1 < len(chunk_words):
+            upper = (chunk_bounds[k + 1][0] + chunk_bounds[k][1]) / 2 / TARGET_SAMPLE_RATE
+        for item in words:
+            midpoint = (item['start'] + item['end']) / 2
+            if lower <= midpoint < upper:
+                merged.append(item)
+    return merged
+
+def transcribe_long_audio(audio, source_label):
+    """
+    Long-form mode: transcribes ``audio`` as overlapping CHUNK_LENGTH_S windows,
+    CHUNK_BATCH_SIZE at a time, and merges them using the word timestamps.
+    Peak model memory depends on the chunk size, not the clip length.
+    Returns an object with the same ``text``/``timestamp`` fields as a NeMo Hypothesis.
+    """
+    chunk_samples = int(CHUNK_LENGTH_S * TARGET_SAMPLE_RATE)
+    overlap_samples = int(CHUNK_OVERLAP_S * TARGET_SAMPLE_RATE)
+    bounds = list(iter_chunk_bounds(audio.size, chunk_samples, overlap_samples))
+    logger.info(f"Long-form transcription for {source_label}: {len(bounds)} chunks of {CHUNK_LENGTH_S:.0f}s with {CHUNK_OVERLAP_S:.0f}s overlap")
+
+    chunk_words = []
+    chunk_texts = []
+    for batch_start in range(0, len(bounds), CHUNK_BATCH_SIZE):
+        batch_bounds = bounds[batch_start:batch_start + CHUNK_BATCH_SIZE]
+        # Slices are views, so no extra copy of the clip is made here.
+        batch = [audio[start:end] for start, end in batch_bounds]
+        infer_start = time.perf_counter()
+        results = asr_model.transcribe(batch, batch_size=len(batch), timestamps=True)
+        logger.info(f"Chunks {batch_start + 1}-{batch_start + len(batch)}/{len(bounds)} transcribed in {time.perf_counter() - infer_start:.3f}s")
+        for (start, _), result in zip(batch_bounds, results):
+            offset = start / TARGET_SAMPLE_RATE
+            words = (result.timestamp or {}).get('word') or []
+            chunk_words.append([
+                {'word': item['word'], 'start': item['start'] + offset, 'end': item['end'] + offset}
+                for item in words
+            ])
+            chunk_texts.append(result.text)
+
+    merged_words = merge_chunk_words(chunk_words, bounds)
+    if merged_words:
+        text = " ".join(item['word'] for item in merged_words)
+    else:
+        # No word timestamps to merge on; fall back to plain concatenation.
+        text = " ".join(t for t in chunk_texts if t)
+    return types.SimpleNamespace(text=text, timestamp={'word': merged_words})
 
+def transcribe_audio_batch(audio_source_type, audio_inputs):
+    """
+    Batched Gradio handler: the queue hands over every pending request for
+    this event (up to MAX_BATCH_SIZE) as a list, and all valid clips go
+    through Parakeet in a single transcribe() call.
+    Returns one list per output component, in request order.
+    """
+    texts = [""] * len(audio_inputs)
+    timestamps = [""] * len(audio_inputs)
 
-        return transcribed_text, formatted_timestamps
+    if asr_model is None:
+        logger.error("transcribe_audio_batch called but ASR model is not loaded.")
+        return ["ASR Model not loaded. Please check server logs."] * len(audio_inputs), timestamps
+
+    batch_indices, batch_audio, batch_labels = [], [], []
+    prep_start = time.perf_counter()
+    for i, audio_input_data in enumerate(audio_inputs):
+        try:
+            audio, source_label, error = prepare_audio_input(audio_source_type, audio_input_data)
+        except Exception as e:
+            logger.error(f"Error preparing audio input: {e}", exc_info=True)
+            audio, source_label, error = None, None, f"An unexpected error occurred: {e}"
+        if error:
+            texts[i] = error
+            continue
+        batch_indices.append(i)
+        batch_audio.append(audio)
+        batch_labels.append(source_label)
+    prep_time = time.perf_counter() - prep_start
+
+    if not batch_audio:
+        return texts, timestamps
+
+    # Long clips are transcribed on their own in chunked mode; the rest share one forward pass.
+    long_limit = int(LONG_AUDIO_THRESHOLD_S * TARGET_SAMPLE_RATE)
+    short_items = [(i, a, l) for i, a, l in zip(batch_indices, batch_audio, batch_labels) if a.size <= long_limit]
+    long_items = [(i, a, l) for i, a, l in zip(batch_indices, batch_audio, batch_labels) if a.size > long_limit]
+
+    if short_items:
+        short_indices, short_audio, short_labels = map(list, zip(*short_items))
+        total_audio_seconds = sum(a.size for a in short_audio) / TARGET_SAMPLE_RATE
+        logger.info(f"Starting transcription for batch of {len(short_audio)} {audio_source_type} clip(s) ({total_audio_seconds:.2f}s of audio)")
+        try:
+            infer_start = time.perf_counter()
+            # Perform transcription
+            # The model card indicates timestamps=True is default for word, segment, char.
+            transcription_results = asr_model.transcribe(short_audio, batch_size=len(short_audio), timestamps=True)
+            infer_time = time.perf_counter() - infer_start
+        except Exception as e:
+            logger.error(f"Error during transcription process: {e}", exc_info=True)
+            transcription_results = None
+            for i in short_indices:
+                texts[i] = f"An unexpected error occurred: {e}"
+
+        if transcription_results is not None:
+            logger.info(
+                f"Batch of {len(short_audio)} transcribed: preprocess {prep_time:.3f}s, inference {infer_time:.3f}s, "
+                f"RTF {infer_time / max(total_audio_seconds, 1e-6):.3f}"
+            )
+            if len(transcription_results) != len(short_audio):
+                logger.warning(f"Transcription for batch of {len(short_audio)} yielded {len(transcription_results)} results.")
+                for i in short_indices:
+                    texts[i] = "Transcription failed or produced no output."
+            else:
+                for i, result, source_label in zip(short_indices, transcription_results, short_labels):
+                    texts[i], timestamps[i] = format_transcription_result(result, source_label)
+
+    for i, audio, source_label in long_items:
+        try:
+            result = transcribe_long_audio(audio, source_label)
+            texts[i], timestamps[i] = format_transcription_result(result, source_label)
+        except Exception as e:
+            logger.error(f"Error during long-form transcription of {source_label}: {e}", exc_info=True)
+            texts[i] = f"An unexpected error occurred: {e}"
+
+    return texts, timestamps
 
-    except Exception as e:
-        logger.error(f"Error during transcription process: {e}", exc_info=True)
-        return f"An unexpected error occurred: {e}", ""
-    finally:
-        # Clean up the temporary file created for processing
-        if temp_file_to_delete_path and os.path.exists(temp_file_to_delete_path):
-            try:
-                os.remove(temp_file_to_delete_path)
-                logger.info(f"Deleted temporary file: {temp_file_to_delete_path}")
-            except Exception as e:
-                logger.error(f"Error deleting temporary file {temp_file_to_delete_path}: {e}", exc_info=True)
+def transcribe_audio_input(audio_source_type, audio_input_data):
+    """
+    Handles audio transcription from microphone or file upload for a single input.
+    Audio is decoded, downmixed and resampled in memory and the array is
+    passed straight to the model, so nothing is written to disk.
+    """
+    texts, timestamps = transcribe_audio_batch(audio_source_type, [audio_input_data])
+    return texts[0], timestamps[0]
 
 
 # --- Gradio Interface Definition ---
@@ -225,17 +422,25 @@ with gr.Blocks(title="NVIDIA Parakeet ASR Service", theme=gr.themes.Soft()) as d
 
     # --- Event Handlers ---
     mic_submit_button.click(
-        fn=lambda audio_data: transcribe_audio_input(audio_source_type="microphone", audio_input_data=audio_data),
+        fn=lambda audio_batch: transcribe_audio_batch(audio_source_type="microphone", audio_inputs=audio_batch),
         inputs=[mic_input_audio],
         outputs=[transcription_output_textbox, timestamp_output_textbox],
-        api_name="transcribe_microphone" # For API access if needed
+        api_name="transcribe_microphone", # For API access if needed
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE,
+        concurrency_limit=1, # One batch on the model at a time...
+        concurrency_id="parakeet" # ...shared by both events
     )
 
     upload_submit_button.click(
-        fn=lambda file_obj: transcribe_audio_input(audio_source_type="upload", audio_input_data=file_obj),
+        fn=lambda file_batch: transcribe_audio_batch(audio_source_type="upload", audio_inputs=file_batch),
         inputs=[upload_input_audio],
         outputs=[transcription_output_textbox, timestamp_output_textbox],
-        api_name="transcribe_upload" # For API access if needed
+        api_name="transcribe_upload", # For API access if needed
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE,
+        concurrency_limit=1,
+        concurrency_id="parakeet"
     )
 
     gr.Markdown("---")
@@ -261,7 +466,8 @@ if __name__ == "__main__":
     else:
         logger.info("ASR model loaded. Ready to start Gradio application.")
 
-    logger.info("Starting Gradio application...")
+    logger.info(f"Starting Gradio application (max batch size {MAX_BATCH_SIZE})...")
+    demo.queue(max_size=QUEUE_MAX_SIZE)
     demo.launch(
         server_name="0.0.0.0",  # Makes it accessible outside the Docker container on your network
         server_port=7860,
@@ -1,86 +1,445 @@
 import torch
 import os
 import io
+import json
+import math
+import re
+import sys
+import threading
+import time
 import soundfile as sf
 from transformers import AutoModelForCausalLM, AutoProcessor, GenerationConfig
 from pathlib import Path
 
+# Define prompt structure
+USER_PROMPT = '<|user|>'
+ASSISTANT_PROMPT = '<|assistant|>'
+PROMPT_SUFFIX = '<|end|>'
+TRANSCRIPTION_PROMPT = "Transcribe the audio to text."
+PROMPT = f'{USER_PROMPT}<|audio_1|>{TRANSCRIPTION_PROMPT}{PROMPT_SUFFIX}{ASSISTANT_PROMPT}'
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a")
+
+# Speech rarely exceeds ~4 tokens per second; the budget leaves headroom
+TOKENS_PER_SECOND = 8
+
+# Upper bound on speaking rate, to size the text the chunk overlap can hold
+MAX_WORDS_PER_SECOND = 4
+
+def load_audio(audio_file_path):
+    """Read an audio file as mono float32."""
+    audio, samplerate = sf.read(Path(audio_file_path), dtype="float32")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio, samplerate
+
+def audio_duration(audio_file_path):
+    """Duration in seconds, from the file header (the audio is not decoded)."""
+    info = sf.info(str(audio_file_path))
+    return info.frames / info.samplerate
+
+def iter_chunks(audio_file_path, window_s=30.0, overlap_s=2.0):
+    """
+    Read a file window by window, each overlapping the previous by
+    ``overlap_s``, without loading the rest of it.
+
+    Yields (start_s, audio, samplerate) with mono float32 audio.
+    """
+    samplerate = sf.info(str(audio_file_path)).samplerate
+    window = int(window_s * samplerate)
+    overlap = int(overlap_s * samplerate)
+    for index, block in enumerate(sf.blocks(str(audio_file_path), blocksize=window, overlap=overlap, dtype="float32")):
+        if index and len(block) <= overlap:
+            # Only audio the previous window already covered
+            break
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+        yield index * (window - overlap) / samplerate, block, samplerate
+
+def chunk_count(duration_s, window_s=30.0, overlap_s=2.0):
+    """How many windows iter_chunks yields for a file of ``duration_s``."""
+    if duration_s <= window_s:
+        return 1
+    step = window_s - overlap_s
+    return 1 + int(-(-(duration_s - window_s) // step))
+
+def _normalize(word):
+    return re.sub(r"\W", "", word.lower())
+
+def stitch(previous, text, overlap_s=2.0, min_match_words=2):
+    """
+    Join the transcript of the next window onto what came before.
+
+    The overlap is transcribed twice. The longest run of words shared by the
+    end of ``previous`` and the start of ``text`` marks it, provided the words
+    after the run in ``previous``, the run and the words before it in ``text``
+    fit in the overlap (at most ``MAX_WORDS_PER_SECOND`` words a second, plus
+    a word cut at each edge); a phrase repeated further apart is not the
+    overlap. The words either side of the run are kept from the window that
+    heard them in full. Without such a run (e.g. silence in the overlap) the
+    two are simply concatenated.
+    """
+    previous_words, words = previous.split(), text.split()
+    overlap_words = math.ceil(overlap_s * MAX_WORDS_PER_SECOND) + 2
+    tail = [_normalize(w) for w in previous_words[-overlap_words:]]
+    head = [_normalize(w) for w in words[:overlap_words]]
+
+    best = None  # (size, span, end in tail, start in head)
+    for i in range(len(tail)):
+        for j in range(len(head)):
+            size = 0
+            while i + size < len(tail) and j + size < len(head) and tail[i + size] and tail[i + size] == head[j + size]:
+                size += 1
+            # Words of the overlap this alignment implies
+            span = (len(tail) - i - size) + size + j
+            if size >= min_match_words and span <= overlap_words:
+                if best is None or (size, -span) > (best[0], -best[1]):
+                    best = (size, span, i + size, j + size)
+
+    if best is None:
+        return " ".join(previous_words + words)
+    _, _, tail_end, head_end = best
+    cut = len(previous_words) - len(tail) + tail_end
+    return " ".join(previous_words[:cut] + words[head_end:])
+
+def find_audio_files(paths, extensions=AUDIO_EXTENSIONS):
+    """Expand directories (recursively) into the audio files they contain."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in extensions))
+        else:
+            files.append(path)
+    return files
+
+class TranscriptionService:
+    """
+    Phi-4 transcription that loads the model once and keeps it for every
+    later request.
+
+    Files are transcribed several per ``generate`` call. They are sorted by
+    duration and grouped into buckets of similar length, so little of each
+    batch is padding and every batch's token budget follows its longest file.
+    """
+
+    def __init__(self, model=None, processor=None, generation_config=None,
+                 local_cache_dir=None, device="auto", batch_size=4,
+                 max_batch_audio_s=240.0, max_new_tokens=1000, chunk_s=30.0,
+                 overlap_s=2.0):
+        """
+        Parameters:
+        -----------
+        model, processor, generation_config : optional
+            Pre-loaded components; loaded with download_phi4_model if missing
+        local_cache_dir : str, optional
+            Model cache directory
+        device : str, optional
+            Device to load onto: 'cpu', 'cuda', 'mps', or 'auto'
+        batch_size : int, optional
+            Most files per generate call
+        max_batch_audio_s : float, optional
+            Cap on the (padded) audio in one batch: longest file x batch size
+        max_new_tokens : int, optional
+            Upper bound on generated tokens per file (or chunk)
+        chunk_s : float, optional
+            Files longer than this are transcribed in windows of this length;
+            0 sends every file whole
+        overlap_s : float, optional
+            Audio shared by consecutive windows, used to stitch their text
+        """
+        if model is None or processor is None or generation_config is None:
+            # Import the download function locally to avoid circular imports
+            from model_download import download_phi4_model
+            model, processor, generation_config = download_phi4_model(local_cache_dir, device)
+        self.model = model
+        self.processor = processor
+        self.generation_config = generation_config
+        self.batch_size = max(1, batch_size)
+        self.max_batch_audio_s = max_batch_audio_s
+        self.max_new_tokens = max_new_tokens
+        self.chunk_s = chunk_s
+        self.overlap_s = overlap_s
+        self.device = next(model.parameters()).device
+        # One generate call at a time when shared (e.g. across Streamlit sessions)
+        self._lock = threading.Lock()
+
+    def transcribe_arrays(self, audios):
+        """
+        Transcribe a batch of in-memory clips in one generate call.
+
+        Parameters:
+        -----------
+        audios : list of (audio, samplerate)
+
+        Returns:
+        --------
+        list of str
+        """
+        longest_s = max(len(audio) / samplerate for audio, samplerate in audios)
+        max_new_tokens = min(self.max_new_tokens, int(longest_s * TOKENS_PER_SECOND) + 32)
+        with self._lock:
+            # Prompts in a batch are padded on the left so generation continues each one
+            tokenizer = self.processor.tokenizer
+            padding_side = tokenizer.padding_side
+            tokenizer.padding_side = "left"
+            try:
+                inputs = self.processor(
+                    text=[PROMPT] * len(audios), audios=list(audios), return_tensors='pt', padding=True
+                ).to(self.device)
+            finally:
+                tokenizer.padding_side = padding_side
+            with torch.inference_mode():
+                generate_ids = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    generation_config=self.generation_config,
+                )
+        generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
+        return self.processor.batch_decode(
+            generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False
+        )
+
+    def transcribe(self, audio_file_path, progress=None):
+        """Transcribe one file, in chunks if it is longer than ``chunk_s``."""
+        print(f'Processing audio file: {audio_file_path}')
+        if self._is_long(audio_duration(audio_file_path)):
+            return self.transcribe_long(audio_file_path, progress)
+        return self.transcribe_arrays([load_audio(audio_file_path)])[0]
+
+    def _is_long(self, duration):
+        return self.chunk_s > 0 and duration > self.chunk_s
+
+    def transcribe_long(self, audio_file_path, progress=None):
+        """
+        Transcribe a long file as overlapping windows, ``batch_size`` windows
+        per generate call, stitching their text as they finish. Only one batch
+        of windows is in memory at a time, however long the file.
+
+        Parameters:
+        -----------
+        audio_file_path : str
+            Path to the audio file
+        progress : callable, optional
+            Called as progress(chunks_done, chunks_total) after each batch
+
+        Returns:
+        --------
+        str
+        """
+        total = chunk_count(audio_duration(audio_file_path), self.chunk_s, self.overlap_s)
+        text, done, batch = "", 0, []
+        chunks = iter_chunks(audio_file_path, self.chunk_s, self.overlap_s)
+        for _, audio, samplerate in chunks:
+            batch.append((audio, samplerate))
+            if len(batch) < self.batch_size:
+                continue
+            text, done = self._stitch_batch(text, batch, done, total, progress)
+            batch = []
+        if batch:
+            text, done = self._stitch_batch(text, batch, done, total, progress)
+        return text
+
+    def _stitch_batch(self, text, batch, done, total, progress):
+        for chunk_text in self.transcribe_arrays(batch):
+            text = stitch(text, chunk_text, self.overlap_s)
+        done += len(batch)
+        print(f"Chunks {done}/{total} transcribed", file=sys.stderr)
+        if progress is not None:
+            progress(done, total)
+        return text, done
+
+    def _buckets(self, files):
+        """
+        Group files of similar length, shortest first. Returns (batches,
+        unreadable, long_files); long files are left for transcribe_long.
+        """
+        durations, unreadable, long_files = [], [], []
+        for path in files:
+            try:
+                duration = audio_duration(path)
+                (long_files if self._is_long(duration) else durations).append((duration, path))
+            except Exception as e:
+                unreadable.append((path, e))
+        durations.sort(key=lambda item: item[0])
+
+        batches, batch = [], []
+        for duration, path in durations:
+            # Sorted ascending, so this file is the batch's longest
+            if batch and (len(batch) == self.batch_size or duration * (len(batch) + 1) > self.max_batch_audio_s):
+                batches.append(batch)
+                batch = []
+            batch.append((duration, path))
+        if batch:
+            batches.append(batch)
+        return batches, unreadable, long_files
+
+    def transcribe_files(self, files):
+        """
+        Transcribe many files in length-bucketed batches.
+
+        Yields one dict per file as soon as its batch finishes: file,
+        duration_s, text, batch, batch_size and batch_seconds; or file and
+        error if it could not be read or its batch failed. Files longer than
+        ``chunk_s`` come last, chunked one file at a time (with a ``chunks``
+        count instead of the batch fields).
+        """
+        batches, unreadable, long_files = self._buckets(files)
+        for path, error in unreadable:
+            yield {"file": str(path), "error": str(error)}
+
+        for number, batch in enumerate(batches, 1):
+            start_time = time.time()
+            try:
+                texts = self.transcribe_arrays([load_audio(path) for _, path in batch])
+            except Exception as e:
+                print(f"Batch {number} ({len(batch)} files) failed: {e}", file=sys.stderr)
+                for _, path in batch:
+                    yield {"file": str(path), "error": str(e)}
+                continue
+            elapsed = time.time() - start_time
+            audio_s = sum(duration for duration, _ in batch)
+            print(f"Batch {number}: {len(batch)} files, {audio_s:.1f}s of audio in {elapsed:.2f}s", file=sys.stderr)
+            for (duration, path), text in zip(batch, texts):
+                yield {
+                    "file": str(path),
+                    "duration_s": round(duration, 3),
+                    "text": text,
+                    "batch": number,
+                    "batch_size": len(batch),
+                    "batch_seconds": round(elapsed, 3),
+                }
+
+        for duration, path in long_files:
+            start_time = time.time()
+            try:
+                text = self.transcribe_long(path)
+            except Exception as e:
+                print(f"{path} failed: {e}", file=sys.stderr)
+                yield {"file": str(path), "error": str(e)}
+                continue
+            yield {
+                "file": str(path),
+                "duration_s": round(duration, 3),
+                "text": text,
+                "chunks": chunk_count(duration, self.chunk_s, self.overlap_s),
+                "seconds": round(time.time() - start_time, 3),
+            }
+
+_service = None
+# Services for caller-supplied components, keyed by their identity. Each holds
+# its components, so the ids stay valid for as long as the entry exists.
+_services = {}
+_services_lock = threading.Lock()
+
+def get_service(**kwargs):
+    """The process-wide TranscriptionService, created (and the model loaded) on first use."""
+    global _service
+    if _service is None:
+        _service = TranscriptionService(**kwargs)
+    return _service
+
 def transcribe_audio(audio_file_path, model=None, processor=None, generation_config=None):
     """
     Transcribe an audio file using Phi-4-multimodal-instruct.
-    
+
     Parameters:
     -----------
     audio_file_path : str
         Path to the audio file to transcribe
     model : AutoModelForCausalLM, optional
-        Pre-loaded model, if None will download
+        Pre-loaded model, if None the shared service's model is used (loaded once)
     processor : AutoProcessor, optional
-        Pre-loaded processor, if None will download
+        Pre-loaded processor, if None the shared service's is used
     generation_config : GenerationConfig, optional
-        Pre-loaded generation config, if None will download
-        
+        Pre-loaded generation config, if None the shared service's is used
+
     Returns:
     --------
     str
         The transcribed text
     """
-    # Import the download function locally to avoid circular imports
-    from model_downloader import download_phi4_model
-    
-    # Load model components if not provided
     if model is None or processor is None or generation_config is None:
-        model, processor, generation_config = download_phi4_model()
-    
-    # Define prompt structure
-    user_prompt = '<|user|>'
-    assistant_prompt = '<|assistant|>'
-    prompt_suffix = '<|end|>'
-    
-    # Create the transcription prompt
-    transcription_prompt = "Transcribe the audio to text."
-    prompt = f'{user_prompt}<|audio_1|>{transcription_prompt}{prompt_suffix}{assistant_prompt}'
-    print(f'Processing audio file: {audio_file_path}')
-    
-    # Load audio file
-    audio_path = Path(audio_file_path)
-    audio, samplerate = sf.read(audio_path)
-    
-    # Process with the model
-    device = next(model.parameters()).device
-    inputs = processor(text=prompt, audios=[(audio, samplerate)], return_tensors='pt').to(device)
-    
-    # Generate transcription
-    generate_ids = model.generate(
-        **inputs,
-        max_new_tokens=1000,
-        generation_config=generation_config,
-    )
-    generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
-    transcription = processor.batch_decode(
-        generate_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False
-    )[0]
-    
-    return transcription
+        service = get_service()
+    else:
+        # Reuse one service (and its lock) per set of components, so concurrent
+        # calls with the same model are serialised
+        key = (id(model), id(processor), id(generation_config))
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = _services[key] = TranscriptionService(model, processor, generation_config)
+    return service.transcribe(audio_file_path)
+
+def _done_files(output_path):
+    """Files already transcribed in an existing JSONL output."""
+    done = set()
+    if output_path and os.path.exists(output_path):
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "text" in record:
+                    done.add(record["file"])
+    return done
 
 if __name__ == "__main__":
     import argparse
-    
+
     parser = argparse.ArgumentParser(description="Transcribe audio using Phi-4 model")
-    parser.add_argument("audio_file", help="Path to the audio file to transcribe")
+    parser.add_argument("audio_file", nargs="+", help="Audio files or directories to transcribe")
     parser.add_argument("--device", default="auto", help="Device to use: 'cpu', 'cuda', 'mps', or 'auto'")
+    parser.add_argument("--cache-dir", default=None, help="Model cache directory (default: Hugging Face cache)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Append results to this JSONL file (default: JSONL on stdout for several files)")
+    parser.add_argument("--batch-size", type=int, default=4, help="Most files per generate call")
+    parser.add_argument("--max-batch-audio-s", type=float, default=240.0,
+                        help="Cap on padded audio per batch (longest file x batch size)")
+    parser.add_argument("--max-new-tokens", type=int, default=1000, help="Upper bound on tokens per file")
+    parser.add_argument("--chunk-s", type=float, default=30.0,
+                        help="Transcribe files longer than this in overlapping windows of this length (0 = never)")
+    parser.add_argument("--overlap-s", type=float, default=2.0, help="Overlap between consecutive windows")
+    parser.add_argument("--resume", action="store_true", help="Skip files already transcribed in --output")
     args = parser.parse_args()
-    
-    # Import the download function
-    from model_downloader import download_phi4_model
-    
-    # Download and load the model
-    model, processor, generation_config = download_phi4_model(device=args.device)
-    
-    # Transcribe the audio
-    transcription = transcribe_audio(args.audio_file, model, processor, generation_config)
-    
-    # Print the result
-    print("\nTranscription:")
-    print("--------------")
-    print(transcription)
\ No newline at end of file
+
+    files = find_audio_files(args.audio_file)
+    done = _done_files(args.output) if args.resume else set()
+    files = [path for path in files if str(path) not in done]
+    if done:
+        print(f"Skipping {len(done)} files already in {args.output}", file=sys.stderr)
+
+    # Download and load the model (once for all files)
+    service = TranscriptionService(
+        local_cache_dir=args.cache_dir,
+        device=args.device,
+        batch_size=args.batch_size,
+        max_batch_audio_s=args.max_batch_audio_s,
+        max_new_tokens=args.max_new_tokens,
+        chunk_s=args.chunk_s,
+        overlap_s=args.overlap_s,
+    )
+
+    if len(files) == 1 and not args.output and not Path(args.audio_file[0]).is_dir():
+        # Transcribe the audio
+        transcription = service.transcribe(files[0])
+
+        # Print the result
+        print("\nTranscription:")
+        print("--------------")
+        print(transcription)
+    else:
+        out = open(args.output, "a") if args.output else sys.stdout
+        start_time = time.time()
+        count = failed = 0
+        try:
+            for record in service.transcribe_files(files):
+                # One line per file, written as each batch finishes
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                count += 1
+                failed += "error" in record
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(f"Transcribed {count - failed}/{count} files in {time.time() - start_time:.2f} seconds", file=sys.stderr)
@@ -0,0 +1,143 @@
+"""
+Assisted generation (speculative decoding) for the Whisper pipeline.
+
+A small draft model that shares Whisper's tokenizer (distil-whisper for
+large-v3, whisper-tiny for the 80-mel models up to large-v2) proposes a few
+tokens at a time and the large model checks them in a single forward pass.
+Output is identical to decoding with the large model alone; only the number of
+large-model passes changes.
+
+``AssistedGenerationStats`` wraps ``generate`` on both models to log how many
+drafted tokens were accepted. Measuring the speedup against plain decoding
+means decoding some utterances without the assistant, so it is off unless
+``baseline_every`` is set (e.g. for a benchmark run, not for live users).
+"""
+import time
+
+import torch
+from transformers import AutoModelForSpeechSeq2Seq
+
+
+def load_assistant(assistant_id, model, torch_dtype, device):
+    """Load the draft model, or return None (with a warning) if it can't assist ``model``."""
+    assistant = AutoModelForSpeechSeq2Seq.from_pretrained(
+        assistant_id,
+        torch_dtype=torch_dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True
+    )
+    # Both models read the same input features and emit the same token IDs
+    if assistant.config.num_mel_bins != model.config.num_mel_bins or assistant.config.vocab_size != model.config.vocab_size:
+        print(
+            f"Assistant '{assistant_id}' does not match the main model "
+            f"({assistant.config.num_mel_bins} vs {model.config.num_mel_bins} mel bins, "
+            f"vocab {assistant.config.vocab_size} vs {model.config.vocab_size}); decoding without it"
+        )
+        return None
+    return assistant.to(device)
+
+
+def _sequences(output):
+    return output if isinstance(output, torch.Tensor) else output["sequences"]
+
+
+class AssistedGenerationStats:
+    def __init__(self, model, assistant, baseline_every: int = 0, log_every: int = 10):
+        """
+        Args:
+            model: Main Whisper model (its ``generate`` is wrapped).
+            assistant: Draft model passed as ``assistant_model``.
+            baseline_every: Decode every N-th call without the assistant to
+                measure the speedup; 0 never does.
+            log_every: Log the running numbers every N assisted calls.
+        """
+        self.model = model
+        self.assistant = assistant
+        self.baseline_every = baseline_every
+        self.log_every = log_every
+        self.calls = 0
+        self.assisted = {"calls": 0, "tokens": 0, "seconds": 0.0}
+        self.baseline = {"calls": 0, "tokens": 0, "seconds": 0.0}
+        self.drafted = 0
+        self.accepted = 0
+        self.verify_steps = 0
+
+        self._generate = model.generate
+        self._assistant_generate = assistant.generate
+        model.generate = self.generate
+        assistant.generate = self._draft
+        # Each forward of the main model during assisted decoding checks one batch of drafts
+        model.register_forward_hook(self._count_step)
+
+    def _count_step(self, module, args, output):
+        self.verify_steps += 1
+
+    def _draft(self, *args, **kwargs):
+        output = self._assistant_generate(*args, **kwargs)
+        prompt = kwargs.get("decoder_input_ids", kwargs.get("input_ids"))
+        self.drafted += _sequences(output).shape[-1] - (prompt.shape[-1] if prompt is not None else 0)
+        return output
+
+    def _new_tokens(self, sequences):
+        """Generated tokens, without the forced decoder prompt (start, language, task) heading each row."""
+        config = self.model.generation_config
+        first = getattr(config, "decoder_start_token_id", None)
+        last = getattr(config, "no_timestamps_token_id", None)
+        if first is None or last is None:
+            return sequences.numel()
+        # Whisper's prompt tokens lie between <|startoftranscript|> and <|notimestamps|>;
+        # text tokens are below and timestamps above, so the prompt is the leading run
+        forced = (sequences >= first) & (sequences <= last)
+        prompt = int(forced.int().cumprod(dim=-1).sum())
+        return sequences.numel() - prompt
+
+    def generate(self, *args, **kwargs):
+        self.calls += 1
+        baseline = self.baseline_every > 0 and self.calls % self.baseline_every == 0
+        if baseline:
+            kwargs.pop("assistant_model", None)
+
+        # Counters before this call; with the assistant, the difference is this call's share
+        drafted, steps = self.drafted, self.verify_steps
+        start = time.perf_counter()
+        output = self._generate(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        tokens = self._new_tokens(_sequences(output))
+
+        stats = self.baseline if baseline else self.assisted
+        stats["calls"] += 1
+        stats["tokens"] += tokens
+        stats["seconds"] += elapsed
+        if not baseline:
+            drafted, steps = self.drafted - drafted, self.verify_steps - steps
+            # Tokens beyond one per verification step came from accepted drafts
+            accepted = min(drafted, max(0, tokens - steps))
+            self.accepted += accepted
+            if self.assisted["calls"] % self.log_every == 0 or self.assisted["calls"] == 1:
+                print(
+                    f"Assisted decoding: {tokens} tokens in {elapsed * 1000:.0f} ms, "
+                    f"{accepted}/{drafted} drafted tokens accepted this call; {self.summary()}"
+                )
+        return output
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.drafted if self.drafted else None
+
+    @property
+    def speedup(self):
+        if not self.baseline["tokens"] or not self.assisted["tokens"]:
+            return None
+        baseline_rate = self.baseline["tokens"] / self.baseline["seconds"]
+        assisted_rate = self.assisted["tokens"] / self.assisted["seconds"]
+        return assisted_rate / baseline_rate
+
+    def summary(self):
+        rate = self.acceptance_rate
+        speedup = self.speedup
+        return (
+            f"acceptance {rate:.0%}" if rate is not None else "acceptance n/a"
+        ) + (
+            f", {speedup:.2f}x vs plain decoding ({self.baseline['calls']} baseline calls)"
+            if speedup is not None else ", speedup not measured yet" if self.baseline_every else ""
+        )
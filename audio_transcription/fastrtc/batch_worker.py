@@ -0,0 +1,157 @@
+"""
+Shared Whisper inference for all FastRTC sessions.
+
+Calling the pipeline from each ``ReplyOnPause`` handler blocked the event loop
+for every WebRTC peer and ran one utterance at a time, so the pipeline's
+``batch_size`` was never used. ``BatchedTranscriber`` owns the pipeline on a
+single worker thread: utterances from every active stream are queued, the
+worker takes whatever arrived within ``max_wait_ms`` of the first one (up to
+``max_batch_size``) and runs them as one pipeline batch, and each caller's
+awaitable resolves with its own transcript. The handler that awaited it then
+yields the result in its own session, so it reaches the right ``webrtc_id``.
+
+Final transcripts and interim (partial) hypotheses wait in separate lanes.
+Finals always go first and never share a batch with partials; partials
+queued when a final batch is taken are dropped (resolving to empty text, as
+the next interval sends a fresher window), and a new partial is not queued
+at all while finals are waiting or the partial lane is full.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def to_mono_float32(audio: np.ndarray) -> np.ndarray:
+    """FastRTC delivers int16 audio shaped (channels, samples); the pipeline wants mono float32."""
+    audio = np.asarray(audio)
+    if audio.ndim > 1:
+        # Channels are the short axis
+        audio = audio.mean(axis=0 if audio.shape[0] <= audio.shape[1] else 1)
+    if np.issubdtype(audio.dtype, np.integer):
+        return audio.astype(np.float32) / np.iinfo(audio.dtype).max
+    return audio.astype(np.float32, copy=False)
+
+
+class BatchedTranscriber:
+    def __init__(self, pipeline, max_batch_size: int = 16, max_wait_ms: float = 20.0, **generate_kwargs):
+        """
+        Args:
+            pipeline: transformers ASR pipeline (only ever called from the worker thread).
+            max_batch_size: Most utterances run in one pipeline call.
+            max_wait_ms: How long the worker waits after the first utterance for
+                others to join the batch.
+            generate_kwargs: Passed on every pipeline call.
+        """
+        self.pipeline = pipeline
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.generate_kwargs = generate_kwargs
+        self._finals = deque()
+        self._partials = deque()
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.utterances = 0
+        self.partials_skipped = 0
+        self._thread = threading.Thread(target=self._run, name="whisper-batch-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, sample_rate: int, audio: np.ndarray, partial: bool = False) -> Future:
+        """
+        Queue one utterance; the future resolves to the pipeline's result dict.
+
+        A ``partial`` that would only add to a backlog resolves at once to
+        empty text instead of being queued.
+        """
+        future = Future()
+        item = ({"sampling_rate": sample_rate, "raw": to_mono_float32(audio)}, future)
+        with self._cond:
+            if partial:
+                if self._finals or len(self._partials) >= self.max_batch_size:
+                    self.partials_skipped += 1
+                    future.set_result({"text": ""})
+                    return future
+                self._partials.append(item)
+            else:
+                self._finals.append(item)
+            self._cond.notify()
+        return future
+
+    async def transcribe(self, sample_rate: int, audio: np.ndarray) -> str:
+        result = await asyncio.wrap_future(self.submit(sample_rate, audio))
+        return result.get("text", "")
+
+    async def transcribe_partial(self, sample_rate: int, audio: np.ndarray) -> str:
+        """Like ``transcribe`` for an interim hypothesis: runs after every waiting final, or not at all."""
+        result = await asyncio.wrap_future(self.submit(sample_rate, audio, partial=True))
+        return result.get("text", "")
+
+    @property
+    def waiting(self) -> int:
+        return len(self._finals) + len(self._partials)
+
+    def _collect(self):
+        with self._cond:
+            while not (self._finals or self._partials):
+                self._cond.wait()
+            # Others may join the batch until it is full or max_wait has passed
+            deadline = time.monotonic() + self.max_wait
+            while len(self._finals or self._partials) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if self._finals:
+                lane = self._finals
+                # They would run after these finals, stale by then
+                dropped, self._partials = self._partials, deque()
+                self.partials_skipped += len(dropped)
+            else:
+                lane, dropped = self._partials, ()
+            taken = [lane.popleft() for _ in range(min(len(lane), self.max_batch_size))]
+
+        for _, future in dropped:
+            if future.set_running_or_notify_cancel():
+                future.set_result({"text": ""})
+        # Callers that stopped waiting (timeout, disconnect) cancel their future; skip them
+        return [item for item in taken if item[1].set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            # Nothing may end this thread: every later transcribe would hang
+            try:
+                self._run_batch()
+            except Exception as e:
+                print(f"Whisper batch worker error: {e}")
+
+    def _run_batch(self):
+        batch = self._collect()
+        if not batch:
+            return
+        inputs = [item[0] for item in batch]
+        futures = [item[1] for item in batch]
+        # The pipeline consumes the input dicts
+        audio_s = sum(len(item["raw"]) / item["sampling_rate"] for item in inputs)
+        start = time.monotonic()
+        try:
+            results = self.pipeline(inputs, batch_size=len(inputs), **self.generate_kwargs)
+        except Exception as e:
+            print(f"Whisper batch of {len(batch)} failed: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+        self.batches += 1
+        self.utterances += len(batch)
+        print(
+            f"Transcribed {len(batch)} utterance(s) ({audio_s:.1f}s of audio) in "
+            f"{time.monotonic() - start:.2f}s; {self.waiting} waiting, {self.partials_skipped} partials skipped so far"
+        )
@@ -0,0 +1,161 @@
+"""
+Latency-aware routing between a local and a remote Whisper backend.
+
+For each utterance the router estimates how long every backend would take:
+the p95 of its recent latencies, each rescaled to this utterance's length
+(with a one-second floor, so short clips are dominated by fixed overhead),
+inflated by the calls it already has in flight. The fastest healthy backend
+gets the utterance with a timeout derived from that estimate; on an error or
+timeout the next one is tried, so an utterance never waits much longer than
+two bounded timeouts. Backends that fail repeatedly are skipped for a
+cooldown, and samples expire after ``window_s`` so a backend that was slow
+once falls back to its prior estimate and gets tried again. Failures are
+recorded as taking the full timeout, however quickly they came back.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+TranscribeFn = Callable[[int, np.ndarray], Awaitable[str]]
+
+
+class Backend:
+    def __init__(self, name: str, transcribe: TranscribeFn, prior_rtf: float, queue_factor: float):
+        """
+        Args:
+            name: Shown in logs and stats.
+            transcribe: ``async (sample_rate, audio) -> text``.
+            prior_rtf: Assumed seconds of latency per second of audio before
+                there are enough samples.
+            queue_factor: How much each call already in flight adds to the
+                estimate (1.0 for a backend that serves calls one by one).
+        """
+        self.name = name
+        self.transcribe = transcribe
+        self.prior_rtf = prior_rtf
+        self.queue_factor = queue_factor
+        self.samples = deque(maxlen=200)  # (finished at, audio seconds, latency seconds)
+        self.inflight = 0
+        self.failures = 0  # Consecutive
+        self.open_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def estimate(self, duration: float, now: float, window_s: float, min_samples: int) -> float:
+        scale = max(duration, 1.0)
+        recent = [(d, latency) for t, d, latency in self.samples if now - t <= window_s]
+        if len(recent) < min_samples:
+            base = self.prior_rtf * scale
+        else:
+            scaled = sorted(latency * scale / max(d, 1.0) for d, latency in recent)
+            base = scaled[int(0.95 * (len(scaled) - 1))]
+        return base * (1 + self.inflight * self.queue_factor)
+
+    def p95(self, now: float, window_s: float):
+        latencies = sorted(latency for t, _, latency in self.samples if now - t <= window_s)
+        return latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+
+
+class HybridRouter:
+    def __init__(
+        self,
+        backends: List[Backend],
+        window_s: float = 120.0,
+        min_samples: int = 5,
+        timeout_factor: float = 3.0,
+        min_timeout_s: float = 2.0,
+        max_timeout_s: float = 15.0,
+        failure_threshold: int = 3,
+        cooldown_s: float = 30.0,
+    ):
+        """
+        Args:
+            backends: Candidates, in order of preference when estimates tie.
+            window_s: Age after which latency samples are ignored.
+            min_samples: Samples needed before measured latencies replace the prior.
+            timeout_factor: Per-attempt timeout as a multiple of the estimate,
+                clamped to [min_timeout_s, max_timeout_s].
+            failure_threshold: Consecutive failures that take a backend out.
+            cooldown_s: How long it stays out.
+        """
+        self.backends = backends
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.timeout_factor = timeout_factor
+        self.min_timeout_s = min_timeout_s
+        self.max_timeout_s = max_timeout_s
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+
+    def rank(self, duration: float) -> List[Backend]:
+        """Backends in the order they would be tried for an utterance of ``duration`` seconds."""
+        now = time.monotonic()
+        healthy = [b for b in self.backends if b.failures < self.failure_threshold or now >= b.open_until]
+        # If everything is cooling down, still try rather than fail outright
+        candidates = healthy or list(self.backends)
+        return sorted(candidates, key=lambda b: b.estimate(duration, now, self.window_s, self.min_samples))
+
+    def _record(self, backend: Backend, duration: float, latency: float, ok: bool):
+        backend.samples.append((time.monotonic(), duration, latency))
+        if ok:
+            backend.failures = 0
+        else:
+            backend.errors += 1
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold:
+                backend.open_until = time.monotonic() + self.cooldown_s
+                print(f"Router: taking {backend.name} out for {self.cooldown_s:.0f}s after {backend.failures} failures")
+
+    async def transcribe(self, sample_rate: int, audio: np.ndarray):
+        """Returns (text, name of the backend that produced it)."""
+        duration = audio.shape[-1] / sample_rate
+        error = None
+        for attempt, backend in enumerate(self.rank(duration)):
+            estimate = backend.estimate(duration, time.monotonic(), self.window_s, self.min_samples)
+            timeout = min(self.max_timeout_s, max(self.min_timeout_s, estimate * self.timeout_factor))
+            backend.calls += 1
+            backend.inflight += 1
+            start = time.monotonic()
+            try:
+                text = await asyncio.wait_for(backend.transcribe(sample_rate, audio), timeout)
+                latency = time.monotonic() - start
+                self._record(backend, duration, latency, ok=True)
+                print(
+                    f"Router: {duration:.1f}s utterance -> {backend.name} in {latency:.2f}s "
+                    f"(estimated {estimate:.2f}s{', fallback' if attempt else ''})"
+                )
+                return text, backend.name
+            except asyncio.TimeoutError:
+                backend.timeouts += 1
+                # Count the full timeout so the p95 reflects how slow it was
+                self._record(backend, duration, timeout, ok=False)
+                error = TimeoutError(f"{backend.name} took longer than {timeout:.1f}s")
+            except Exception as e:
+                # Also counted as a timeout: a backend failing fast (e.g. a 503) must
+                # not lower its own p95 and be ranked first again
+                self._record(backend, duration, timeout, ok=False)
+                error = e
+            finally:
+                backend.inflight -= 1
+            print(f"Router: {backend.name} failed ({error}); trying the next backend")
+        raise error
+
+    @property
+    def stats(self):
+        now = time.monotonic()
+        return {
+            backend.name: {
+                "p95_latency_s": backend.p95(now, self.window_s),
+                "estimate_5s_s": round(backend.estimate(5.0, now, self.window_s, self.min_samples), 3),
+                "inflight": backend.inflight,
+                "calls": backend.calls,
+                "errors": backend.errors,
+                "timeouts": backend.timeouts,
+                "available": backend.failures < self.failure_threshold or now >= backend.open_until,
+            }
+            for backend in self.backends
+        }
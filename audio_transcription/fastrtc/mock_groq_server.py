@@ -0,0 +1,46 @@
+"""
+Stand-in for the groq transcription API, for exercising whisper_hybrid.py's
+router without a key or network access.
+
+    MOCK_LATENCY_S=3 MOCK_ERROR_RATE=0.2 python fastrtc/mock_groq_server.py
+    GROQ_BASE_URL=http://localhost:8001 GROQ_API_KEY=mock python fastrtc/whisper_hybrid.py
+
+Latency, jitter and the share of failed requests can be changed while it runs
+with ``POST /config?latency_s=...&jitter_s=...&error_rate=...``.
+"""
+import asyncio
+import os
+import random
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+
+config = {
+    "latency_s": float(os.environ.get("MOCK_LATENCY_S", "0.3")),
+    "jitter_s": float(os.environ.get("MOCK_JITTER_S", "0.1")),
+    "error_rate": float(os.environ.get("MOCK_ERROR_RATE", "0")),
+}
+
+app = FastAPI()
+
+
+@app.post("/openai/v1/audio/transcriptions")
+async def transcriptions(file: UploadFile = File(...), model: str = Form(...), response_format: str = Form("json")):
+    audio = await file.read()
+    await asyncio.sleep(max(0.0, config["latency_s"] + random.uniform(-1, 1) * config["jitter_s"]))
+    if random.random() < config["error_rate"]:
+        raise HTTPException(status_code=503, detail="Mock failure")
+    return {"text": f"[mock {model}] {len(audio)} bytes transcribed", "segments": []}
+
+
+@app.post("/config")
+def update_config(latency_s: float = None, jitter_s: float = None, error_rate: float = None):
+    for key, value in (("latency_s", latency_s), ("jitter_s", jitter_s), ("error_rate", error_rate)):
+        if value is not None:
+            config[key] = value
+    return config
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("MOCK_PORT", "8001")))
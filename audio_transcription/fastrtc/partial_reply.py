@@ -0,0 +1,91 @@
+"""
+``ReplyOnPause`` that also reports what is being said before the pause.
+
+With plain ``ReplyOnPause`` nothing is shown until the speaker stops. While
+speech is in progress, ``ReplyOnPauseWithPartials`` transcribes the last
+``window_s`` seconds of the utterance every ``interval_s`` and emits it as
+``AdditionalOutputs(text, False)``; at the pause the reply function runs as
+before and should yield ``AdditionalOutputs(text, True)``. The second argument
+is the final flag the ``/transcript`` route turns into ``partial`` / ``output``
+events.
+"""
+import asyncio
+import inspect
+import time
+
+from fastrtc import AdditionalOutputs, ReplyOnPause
+
+
+class ReplyOnPauseWithPartials(ReplyOnPause):
+    def __init__(self, fn, partial_fn, interval_s: float = 0.5, window_s: float = 6.0, min_audio_s: float = 0.5, **kwargs):
+        """
+        Args:
+            fn: Reply function run at the pause (as for ``ReplyOnPause``).
+            partial_fn: ``(sample_rate, audio) -> str`` (or an async function)
+                transcribing the current window.
+            interval_s: Time between partial hypotheses.
+            window_s: Audio (from the end of the utterance so far) each partial covers.
+            min_audio_s: Speech needed before the first partial.
+            kwargs: Passed to ``ReplyOnPause``.
+        """
+        super().__init__(fn, **kwargs)
+        self.partial_fn = partial_fn
+        self.interval_s = interval_s
+        self.window_s = window_s
+        self.min_audio_s = min_audio_s
+        self._kwargs = kwargs
+        self._last_partial = 0.0
+
+    def copy(self):
+        # One handler per connection
+        return ReplyOnPauseWithPartials(
+            self.fn,
+            self.partial_fn,
+            self.interval_s,
+            self.window_s,
+            self.min_audio_s,
+            model=self.model,
+            **{key: value for key, value in self._kwargs.items() if key != "model"},
+        )
+
+    def emit(self):
+        if self.event.is_set():
+            # Pause detected (or a reply in progress): the final result
+            return super().emit()
+        return self._emit_partial()
+
+    def _emit_partial(self):
+        state = self.state
+        audio = state.stream
+        if not state.started_talking or audio is None or not state.sampling_rate:
+            return None
+        now = time.monotonic()
+        if now - self._last_partial < self.interval_s or len(audio) < self.min_audio_s * state.sampling_rate:
+            return None
+        self._last_partial = now
+
+        window = audio[-int(self.window_s * state.sampling_rate):].reshape(1, -1)
+        result = self.partial_fn(state.sampling_rate, window)
+        if inspect.isawaitable(result):
+            # emit runs in an executor thread; the handler's loop runs the coroutine
+            result = asyncio.run_coroutine_threadsafe(result, self.loop).result()
+        if self.event.is_set() or not result:
+            # The utterance ended meanwhile; its final result supersedes this
+            return None
+        return AdditionalOutputs(result, False)
+
+
+def sse_event(output: AdditionalOutputs) -> str:
+    """Server-sent event for a transcript: ``output`` when final (as before), ``partial`` otherwise."""
+    transcript = output.args[0]
+    final = output.args[1] if len(output.args) > 1 else True
+    event = "output" if final else "partial"
+    data = "\n".join(f"data: {line}" for line in str(transcript).splitlines() or [""])
+    return f"event: {event}\n{data}\n\n"
+
+
+def merge_outputs(transcript: str, live: str, text: str, final: bool):
+    """Gradio UI handler: finals are appended to the transcript, partials replace the live line."""
+    if final:
+        return (transcript + " " + text).strip(), ""
+    return transcript, text
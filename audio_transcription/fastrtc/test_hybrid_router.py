@@ -0,0 +1,129 @@
+import asyncio
+import io
+import socket
+import threading
+import time
+import unittest
+import wave
+
+import httpx
+import numpy as np
+import uvicorn
+from groq import AsyncClient
+
+from hybrid_router import Backend, HybridRouter
+from mock_groq_server import app as mock_app
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wav_bytes(sample_rate, audio):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(audio.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class TestHybridRouterWithMockRemote(unittest.TestCase):
+    """Routes against mock_groq_server.py through the groq client, as whisper_hybrid.py does."""
+
+    @classmethod
+    def setUpClass(cls):
+        port = _free_port()
+        cls.base_url = f"http://127.0.0.1:{port}"
+        cls.server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=port, log_level="warning"))
+        cls.thread = threading.Thread(target=cls.server.run, daemon=True)
+        cls.thread.start()
+        deadline = time.monotonic() + 10
+        while not cls.server.started and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.should_exit = True
+        cls.thread.join(timeout=5)
+
+    def setUp(self):
+        self.configure(latency_s=0.01, jitter_s=0, error_rate=0)
+
+    def configure(self, **params):
+        httpx.post(f"{self.base_url}/config", params=params).raise_for_status()
+
+    def make_router(self, client):
+        async def local(sample_rate, audio):
+            await asyncio.sleep(0.2)
+            return "local transcript"
+
+        async def remote(sample_rate, audio):
+            transcript = await client.audio.transcriptions.create(
+                file=("audio-file.wav", _wav_bytes(sample_rate, audio)),
+                model="whisper-large-v3",
+                response_format="verbose_json",
+            )
+            return transcript.text
+
+        return HybridRouter(
+            [Backend("local", local, prior_rtf=0.3, queue_factor=0.5),
+             Backend("remote", remote, prior_rtf=0.15, queue_factor=0.05)],
+            min_samples=2,
+            min_timeout_s=1.0,
+            max_timeout_s=2.0,
+            failure_threshold=2,
+            cooldown_s=0.5,
+        )
+
+    def test_failing_remote_is_ranked_below_local(self):
+        """A remote that fails fast falls back to local and stays ranked behind it after its cooldown."""
+        async def scenario():
+            client = AsyncClient(api_key="mock", base_url=self.base_url, max_retries=0)
+            router = self.make_router(client)
+            audio = np.zeros((1, 16000), dtype=np.int16)
+
+            # Healthy and fast: the remote answers
+            for _ in range(3):
+                text, backend = await router.transcribe(16000, audio)
+                self.assertEqual(backend, "remote")
+                self.assertIn("[mock whisper-large-v3]", text)
+            await router.transcribe(16000, audio)
+
+            # Every remote call now fails at once; each utterance falls back to local
+            self.configure(error_rate=1)
+            for _ in range(4):
+                text, backend = await router.transcribe(16000, audio)
+                self.assertEqual((text, backend), ("local transcript", "local"))
+            self.assertGreaterEqual(router.stats["remote"]["errors"], 2)
+
+            # Past the cooldown the remote is available again, but its failures
+            # count as timeouts, so local stays first
+            await asyncio.sleep(0.6)
+            self.assertTrue(router.stats["remote"]["available"])
+            self.assertEqual([b.name for b in router.rank(1.0)], ["local", "remote"])
+            text, backend = await router.transcribe(16000, audio)
+            self.assertEqual(backend, "local")
+
+        asyncio.run(scenario())
+
+    def test_slow_remote_times_out_to_local(self):
+        """A remote slower than its timeout costs one bounded wait, then local answers."""
+        async def scenario():
+            client = AsyncClient(api_key="mock", base_url=self.base_url, max_retries=0)
+            router = self.make_router(client)
+            self.configure(latency_s=5)
+            start = time.monotonic()
+            text, backend = await router.transcribe(16000, np.zeros((1, 16000), dtype=np.int16))
+            self.assertEqual(backend, "local")
+            self.assertLess(time.monotonic() - start, router.max_timeout_s + 1)
+            self.assertEqual(router.stats["remote"]["timeouts"], 1)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+import os
+
+import gradio as gr
+import numpy as np
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastrtc import (
+    AdditionalOutputs,
+    ReplyOnPause,
+    Stream,
+    audio_to_bytes,
+    get_twilio_turn_credentials,
+)
+from gradio.utils import get_space
+from groq import AsyncClient
+
+from hybrid_router import Backend, HybridRouter
+from partial_reply import sse_event
+from whisper_inference import get_whisper_worker
+
+# Load environment variables first (from .env file if present)
+load_dotenv()
+
+# Get cache directory from environment variable or use default
+HF_CACHE_DIR = os.environ.get("HF_CACHE_DIR", os.path.expanduser("~/.cache/huggingface"))
+os.environ["TRANSFORMERS_CACHE"] = os.path.join(HF_CACHE_DIR, "hub")
+
+# Set device and model precision via environment variables
+USE_CUDA = os.environ.get("USE_CUDA", "1") == "1"  # Default to using CUDA if available
+USE_MPS = os.environ.get("USE_MPS", "1") == "1"    # Fallback to MPS for Mac
+USE_FP16 = os.environ.get("USE_FP16", "1") == "1"  # Default to using FP16 precision
+
+# Remote model; the groq client also reads GROQ_BASE_URL, e.g. to point it at mock_groq_server.py
+GROQ_MODEL = os.environ.get("GROQ_MODEL", "whisper-large-v3")
+
+# Current directory reference
+cur_dir = Path(__file__).parent
+
+# One worker batches utterances from every connected stream, off the event loop
+whisper_worker = get_whisper_worker(use_cuda=USE_CUDA, use_mps=USE_MPS, use_fp16=USE_FP16)
+
+# Retries are left to the router, which falls back to the local model instead
+groq_client = AsyncClient(api_key=os.environ.get("GROQ_API_KEY"), max_retries=0)
+
+
+async def transcribe_remote(sample_rate: int, audio_data: np.ndarray) -> str:
+    transcript = await groq_client.audio.transcriptions.create(
+        file=("audio-file.mp3", audio_to_bytes((sample_rate, audio_data))),
+        model=GROQ_MODEL,
+        response_format="verbose_json",
+    )
+    return transcript.text
+
+
+router = HybridRouter(
+    [
+        Backend(
+            "local",
+            whisper_worker.transcribe,
+            prior_rtf=float(os.environ.get("HYBRID_LOCAL_PRIOR_RTF", "0.3")),
+            # Queued utterances share batches, so each adds less than a full call
+            queue_factor=float(os.environ.get("HYBRID_LOCAL_QUEUE_FACTOR", "0.5")),
+        ),
+        Backend(
+            "remote",
+            transcribe_remote,
+            prior_rtf=float(os.environ.get("HYBRID_REMOTE_PRIOR_RTF", "0.15")),
+            queue_factor=float(os.environ.get("HYBRID_REMOTE_QUEUE_FACTOR", "0.05")),
+        ),
+    ],
+    window_s=float(os.environ.get("HYBRID_WINDOW_S", "120")),
+    min_samples=int(os.environ.get("HYBRID_MIN_SAMPLES", "5")),
+    timeout_factor=float(os.environ.get("HYBRID_TIMEOUT_FACTOR", "3")),
+    min_timeout_s=float(os.environ.get("HYBRID_MIN_TIMEOUT_S", "2")),
+    max_timeout_s=float(os.environ.get("HYBRID_MAX_TIMEOUT_S", "15")),
+    failure_threshold=int(os.environ.get("HYBRID_FAILURE_THRESHOLD", "3")),
+    cooldown_s=float(os.environ.get("HYBRID_COOLDOWN_S", "30")),
+)
+
+
+async def transcribe(audio: tuple[int, np.ndarray]):
+    sample_rate, audio_data = audio
+
+    # Local or remote, whichever is expected to answer first; the other on failure
+    transcript, _ = await router.transcribe(sample_rate, audio_data)
+
+    # True marks the final result for the utterance
+    yield AdditionalOutputs(transcript, True)
+
+
+stream = Stream(
+    ReplyOnPause(transcribe),
+    modality="audio",
+    mode="send",
+    additional_outputs=[
+        gr.Textbox(label="Transcript"),
+    ],
+    additional_outputs_handler=lambda a, b, final: a + " " + b,
+    rtc_configuration=get_twilio_turn_credentials() if get_space() else None,
+    concurrency_limit=5 if get_space() else None,
+    time_limit=90 if get_space() else None,
+)
+
+app = FastAPI()
+
+stream.mount(app)
+
+
+@app.get("/transcript")
+def _(webrtc_id: str):
+    async def output_stream():
+        async for output in stream.output_stream(webrtc_id):
+            yield sse_event(output)
+
+    return StreamingResponse(output_stream(), media_type="text/event-stream")
+
+
+@app.get("/router")
+def router_stats():
+    # Per-backend p95 latency, in-flight calls, errors and timeouts
+    return router.stats
+
+
+@app.get("/")
+def index():
+    rtc_config = get_twilio_turn_credentials() if get_space() else None
+    html_content = (cur_dir / "index.html").read_text()
+    html_content = html_content.replace("__RTC_CONFIGURATION__", json.dumps(rtc_config))
+    return HTMLResponse(content=html_content)
+
+
+if __name__ == "__main__":
+    import os
+
+    if (mode := os.getenv("MODE")) == "UI":
+        stream.ui.launch(server_port=7860, server_name="0.0.0.0")
+    elif mode == "PHONE":
+        stream.fastphone(host="0.0.0.0", port=7860)
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host="0.0.0.0", port=7860)
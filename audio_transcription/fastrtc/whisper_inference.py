@@ -0,0 +1,100 @@
+"""
+Whisper pipeline and shared inference worker for the FastRTC scripts.
+
+``whisper_local.py``, ``whisper_remote.py`` and ``whisper_hybrid.py`` load the
+same pipeline (optionally with an assistant model) and hand it to one
+``BatchedTranscriber``; only the devices they try and the default chunk length
+differ. Settings come from the same environment variables in all three.
+"""
+import os
+
+import torch
+from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+from assisted_decoding import AssistedGenerationStats, load_assistant
+from batch_worker import BatchedTranscriber
+
+
+def get_whisper_pipeline(use_cuda: bool = False, use_mps: bool = True, use_fp16: bool = True, chunk_length: int = 30):
+    """
+    Load the Whisper pipeline.
+
+    Args:
+        use_cuda: Use CUDA if available.
+        use_mps: Use Apple MPS if available (and CUDA is not used).
+        use_fp16: Half precision on GPU devices.
+        chunk_length: Default for ``WHISPER_CHUNK_LENGTH``.
+
+    Returns:
+        (pipeline, batch_size): ``batch_size`` is the most utterances one
+        pipeline call may take, 1 when an assistant model is decoding.
+    """
+    model_id = os.environ.get("WHISPER_MODEL", "openai/whisper-large-v3")
+
+    # Select the appropriate device - prioritize CUDA, then MPS, then fall back to CPU
+    device = "cuda" if use_cuda and torch.cuda.is_available() else \
+             "mps" if use_mps and torch.backends.mps.is_available() else "cpu"
+
+    torch_dtype = torch.float16 if use_fp16 and device in ("cuda", "mps") else torch.float32
+
+    print(f"Loading Whisper model '{model_id}' on {device} device with {torch_dtype} precision")
+    print(f"Using cache directory: {os.environ.get('TRANSFORMERS_CACHE')}")
+
+    # Load model and processor
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(
+        model_id,
+        torch_dtype=torch_dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True
+    )
+    processor = AutoProcessor.from_pretrained(model_id)
+
+    # Move model to appropriate device
+    model.to(device)
+
+    # Get configurable pipeline parameters
+    batch_size = int(os.environ.get("WHISPER_BATCH_SIZE", "16"))
+    chunk_length = int(os.environ.get("WHISPER_CHUNK_LENGTH", str(chunk_length)))
+    max_new_tokens = int(os.environ.get("WHISPER_MAX_NEW_TOKENS", "128"))
+
+    # Optional draft model for assisted generation, e.g. distil-whisper/distil-large-v3 for
+    # whisper-large-v3 (must share its tokenizer and mel bins); empty disables it
+    assistant_id = os.environ.get("WHISPER_ASSISTANT_MODEL", "")
+    generate_kwargs = {}
+    if assistant_id:
+        print(f"Loading assistant model '{assistant_id}' for assisted generation")
+        assistant = load_assistant(assistant_id, model, torch_dtype, device)
+        if assistant is not None:
+            generate_kwargs["assistant_model"] = assistant
+            # Logs acceptance rate and measured speedup (it wraps model.generate, which keeps it alive)
+            AssistedGenerationStats(
+                model,
+                assistant,
+                baseline_every=int(os.environ.get("WHISPER_ASSISTANT_BASELINE_EVERY", "0")),
+            )
+            # Assisted generation decodes one sequence at a time
+            batch_size = 1
+
+    # Create and return the pipeline
+    pipe = pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor,
+        max_new_tokens=max_new_tokens,
+        chunk_length_s=chunk_length,
+        batch_size=batch_size,
+        return_timestamps=True,
+        generate_kwargs=generate_kwargs
+    )
+    return pipe, batch_size
+
+
+def get_whisper_worker(**kwargs) -> BatchedTranscriber:
+    """Load the pipeline (``kwargs`` as for ``get_whisper_pipeline``) behind one shared batching worker."""
+    pipe, batch_size = get_whisper_pipeline(**kwargs)
+    return BatchedTranscriber(
+        pipe,
+        max_batch_size=batch_size,
+        max_wait_ms=float(os.environ.get("WHISPER_BATCH_WAIT_MS", "20")),
+    )
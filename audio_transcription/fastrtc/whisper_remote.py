@@ -4,18 +4,18 @@ import os
 
 import gradio as gr
 import numpy as np
-import torch
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastrtc import (
     AdditionalOutputs,
-    ReplyOnPause,
     Stream,
     get_twilio_turn_credentials,
 )
 from gradio.utils import get_space
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+from partial_reply import ReplyOnPauseWithPartials, merge_outputs, sse_event
+from whisper_inference import get_whisper_worker
 
 # Load environment variables first (from .env file if present)
 load_dotenv()
@@ -32,75 +32,34 @@ USE_FP16 = os.environ.get("USE_FP16", "1") == "1"  # Default to using FP16 preci
 # Current directory reference
 cur_dir = Path(__file__).parent
 
-# Function to load Whisper model using configured cache
-def get_whisper_pipeline():
-    model_id = os.environ.get("WHISPER_MODEL", "openai/whisper-large-v3")
-    
-    # Select the appropriate device - prioritize CUDA, then MPS, then fall back to CPU
-    device = "cuda" if USE_CUDA and torch.cuda.is_available() else \
-             "mps" if USE_MPS and torch.backends.mps.is_available() else "cpu"
-             
-    torch_dtype = torch.float16 if USE_FP16 and (device == "cuda" or device == "mps") else torch.float32
-    
-    print(f"Loading Whisper model '{model_id}' on {device} device with {torch_dtype} precision")
-    print(f"Using cache directory: {os.environ['TRANSFORMERS_CACHE']}")
-    
-    # Load model and processor
-    model = AutoModelForSpeechSeq2Seq.from_pretrained(
-        model_id,
-        torch_dtype=torch_dtype,
-        low_cpu_mem_usage=True,
-        use_safetensors=True
-    )
-    processor = AutoProcessor.from_pretrained(model_id)
-    
-    # Move model to appropriate device
-    model.to(device)
-    
-    # Get configurable pipeline parameters
-    batch_size = int(os.environ.get("WHISPER_BATCH_SIZE", "16"))
-    chunk_length = int(os.environ.get("WHISPER_CHUNK_LENGTH", "30"))
-    max_new_tokens = int(os.environ.get("WHISPER_MAX_NEW_TOKENS", "128"))
-    
-    # Create and return the pipeline
-    pipe = pipeline(
-        "automatic-speech-recognition",
-        model=model,
-        tokenizer=processor.tokenizer,
-        feature_extractor=processor.feature_extractor,
-        max_new_tokens=max_new_tokens,
-        chunk_length_s=chunk_length,
-        batch_size=batch_size,
-        return_timestamps=True
-    )
-    return pipe
-
-# Initialize the Whisper pipeline
-whisper_pipeline = get_whisper_pipeline()
+# One worker batches utterances from every connected stream, off the event loop
+whisper_worker = get_whisper_worker(use_cuda=USE_CUDA, use_mps=USE_MPS, use_fp16=USE_FP16)
 
 async def transcribe(audio: tuple[int, np.ndarray]):
     # Convert audio to the format expected by the pipeline
     sample_rate, audio_data = audio
     
-    # Ensure audio is mono (if stereo)
-    if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
-        audio_data = np.mean(audio_data, axis=1)
-    
-    # Process with Whisper
-    result = whisper_pipeline({"sampling_rate": sample_rate, "raw": audio_data})
+    # Process with Whisper (mono conversion happens in the worker)
+    transcript = await whisper_worker.transcribe(sample_rate, audio_data)
     
-    # Format similar to Groq API response
-    transcript = result.get("text", "")
-    yield AdditionalOutputs(transcript)
+    # Format similar to Groq API response; True marks the final result for the utterance
+    yield AdditionalOutputs(transcript, True)
 
 stream = Stream(
-    ReplyOnPause(transcribe),
+    # Interim hypotheses over a sliding window while the user is still talking
+    ReplyOnPauseWithPartials(
+        transcribe,
+        whisper_worker.transcribe_partial,
+        interval_s=float(os.environ.get("PARTIAL_INTERVAL_S", "0.5")),
+        window_s=float(os.environ.get("PARTIAL_WINDOW_S", "6")),
+    ),
     modality="audio",
     mode="send",
     additional_outputs=[
         gr.Textbox(label="Transcript"),
+        gr.Textbox(label="Live"),
     ],
-    additional_outputs_handler=lambda a, b: a + " " + b,
+    additional_outputs_handler=merge_outputs,
     rtc_configuration=get_twilio_turn_credentials() if get_space() else None,
     concurrency_limit=5 if get_space() else None,
     time_limit=90 if get_space() else None,
@@ -115,8 +74,8 @@ stream.mount(app)
 def _(webrtc_id: str):
     async def output_stream():
         async for output in stream.output_stream(webrtc_id):
-            transcript = output.args[0]
-            yield f"event: output\ndata: {transcript}\n\n"
+            # "partial" events while speaking, "output" for the final transcript
+            yield sse_event(output)
 
     return StreamingResponse(output_stream(), media_type="text/event-stream")
 
@@ -1,26 +1,54 @@
 import os
+import json
+import shutil
+import time
 from transformers import AutoModelForCausalLM, AutoProcessor, GenerationConfig
 import torch
 
-def download_phi4_model(local_cache_dir=None, device="auto"):
+MODEL_PATH = "microsoft/Phi-4-multimodal-instruct"
+
+# Written next to weights saved by convert_phi4_model
+CONVERSION_INFO = "conversion.json"
+
+def _resolve_device(device):
+    if device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def _resolve_dtype(dtype):
+    # torch_dtype="auto" loads the checkpoint's own dtype
+    return "bfloat16" if dtype == "auto" else dtype
+
+def converted_model_dir(local_cache_dir=None, device="cpu", dtype="bfloat16"):
+    """Where the copy of the model cast for one device and dtype is stored."""
+    cache_dir = local_cache_dir or os.path.expanduser("~/.cache/huggingface")
+    return os.path.join(cache_dir, "converted", f"{MODEL_PATH.replace('/', '--')}-{device}-{dtype}")
+
+def download_phi4_model(local_cache_dir=None, device="auto", dtype="auto"):
     """
     Download and cache the Phi-4-multimodal-instruct model from Huggingface.
-    
+
     Parameters:
     -----------
     local_cache_dir : str, optional
         Directory to store the model. If None, uses the default Huggingface cache.
     device : str, optional
         Device to load the model onto. Options: "auto", "cpu", "cuda", "mps".
-        
+    dtype : str, optional
+        Weight dtype. "auto" keeps the checkpoint's (bfloat16).
+
     Returns:
     --------
     tuple
         (model, processor, generation_config) - The loaded model components
     """
     print(f"Loading Phi-4-multimodal-instruct model...")
-    model_path = "microsoft/Phi-4-multimodal-instruct"
-    
+    model_path = MODEL_PATH
+
     # Use explicit cache directory if provided, otherwise use default
     if local_cache_dir:
         os.makedirs(local_cache_dir, exist_ok=True)
@@ -29,54 +57,131 @@ def download_phi4_model(local_cache_dir=None, device="auto"):
         # Get default HF cache location for informational purposes
         default_cache = os.path.expanduser("~/.cache/huggingface")
         print(f"Using default Hugging Face cache directory: {default_cache}")
-    
+
     # Determine device map
+    device_map = _resolve_device(device)
     if device == "auto":
-        if torch.cuda.is_available():
-            device_map = "cuda"
-            print("Using CUDA GPU")
-        elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-            device_map = "mps"
-            print("Using Apple MPS (Metal)")
-        else:
-            device_map = "cpu"
-            print("Using CPU")
+        print({"cuda": "Using CUDA GPU", "mps": "Using Apple MPS (Metal)", "cpu": "Using CPU"}[device_map])
     else:
-        device_map = device
         print(f"Using specified device: {device}")
-    
+
     # Set appropriate attention implementation based on hardware
     if device_map == "cuda" and torch.cuda.get_device_capability()[0] >= 8:
         # Ampere or later GPU (3090, 4090, etc.)
         attn_implementation = "flash_attention_2"
     else:
         attn_implementation = "eager"
-    
+
+    torch_dtype = "auto" if dtype == "auto" else getattr(torch, dtype)
+
+    # A copy saved by convert_phi4_model is already cast for this device:
+    # its safetensors are memory-mapped and placed without conversion
+    converted_dir = converted_model_dir(local_cache_dir, device_map, _resolve_dtype(dtype))
+    if os.path.exists(os.path.join(converted_dir, CONVERSION_INFO)):
+        print(f"Using pre-converted model from {converted_dir}")
+        model_path = converted_dir
+        torch_dtype = getattr(torch, _resolve_dtype(dtype))
+
     print(f"Downloading/loading processor from {model_path}")
     # Load processor
     processor = AutoProcessor.from_pretrained(
-        model_path, 
+        model_path,
         trust_remote_code=True,
         cache_dir=local_cache_dir
     )
-    
+
     print(f"Downloading/loading model from {model_path}")
     # Load model
     model = AutoModelForCausalLM.from_pretrained(
         model_path,
         device_map=device_map,
-        torch_dtype="auto",
+        torch_dtype=torch_dtype,
         trust_remote_code=True,
         _attn_implementation=attn_implementation,
+        low_cpu_mem_usage=True,
         cache_dir=local_cache_dir
     )
-    
+
     print(f"Downloading/loading generation config from {model_path}")
     # Load generation config
     generation_config = GenerationConfig.from_pretrained(
         model_path,
         cache_dir=local_cache_dir
     )
-    
+
     print(f"Model successfully loaded to {device_map}")
-    return model, processor, generation_config
\ No newline at end of file
+    return model, processor, generation_config
+
+def convert_phi4_model(local_cache_dir=None, device="auto", dtype="auto"):
+    """
+    Save a copy of the model cast for one device and dtype, which
+    download_phi4_model then loads directly instead of the original checkpoint.
+
+    Conversion runs on CPU, so a GPU copy can be prepared on a machine without
+    a GPU.
+
+    Parameters:
+    -----------
+    local_cache_dir : str, optional
+        Cache directory the model is downloaded to (and the copy saved under).
+    device : str, optional
+        Device the copy is for. Options: "auto", "cpu", "cuda", "mps".
+    dtype : str, optional
+        "auto" (bfloat16), "bfloat16", "float16" or "float32".
+
+    Returns:
+    --------
+    str
+        Path of the converted copy
+    """
+    device = _resolve_device(device)
+    dtype = _resolve_dtype(dtype)
+    output_dir = converted_model_dir(local_cache_dir, device, dtype)
+    if os.path.exists(os.path.join(output_dir, CONVERSION_INFO)):
+        print(f"Pre-converted {device}/{dtype} copy already exists: {output_dir}")
+        return output_dir
+
+    print(f"Converting {MODEL_PATH} to {dtype} for {device}...")
+    start_time = time.time()
+    processor = AutoProcessor.from_pretrained(MODEL_PATH, trust_remote_code=True, cache_dir=local_cache_dir)
+    model = AutoModelForCausalLM.from_pretrained(
+        MODEL_PATH,
+        torch_dtype=getattr(torch, dtype),
+        trust_remote_code=True,
+        _attn_implementation="eager",
+        low_cpu_mem_usage=True,
+        cache_dir=local_cache_dir
+    )
+    generation_config = GenerationConfig.from_pretrained(MODEL_PATH, cache_dir=local_cache_dir)
+
+    # Write to a temporary directory so an interrupted conversion is never picked up
+    tmp_dir = output_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(tmp_dir, safe_serialization=True)
+    processor.save_pretrained(tmp_dir)
+    generation_config.save_pretrained(tmp_dir)
+    with open(os.path.join(tmp_dir, CONVERSION_INFO), "w") as f:
+        json.dump({"model": MODEL_PATH, "device": device, "dtype": dtype, "converted_at": time.time()}, f, indent=2)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(tmp_dir, output_dir)
+
+    print(f"Converted in {time.time() - start_time:.2f} seconds: {output_dir}")
+    return output_dir
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download the Phi-4-multimodal-instruct model")
+    parser.add_argument("--cache-dir", default=None, help="Model cache directory (default: Hugging Face cache)")
+    parser.add_argument("--device", default="auto", choices=["auto", "cpu", "cuda", "mps"],
+                        help="Device to load on, or that the converted copy is for")
+    parser.add_argument("--dtype", default="auto", choices=["auto", "bfloat16", "float16", "float32"],
+                        help="Weight dtype (auto keeps the checkpoint's bfloat16)")
+    parser.add_argument("--convert", action="store_true",
+                        help="Save a copy pre-converted for --device/--dtype instead of loading the model")
+    args = parser.parse_args()
+
+    if args.convert:
+        convert_phi4_model(args.cache_dir, args.device, args.dtype)
+    else:
+        download_phi4_model(args.cache_dir, args.device, args.dtype)
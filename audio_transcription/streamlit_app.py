@@ -1,8 +1,7 @@
 import streamlit as st
 import os
 import tempfile
-from model_downloader import download_phi4_model
-from audio_transcriber import transcribe_audio
+from audio_transcriber import TranscriptionService
 
 st.set_page_config(page_title="Phi-4 Audio Transcription", page_icon="🎤")
 
@@ -21,7 +20,8 @@ def get_cache_dir():
 def load_model():
     """Load the Phi-4 model with caching to avoid reloading"""
     cache_dir = get_cache_dir()
-    return download_phi4_model(local_cache_dir=cache_dir)
+    # One service (and model) shared by every session
+    return TranscriptionService(local_cache_dir=cache_dir)
 
 st.title("Phi-4 Audio Transcription")
 st.write("Upload an audio file to transcribe it using Microsoft's Phi-4 multimodal model.")
@@ -32,7 +32,7 @@ st.info(f"Using Hugging Face cache: {cache_dir}")
 
 # Model loading status
 with st.spinner("Loading Phi-4 model... This might take a few minutes."):
-    model, processor, generation_config = load_model()
+    service = load_model()
     st.success("Model loaded successfully!")
 
 # File uploader
@@ -50,7 +50,12 @@ if audio_file is not None:
     # Transcribe button
     if st.button("Transcribe Audio"):
         with st.spinner("Transcribing..."):
-            transcription = transcribe_audio(tmp_filepath, model, processor, generation_config)
+            # Long recordings are transcribed in overlapping chunks; show how far along it is
+            progress_bar = st.progress(0.0, text="Transcribing...")
+            def show_progress(done, total):
+                progress_bar.progress(done / total, text=f"Transcribed chunk {done} of {total}")
+            transcription = service.transcribe(tmp_filepath, progress=show_progress)
+            progress_bar.empty()
             
             # Display transcription
             st.subheader("Transcription")
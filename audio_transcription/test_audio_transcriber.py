@@ -0,0 +1,32 @@
+import unittest
+from audio_transcriber import stitch
+
+class TestStitch(unittest.TestCase):
+    def test_joins_at_overlap(self):
+        """Words transcribed in both windows appear once."""
+        self.assertEqual(
+            stitch("the quick brown fox jumps over", "fox jumps over the lazy dog"),
+            "the quick brown fox jumps over the lazy dog"
+        )
+
+    def test_ignores_punctuation_and_case(self):
+        """Matching ignores punctuation and case differences between windows."""
+        self.assertEqual(
+            stitch("and then we left. The", "we left, the rain stopped"),
+            "and then we left. The rain stopped"
+        )
+
+    def test_repeated_phrase_outside_overlap(self):
+        """A phrase that recurs further apart than the overlap is not mistaken for it."""
+        self.assertEqual(
+            stitch("it was one of the best days ever", "days ever and then we had one of the nicest dinners"),
+            "it was one of the best days ever and then we had one of the nicest dinners"
+        )
+
+    def test_no_overlap_concatenates(self):
+        """Without shared words the texts are joined as they are."""
+        self.assertEqual(stitch("hello there", "general kenobi"), "hello there general kenobi")
+        self.assertEqual(stitch("", "first chunk"), "first chunk")
+
+if __name__ == "__main__":
+    unittest.main()
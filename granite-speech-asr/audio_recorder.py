@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 """
 Audio recorder script for creating 16kHz WAV files.
+
+Capture runs in PyAudio callback mode: the PortAudio thread copies each
+buffer into a preallocated NumPy ring buffer and never waits on Python
+code, so a slow consumer (or heavy inference in the same process) only
+shows up in the overrun counter instead of as a glitch in the recording.
 """
 import pyaudio
 import wave
@@ -10,37 +15,249 @@ from datetime import datetime
 import threading
 import time
 
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated single-producer / single-consumer int16 ring buffer."""
+
+    def __init__(self, capacity_frames, channels=1):
+        self.capacity = int(capacity_frames)
+        self.channels = channels
+        self.buffer = np.zeros((self.capacity, channels), dtype=np.int16)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overruns = 0
+        self.underruns = 0
+        self.dropped_frames = 0
+        self._cond = threading.Condition()
+
+    @property
+    def available(self):
+        """Number of frames waiting to be read."""
+        return self.write_pos - self.read_pos
+
+    def write(self, data):
+        """Copy frames in from the capture callback. Never blocks."""
+        frames = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+        n = len(frames)
+        free = self.capacity - self.available
+        if n > free:
+            # Consumer fell behind: drop the newest frames rather than
+            # overwrite data the reader has not seen yet.
+            self.overruns += 1
+            self.dropped_frames += n - free
+            frames = frames[:free]
+            n = free
+        if n:
+            start = self.write_pos % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = frames[:first]
+            self.buffer[:n - first] = frames[first:]
+        with self._cond:
+            self.write_pos += n
+            self._cond.notify()
+
+    def read(self, max_frames, timeout=None):
+        """Return up to ``max_frames`` frames as bytes, waiting up to ``timeout``.
+
+        A read that times out before ``max_frames`` are available counts as
+        an underrun (the producer starved the consumer).
+        """
+        with self._cond:
+            if timeout and not self._cond.wait_for(lambda: self.available >= max_frames, timeout):
+                self.underruns += 1
+            n = min(max_frames, self.available)
+        if not n:
+            return b''
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out = np.concatenate((self.buffer[start:start + first], self.buffer[:n - first]))
+        with self._cond:
+            self.read_pos += n
+        return out.tobytes()
+
+
+class FileInputStream:
+    """Fake PyAudio input stream that replays a WAV file through the callback."""
+
+    def __init__(self, path, frames_per_buffer, stream_callback, realtime=True, loop=False):
+        self.path = path
+        self.frames_per_buffer = frames_per_buffer
+        self.stream_callback = stream_callback
+        self.realtime = realtime
+        self.loop = loop
+        self._active = False
+        self._thread = None
+
+    def _run(self):
+        with wave.open(self.path, 'rb') as wf:
+            period = self.frames_per_buffer / wf.getframerate()
+            next_tick = time.monotonic()
+            while self._active:
+                data = wf.readframes(self.frames_per_buffer)
+                if not data:
+                    if not self.loop:
+                        break
+                    wf.rewind()
+                    continue
+                result = self.stream_callback(data, len(data) // (2 * wf.getnchannels()), {}, 0)
+                if result[1] != pyaudio.paContinue:
+                    break
+                if self.realtime:
+                    next_tick += period
+                    time.sleep(max(0.0, next_tick - time.monotonic()))
+        self._active = False
+
+    def start_stream(self):
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def is_active(self):
+        return self._active
+
+    def stop_stream(self):
+        self._active = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        self.stop_stream()
+
+
+class FileInputDevice:
+    """Drop-in for ``pyaudio.PyAudio`` that reads from a WAV file (headless testing)."""
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        with wave.open(path, 'rb') as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+            self.sample_rate = wf.getframerate()
+            self.channels = wf.getnchannels()
+
+    def open(self, format, channels, rate, input=True, frames_per_buffer=1024,
+             stream_callback=None, **kwargs):
+        if rate != self.sample_rate or channels != self.channels:
+            raise ValueError(
+                f"{self.path} is {self.sample_rate}Hz/{self.channels}ch, "
+                f"requested {rate}Hz/{channels}ch"
+            )
+        stream = FileInputStream(self.path, frames_per_buffer, stream_callback,
+                                 realtime=self.realtime, loop=self.loop)
+        stream.start_stream()
+        return stream
+
+    def get_sample_size(self, format):
+        return pyaudio.get_sample_size(format)
+
+    def get_default_input_device_info(self):
+        return {'defaultLowInputLatency': 0.01, 'defaultHighInputLatency': 0.1}
+
+    def terminate(self):
+        pass
+
+
 class AudioRecorder:
-    def __init__(self, sample_rate=16000, channels=1, chunk_size=1024):
+    def __init__(self, sample_rate=16000, channels=1, chunk_size=1024,
+                 latency=None, buffer_seconds=30.0, audio=None):
+        """
+        Args:
+            latency: Callback period, either seconds or ``'low'``/``'high'`` to
+                use the input device's default latency. ``None`` keeps
+                ``chunk_size`` as the PortAudio buffer size.
+            buffer_seconds: Capacity of the ring buffer between the capture
+                callback and the consumer.
+            audio: PyAudio-compatible backend, e.g. ``FileInputDevice``.
+        """
         self.sample_rate = sample_rate
         self.channels = channels
         self.chunk_size = chunk_size
         self.format = pyaudio.paInt16
-        self.audio = pyaudio.PyAudio()
+        self.audio = audio if audio is not None else pyaudio.PyAudio()
+        self.frames_per_buffer = self._frames_per_buffer(latency)
+        self.buffer_seconds = buffer_seconds
+        self.ring = None
+        self.input_overflows = 0
+        self.input_underflows = 0
         self.recording = False
         self.frames = []
+
+    def _frames_per_buffer(self, latency):
+        """Translate the requested latency into a PortAudio buffer size."""
+        if latency is None:
+            return self.chunk_size
+        if latency in ('low', 'high'):
+            info = self.audio.get_default_input_device_info()
+            key = 'defaultLowInputLatency' if latency == 'low' else 'defaultHighInputLatency'
+            latency = info[key]
+        return max(32, int(round(float(latency) * self.sample_rate)))
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PortAudio callback: copy into the ring buffer and return immediately."""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        if status & pyaudio.paInputUnderflow:
+            self.input_underflows += 1
+        self.ring.write(in_data)
+        return (None, pyaudio.paContinue)
+
+    def _open_stream(self):
+        self.ring = RingBuffer(self.sample_rate * self.buffer_seconds, self.channels)
+        self.input_overflows = 0
+        self.input_underflows = 0
+        return self.audio.open(
+            format=self.format,
+            channels=self.channels,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback
+        )
+
+    def _drain(self):
+        """Move everything left in the ring buffer into ``self.frames``."""
+        while self.ring.available:
+            self.frames.append(self.ring.read(self.ring.available))
+
+    @property
+    def stats(self):
+        """Capture health counters for the last recording."""
+        ring = self.ring
+        return {
+            'overruns': (ring.overruns if ring else 0) + self.input_overflows,
+            'underruns': (ring.underruns if ring else 0) + self.input_underflows,
+            'dropped_frames': ring.dropped_frames if ring else 0,
+            'frames_per_buffer': self.frames_per_buffer,
+            'latency_ms': 1000.0 * self.frames_per_buffer / self.sample_rate,
+        }
+
+    @property
+    def duration(self):
+        """Length of the captured audio in seconds."""
+        bytes_per_frame = self.channels * self.audio.get_sample_size(self.format)
+        return sum(len(f) for f in self.frames) / (bytes_per_frame * self.sample_rate)
         
     def start_recording(self):
         """Start recording audio."""
         self.frames = []
         self.recording = True
         
-        stream = self.audio.open(
-            format=self.format,
-            channels=self.channels,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_size
-        )
+        stream = self._open_stream()
         
         print("Recording started... Press Enter to stop")
         
-        while self.recording:
-            data = stream.read(self.chunk_size)
-            self.frames.append(data)
+        while self.recording and stream.is_active():
+            data = self.ring.read(self.chunk_size, timeout=0.5)
+            if data:
+                self.frames.append(data)
         
         stream.stop_stream()
         stream.close()
+        self._drain()
         print("Recording stopped.")
     
     def stop_recording(self):
@@ -68,20 +285,17 @@ class AudioRecorder:
     def record_fixed_duration(self, duration_seconds):
         """Record for a fixed duration."""
         self.frames = []
+        remaining = int(self.sample_rate * duration_seconds)
         
-        stream = self.audio.open(
-            format=self.format,
-            channels=self.channels,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_size
-        )
+        stream = self._open_stream()
         
         print(f"Recording for {duration_seconds} seconds...")
         
-        for i in range(0, int(self.sample_rate / self.chunk_size * duration_seconds)):
-            data = stream.read(self.chunk_size)
-            self.frames.append(data)
+        while remaining > 0 and (stream.is_active() or self.ring.available):
+            data = self.ring.read(min(self.chunk_size, remaining), timeout=0.5)
+            if data:
+                self.frames.append(data)
+                remaining -= len(data) // (2 * self.channels)
         
         stream.stop_stream()
         stream.close()
@@ -101,11 +315,16 @@ def input_listener(recorder):
 @click.option('--filename', '-f', default=None, help='Specific filename (default: timestamp)')
 @click.option('--duration', '-d', type=int, default=None, help='Recording duration in seconds (default: manual stop)')
 @click.option('--sample-rate', '-sr', default=16000, help='Sample rate (default: 16kHz)')
-def main(output, filename, duration, sample_rate):
+@click.option('--latency', '-l', default=None, help="Capture latency in seconds, or 'low'/'high' (default: chunk size)")
+@click.option('--buffer-seconds', default=30.0, help='Ring buffer capacity in seconds (default: 30)')
+@click.option('--input-file', default=None, type=click.Path(exists=True), help='Replay a 16-bit WAV file instead of the microphone')
+def main(output, filename, duration, sample_rate, latency, buffer_seconds, input_file):
     """Record audio and save as WAV file at 16kHz."""
     
     # Create recorder
-    recorder = AudioRecorder(sample_rate=sample_rate)
+    audio = FileInputDevice(input_file) if input_file else None
+    recorder = AudioRecorder(sample_rate=sample_rate, latency=latency,
+                             buffer_seconds=buffer_seconds, audio=audio)
     
     try:
         if duration:
@@ -118,12 +337,11 @@ def main(output, filename, duration, sample_rate):
             record_thread.start()
             
             # Listen for user input to stop
-            input_thread = threading.Thread(target=input_listener, args=(recorder,))
+            input_thread = threading.Thread(target=input_listener, args=(recorder,), daemon=True)
             input_thread.start()
             
             # Wait for recording to finish
             record_thread.join()
-            input_thread.join()
         
         # Generate filename if not provided
         if filename is None:
@@ -139,10 +357,14 @@ def main(output, filename, duration, sample_rate):
         
         # Save recording
         if recorder.save_recording(filepath):
+            stats = recorder.stats
             print(f"✅ Successfully saved: {filepath}")
             print(f"   Sample rate: {sample_rate}Hz")
             print(f"   Channels: 1 (mono)")
-            print(f"   Duration: {len(recorder.frames) * recorder.chunk_size / sample_rate:.2f} seconds")
+            print(f"   Duration: {recorder.duration:.2f} seconds")
+            print(f"   Latency: {stats['latency_ms']:.1f} ms ({stats['frames_per_buffer']} frames)")
+            print(f"   Overruns: {stats['overruns']} ({stats['dropped_frames']} frames dropped), "
+                  f"underruns: {stats['underruns']}")
         
     except KeyboardInterrupt:
         print("\n🛑 Recording interrupted by user")
@@ -2,20 +2,143 @@
 """
 Pre-download ASR models to avoid cold start delays.
 Supports both IBM Granite and NVIDIA Parakeet models.
+
+Downloads are verified from file metadata only (safetensors headers and the
+shard index for Granite, the archive listing for Parakeet) instead of
+instantiating the model, so preparing a node needs neither the model's RAM
+nor minutes of CPU. Several models can be prefetched in parallel, with a JSON
+report of what was fetched and verified.
+
+With --convert, a copy of the Granite weights already cast to the dtype the
+transcriber uses on the target device is saved as safetensors, so service
+start-up memory-maps it instead of converting the checkpoint every time.
 """
 import os
+import json
+import math
+import shutil
+import struct
+import tarfile
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DEFAULT_MODELS = [
+    "ibm-granite/granite-speech-3.3-8b",
+    "nvidia/parakeet-tdt-0.6b-v2"
+]
+
+# Anything larger is not a real safetensors header
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+
+def read_safetensors_header(path):
+    """
+    Read the JSON header of a safetensors file without touching the tensor data.
+    
+    Returns:
+        (tensors, metadata): tensor name -> {dtype, shape, data_offsets}, and the
+        optional ``__metadata__`` dict.
+    """
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) < 8:
+            raise ValueError(f"{path.name} is too short to be a safetensors file")
+        (header_size,) = struct.unpack("<Q", raw)
+        if header_size > MAX_HEADER_BYTES:
+            raise ValueError(f"{path.name} has an implausible header size ({header_size} bytes)")
+        header = json.loads(f.read(header_size))
+    
+    metadata = header.pop("__metadata__", {}) or {}
+    data_size = max((tensor["data_offsets"][1] for tensor in header.values()), default=0)
+    expected_size = 8 + header_size + data_size
+    actual_size = path.stat().st_size
+    if actual_size != expected_size:
+        raise ValueError(
+            f"{path.name} is truncated or corrupt: header describes {expected_size:,} bytes, file has {actual_size:,}"
+        )
+    return header, metadata
 
-def download_granite_model(model_name="ibm-granite/granite-speech-3.3-8b", cache_dir=None):
+def verify_safetensors(model_dir):
+    """
+    Verify a safetensors checkpoint from its index and shard headers only.
+    
+    Checks that every shard named in ``model.safetensors.index.json`` exists, has
+    the size its header describes, and holds every tensor the index maps to it,
+    and that the tensor bytes add up to the index's ``total_size``.
+    
+    Returns:
+        dict with the parameter, tensor and shard counts and the weight bytes.
+    """
+    model_dir = Path(model_dir)
+    index_path = model_dir / "model.safetensors.index.json"
+    if index_path.exists():
+        index = json.loads(index_path.read_text())
+        weight_map = index["weight_map"]
+        shards = sorted(set(weight_map.values()))
+        expected_bytes = index.get("metadata", {}).get("total_size")
+    else:
+        weight_map = None
+        shards = sorted(path.name for path in model_dir.glob("*.safetensors"))
+        expected_bytes = None
+    if not shards:
+        raise ValueError(f"No safetensors weights found in {model_dir}")
+    
+    parameters = 0
+    tensor_bytes = 0
+    tensor_shards = {}
+    for shard in shards:
+        shard_path = model_dir / shard
+        if not shard_path.exists():
+            raise ValueError(f"Shard {shard} listed in the index is missing")
+        tensors, _ = read_safetensors_header(shard_path)
+        for name, tensor in tensors.items():
+            parameters += math.prod(tensor["shape"])
+            start, end = tensor["data_offsets"]
+            tensor_bytes += end - start
+            tensor_shards[name] = shard
+    
+    if weight_map is not None:
+        misplaced = [name for name, shard in weight_map.items() if tensor_shards.get(name) != shard]
+        if misplaced:
+            raise ValueError(f"{len(misplaced)} tensor(s) in the index are missing from their shard, e.g. {misplaced[0]}")
+    if expected_bytes is not None and int(expected_bytes) != tensor_bytes:
+        raise ValueError(f"Tensor data is {tensor_bytes:,} bytes, index says {int(expected_bytes):,}")
+    
+    return {
+        "parameters": parameters,
+        "tensors": len(tensor_shards),
+        "shards": len(shards),
+        "weight_bytes": tensor_bytes,
+    }
+
+def verify_nemo_archive(path):
+    """Check that a .nemo archive lists its config and weights, without extracting it."""
+    with tarfile.open(path, "r:*") as archive:
+        members = {Path(member.name).name: member for member in archive.getmembers()}
+    missing = [name for name in ("model_config.yaml", "model_weights.ckpt") if name not in members]
+    if missing:
+        raise ValueError(f"{Path(path).name} is missing {', '.join(missing)}")
+    return {"weight_bytes": members["model_weights.ckpt"].size}
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, dirnames, filenames in os.walk(path)
+        for filename in filenames
+    )
+
+def download_granite_model(model_name="ibm-granite/granite-speech-3.3-8b", cache_dir=None, report=None):
     """
     Download and cache the Granite Speech model.
     
     Args:
         model_name: Hugging Face model name
         cache_dir: Custom cache directory (optional)
+        report: Dict filled in with what was downloaded and verified (optional)
     """
     print(f"📥 Downloading Granite model: {model_name}")
+    report = {} if report is None else report
     
     # Set cache directory - default to ./models if not specified
     if cache_dir is None:
@@ -31,62 +154,54 @@ def download_granite_model(model_name="ibm-granite/granite-speech-3.3-8b", cache
     
     print(f"📁 Using cache directory: {cache_dir}")
     
-    # Now import transformers after setting environment variables
-    from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
-    import torch
+    # Same cache layout from_pretrained(cache_dir=...) reads, without loading anything
+    from huggingface_hub import snapshot_download
     
     start_time = time.time()
     
     try:
-        # Download processor
-        print("📥 Downloading processor...")
-        processor = AutoProcessor.from_pretrained(model_name, cache_dir=cache_dir)
-        
-        # Download model
-        print("📥 Downloading model...")
-        model = AutoModelForSpeechSeq2Seq.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-        )
+        # Download processor, config and weights
+        print("📥 Downloading model files...")
+        snapshot_dir = snapshot_download(repo_id=model_name, cache_dir=cache_dir)
         
         download_time = time.time() - start_time
         print(f"✅ Granite model downloaded successfully in {download_time:.2f} seconds")
         
-        # Get model size info
-        param_count = sum(p.numel() for p in model.parameters())
-        print(f"📊 Model parameters: {param_count:,}")
+        # Verify from the index and shard headers; no weights are read
+        print("🔍 Verifying safetensors metadata...")
+        info = verify_safetensors(snapshot_dir)
+        print(f"✅ {info['shards']} shard(s), {info['tensors']:,} tensors verified")
+        print(f"📊 Model parameters: {info['parameters']:,}")
         
         # Show actual cache location
         model_cache_path = os.path.join(cache_dir, "models--" + model_name.replace("/", "--"))
-        print(f"📁 Model should be cached at: {model_cache_path}")
-        if os.path.exists(model_cache_path):
-            print(f"✅ Model cache directory exists")
-            # Show cache size
-            cache_size = sum(
-                os.path.getsize(os.path.join(dirpath, filename))
-                for dirpath, dirnames, filenames in os.walk(model_cache_path)
-                for filename in filenames
-            )
-            print(f"📦 Cache size: {cache_size / (1024**3):.2f} GB")
-        else:
-            print(f"⚠️ Model cache directory not found - check cache configuration")
+        print(f"📁 Model cached at: {model_cache_path}")
+        cache_size = directory_size(model_cache_path)
+        print(f"📦 Cache size: {cache_size / (1024**3):.2f} GB")
         
+        report.update(info, path=snapshot_dir, cache_bytes=cache_size, download_seconds=round(download_time, 2))
         return True
         
     except Exception as e:
         print(f"❌ Error downloading Granite model: {e}")
+        report["error"] = str(e)
         return False
 
-def download_parakeet_model(model_name="nvidia/parakeet-tdt-0.6b-v2", cache_dir=None):
+def download_parakeet_model(model_name="nvidia/parakeet-tdt-0.6b-v2", cache_dir=None, report=None):
     """
-    Download and cache the Parakeet model using NeMo.
+    Download and cache the Parakeet model's .nemo archive.
+    
+    The download goes through NeMo itself, so the archive lands where
+    ASRModel.from_pretrained looks for it. The process that loads the model
+    must run with the same NEMO_CACHE_DIR (printed at the end).
     
     Args:
         model_name: NeMo model name
         cache_dir: Custom cache directory (optional)
+        report: Dict filled in with what was downloaded and verified (optional)
     """
     print(f"📥 Downloading Parakeet model: {model_name}")
+    report = {} if report is None else report
     
     # Set cache directory - default to ./models if not specified
     if cache_dir is None:
@@ -95,8 +210,10 @@ def download_parakeet_model(model_name="nvidia/parakeet-tdt-0.6b-v2", cache_dir=
     # Ensure cache directory exists
     os.makedirs(cache_dir, exist_ok=True)
     
-    # Set NeMo cache directory
-    os.environ["NEMO_CACHE"] = cache_dir
+    # Set NeMo cache directory (read by NeMo when it resolves its cache)
+    nemo_cache_path = os.path.abspath(os.path.join(cache_dir, "NeMo"))
+    os.environ["NEMO_CACHE"] = nemo_cache_path
+    os.environ["NEMO_CACHE_DIR"] = nemo_cache_path
     
     print(f"📁 Using cache directory: {cache_dir}")
     
@@ -105,87 +222,216 @@ def download_parakeet_model(model_name="nvidia/parakeet-tdt-0.6b-v2", cache_dir=
         
         start_time = time.time()
         
-        # Download and instantiate the model
+        # return_config downloads the archive and reads only its config, without building the model
         print("📥 Downloading NeMo model...")
-        asr_model = nemo_asr.models.ASRModel.from_pretrained(model_name=model_name)
+        nemo_asr.models.ASRModel.from_pretrained(model_name=model_name, return_config=True)
         
         download_time = time.time() - start_time
         print(f"✅ Parakeet model downloaded successfully in {download_time:.2f} seconds")
         
-        # Get model info
-        print(f"📊 Model type: {type(asr_model).__name__}")
-        print(f"📊 Model language: {getattr(asr_model, 'language', 'Unknown')}")
+        archive_name = model_name.split("/")[-1]
+        archives = sorted(
+            (p for p in Path(nemo_cache_path).rglob("*.nemo") if archive_name in str(p)),
+            key=lambda p: p.stat().st_mtime
+        )
+        if not archives:
+            raise ValueError(f"No .nemo archive for {model_name} found under {nemo_cache_path}")
+        print("🔍 Verifying archive contents...")
+        info = verify_nemo_archive(archives[-1])
+        print(f"✅ {archives[-1].name} verified ({info['weight_bytes'] / (1024**3):.2f} GB of weights)")
         
         # Show cache size
-        nemo_cache_path = os.path.join(cache_dir, "NeMo")
-        if os.path.exists(nemo_cache_path):
-            cache_size = sum(
-                os.path.getsize(os.path.join(dirpath, filename))
-                for dirpath, dirnames, filenames in os.walk(nemo_cache_path)
-                for filename in filenames
-            )
-            print(f"📦 Cache size: {cache_size / (1024**3):.2f} GB")
+        cache_size = directory_size(nemo_cache_path)
+        print(f"📦 Cache size: {cache_size / (1024**3):.2f} GB")
+        
+        print(f"💡 Load it with NEMO_CACHE_DIR={nemo_cache_path} set, or NeMo downloads it again")
         
+        report.update(info, path=str(archives[-1]), nemo_cache_dir=nemo_cache_path, cache_bytes=cache_size, download_seconds=round(download_time, 2))
         return True
         
     except Exception as e:
         print(f"❌ Error downloading Parakeet model: {e}")
+        report["error"] = str(e)
+        return False
+
+def convert_granite_model(model_name="ibm-granite/granite-speech-3.3-8b", cache_dir=None, device="auto", dtype="auto", report=None):
+    """
+    Save a copy of a downloaded Granite model cast for one device and dtype.
+    
+    GraniteTranscriber.load_model picks the copy up automatically. Conversion
+    runs on CPU, so GPU copies can be prepared on a machine without a GPU.
+    
+    Args:
+        model_name: Hugging Face model name (must already be downloaded)
+        cache_dir: Custom cache directory (optional)
+        device: Device the copy is for: auto, cpu or cuda
+        dtype: auto (what the transcriber uses on that device), float32, float16 or bfloat16
+        report: Dict filled in with the conversion result (optional)
+    """
+    import torch
+    from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
+    from transcriber_transformers import CONVERSION_INFO, converted_model_dir
+    
+    report = {} if report is None else report
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(__file__), "models")
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if dtype == "auto":
+        dtype = "float32" if device == "cpu" else "float16"
+    
+    output_dir = converted_model_dir(cache_dir, model_name, device, dtype)
+    report["converted_path"] = output_dir
+    if os.path.exists(os.path.join(output_dir, CONVERSION_INFO)):
+        print(f"✅ Pre-converted {device}/{dtype} copy already exists: {output_dir}")
+        return True
+    
+    print(f"🔄 Converting {model_name} to {dtype} for {device}...")
+    start_time = time.time()
+    
+    try:
+        processor = AutoProcessor.from_pretrained(model_name, cache_dir=cache_dir, local_files_only=True)
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_name,
+            cache_dir=cache_dir,
+            local_files_only=True,
+            torch_dtype=getattr(torch, dtype),
+            low_cpu_mem_usage=True
+        )
+        
+        # Write to a temporary directory so an interrupted conversion is never picked up
+        tmp_dir = output_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        model.save_pretrained(tmp_dir, safe_serialization=True, max_shard_size="5GB")
+        processor.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, CONVERSION_INFO), "w") as f:
+            json.dump({
+                "model": model_name,
+                "device": device,
+                "dtype": dtype,
+                "torch": torch.__version__,
+                "converted_at": time.time(),
+            }, f, indent=2)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.rename(tmp_dir, output_dir)
+        
+        convert_time = time.time() - start_time
+        size = directory_size(output_dir)
+        print(f"✅ Converted in {convert_time:.2f} seconds ({size / (1024**3):.2f} GB): {output_dir}")
+        report.update(converted_bytes=size, convert_seconds=round(convert_time, 2))
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error converting Granite model: {e}")
+        report["error"] = str(e)
         return False
 
-def download_model(model_name, cache_dir=None):
+def download_model(model_name, cache_dir=None, report=None):
     """
     Download model based on model name - automatically detects model type.
     
     Args:
         model_name: Model name (either Granite or Parakeet)
         cache_dir: Custom cache directory (optional)
+        report: Dict filled in with what was downloaded and verified (optional)
     """
+    report = {} if report is None else report
     if "granite" in model_name.lower():
-        return download_granite_model(model_name, cache_dir)
+        report["type"] = "granite"
+        return download_granite_model(model_name, cache_dir, report)
     elif "parakeet" in model_name.lower():
-        return download_parakeet_model(model_name, cache_dir)
+        report["type"] = "parakeet"
+        return download_parakeet_model(model_name, cache_dir, report)
     else:
         # Try Granite first, then Parakeet if it fails
         print(f"⚠️ Unknown model type, trying Granite format first...")
-        if download_granite_model(model_name, cache_dir):
+        report["type"] = "granite"
+        if download_granite_model(model_name, cache_dir, report):
             return True
         print(f"⚠️ Granite format failed, trying Parakeet format...")
-        return download_parakeet_model(model_name, cache_dir)
+        report.pop("error", None)
+        report["type"] = "parakeet"
+        return download_parakeet_model(model_name, cache_dir, report)
+
+def prefetch_models(models, cache_dir=None, workers=2, convert=None):
+    """
+    Download and verify several models in parallel.
+    
+    Args:
+        models: Model names (Granite or Parakeet)
+        cache_dir: Custom cache directory (optional)
+        workers: Models downloaded at the same time
+        convert: Dict with ``device`` and ``dtype`` to also save pre-converted
+            Granite weights (optional)
+    
+    Returns:
+        Report dict with one entry per model, in the order given.
+    """
+    start_time = time.time()
+    
+    def fetch(model_name):
+        report = {"model": model_name}
+        model_start = time.time()
+        report["ok"] = download_model(model_name, cache_dir, report)
+        if report["ok"] and convert:
+            if report["type"] == "granite":
+                report["ok"] = convert_granite_model(model_name, cache_dir, report=report, **convert)
+            else:
+                print(f"ℹ️ Skipping conversion for {model_name}: NeMo restores its own archive")
+        report["seconds"] = round(time.time() - model_start, 2)
+        return report
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        reports = list(pool.map(fetch, models))
+    
+    return {
+        "ok": all(report["ok"] for report in reports),
+        "seconds": round(time.time() - start_time, 2),
+        "models": reports,
+    }
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download ASR models")
-    parser.add_argument("--model", "-m", default="ibm-granite/granite-speech-3.3-8b", 
-                       help="Model name (Granite or Parakeet)")
+    parser.add_argument("--model", "-m", action="append", default=None,
+                       help="Model name (Granite or Parakeet); repeat to prefetch several "
+                            "(default: ibm-granite/granite-speech-3.3-8b)")
     parser.add_argument("--cache-dir", "-c", default=None, 
                        help="Custom cache directory (default: ./models)")
     parser.add_argument("--all", action="store_true",
                        help="Download all supported models")
+    parser.add_argument("--workers", "-w", type=int, default=2,
+                       help="Models downloaded in parallel")
+    parser.add_argument("--report", "-r", default=None,
+                       help="Write a JSON report to this file ('-' for stdout)")
+    parser.add_argument("--convert", action="store_true",
+                       help="Also save Granite weights pre-converted for --device/--dtype")
+    parser.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto",
+                       help="Device the converted copy is for (default: this machine's)")
+    parser.add_argument("--dtype", choices=["auto", "float32", "float16", "bfloat16"], default="auto",
+                       help="Dtype of the converted copy (default: what the transcriber uses on --device)")
     
     args = parser.parse_args()
     
     print("🚀 ASR Model Downloader")
     print("=" * 40)
     
-    if args.all:
-        # Download all supported models
-        models = [
-            "ibm-granite/granite-speech-3.3-8b",
-            "nvidia/parakeet-tdt-0.6b-v2"
-        ]
-        
-        success_count = 0
-        for model in models:
-            print(f"\n📥 Downloading {model}...")
-            if download_model(model, args.cache_dir):
-                success_count += 1
-        
-        print(f"\n🎉 Downloaded {success_count}/{len(models)} models successfully!")
+    models = DEFAULT_MODELS if args.all else (args.model or DEFAULT_MODELS[:1])
+    convert = {"device": args.device, "dtype": args.dtype} if args.convert else None
+    result = prefetch_models(models, args.cache_dir, args.workers, convert)
+    
+    if args.report == "-":
+        print(json.dumps(result, indent=2))
+    elif args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📝 Report written to {args.report}")
+    
+    success_count = sum(report["ok"] for report in result["models"])
+    if result["ok"]:
+        print(f"\n🎉 Downloaded {success_count}/{len(models)} model(s) successfully in {result['seconds']:.2f} seconds!")
     else:
-        # Download single model
-        success = download_model(args.model, args.cache_dir)
-        
-        if success:
-            print("🎉 Download complete!")
-        else:
-            print("❌ Download failed!")
-            exit(1)
\ No newline at end of file
+        for report in result["models"]:
+            if not report["ok"]:
+                print(f"❌ {report['model']}: {report.get('error', 'download failed')}")
+        print(f"❌ Download failed for {len(models) - success_count}/{len(models)} model(s)!")
+        exit(1)
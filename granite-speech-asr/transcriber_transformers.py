@@ -3,14 +3,23 @@
 Audio transcription using Hugging Face Transformers with Granite Speech model.
 Enhanced with persona-specific system prompts and post-processing for specialized transcription.
 """
+import numpy as np
 import torch
 import torchaudio
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
+from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq, GenerationMixin
 import click
 import os
 import time
 import re
 
+# Written next to weights pre-converted by model_download.py --convert
+CONVERSION_INFO = "conversion.json"
+
+def converted_model_dir(cache_dir, model_name, device, dtype):
+    """Where the copy of a model cast for one device and dtype is stored."""
+    device_type = str(device).split(":")[0]
+    return os.path.join(cache_dir, "converted", f"{model_name.replace('/', '--')}-{device_type}-{dtype}")
+
 class GraniteTranscriber:
     def __init__(self, model_name="ibm-granite/granite-speech-3.3-8b", cache_dir="./models"):
         self.model_name = model_name
@@ -92,6 +101,10 @@ When transcribing, focus on:
         print(f"🔧 Initializing transcriber on device: {self.device}")
         print(f"📁 Using cache directory: {self.cache_dir}")
         
+    @property
+    def torch_dtype(self):
+        return torch.float32 if self.device == "cpu" else torch.float16
+        
     def list_personas(self):
         """List available personas."""
         print("\n📋 Available personas:")
@@ -105,11 +118,31 @@ When transcribing, focus on:
             
         print(f"📥 Loading model: {self.model_name}")
         start_time = time.time()
+        torch_dtype = self.torch_dtype
+        converted_dir = converted_model_dir(
+            self.cache_dir, self.model_name, self.device, str(torch_dtype).replace("torch.", "")
+        )
         
         try:
             os.environ["HF_HOME"] = self.cache_dir
             os.environ["TRANSFORMERS_CACHE"] = self.cache_dir
             
+            if os.path.exists(os.path.join(converted_dir, CONVERSION_INFO)):
+                # Already cast and laid out for this device: safetensors are
+                # memory-mapped and placed directly, with no dtype conversion
+                self.processor = AutoProcessor.from_pretrained(converted_dir, local_files_only=True)
+                self.tokenizer = self.processor.tokenizer
+                self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
+                    converted_dir,
+                    local_files_only=True,
+                    torch_dtype=torch_dtype,
+                    low_cpu_mem_usage=True,
+                    device_map=self.device
+                )
+                print(f"✅ Model loaded from pre-converted weights: {converted_dir}")
+                print(f"✅ Model loaded successfully in {time.time() - start_time:.2f} seconds")
+                return
+            
             self.processor = AutoProcessor.from_pretrained(
                 self.model_name, cache_dir=self.cache_dir, local_files_only=True
             )
@@ -118,7 +151,7 @@ When transcribing, focus on:
                 self.model_name,
                 cache_dir=self.cache_dir,
                 local_files_only=True,
-                torch_dtype=torch.float32 if self.device == "cpu" else torch.float16
+                torch_dtype=torch_dtype
             ).to(self.device)
             
             print("✅ Model loaded from local cache")
@@ -133,7 +166,7 @@ When transcribing, focus on:
                 self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
                     self.model_name,
                     cache_dir=self.cache_dir,
-                    torch_dtype=torch.float32 if self.device == "cpu" else torch.float16
+                    torch_dtype=torch_dtype
                 ).to(self.device)
                 
                 print("✅ Model downloaded and loaded from Hugging Face")
@@ -174,6 +207,14 @@ When transcribing, focus on:
             print(f"❌ Error loading audio: {e}")
             raise
 
+    def _prepare_audio(self, audio):
+        """Accept a file path, or 16 kHz mono float32 samples that were already preprocessed."""
+        if isinstance(audio, (str, os.PathLike)):
+            return self.load_audio(audio)
+        wav = torch.from_numpy(np.array(audio, dtype=np.float32)).reshape(1, -1)
+        print(f"🎵 Using preprocessed audio ({wav.shape[1] / 16000:.2f} seconds)")
+        return wav, 16000
+
     def _format_report_text(self, text: str) -> str:
         """Applies post-processing rules to format the transcription."""
         print("⚙️ Applying post-processing rules...")
@@ -204,17 +245,43 @@ When transcribing, focus on:
         
         return text
 
-    def transcribe(self, audio_path, persona="veterinary_radiologist", custom_prompt=None):
-        """Transcribe audio file to text using specified persona."""
-        self.load_model()
-        
+    def _resolve_persona(self, persona):
         if persona not in self.personas:
             print(f"⚠️  Unknown persona '{persona}', using 'general' instead")
-            persona = "general"
+            return "general"
+        return persona
+
+    def _build_prompt(self, persona, custom_prompt=None):
+        """Render the chat template for one persona; contains a single <|audio|> placeholder."""
+        prompt_text = custom_prompt or "Please transcribe this speech into written format with high accuracy."
+        
+        chat = [
+            {"role": "system", "content": self.personas[persona]['system_prompt']},
+            {"role": "user", "content": f"<|audio|>{prompt_text}"}
+        ]
+        
+        return self.tokenizer.apply_chat_template(
+            chat, tokenize=False, add_generation_prompt=True
+        )
+
+    def _generation_kwargs(self):
+        return dict(
+            max_new_tokens=200, num_beams=4, do_sample=False, min_length=1,
+            top_p=1.0, repetition_penalty=1.0, length_penalty=1.0,
+            temperature=1.0, bos_token_id=self.tokenizer.bos_token_id,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+        )
+
+    def transcribe(self, audio, persona="veterinary_radiologist", custom_prompt=None):
+        """Transcribe an audio file (or 16 kHz mono samples) to text using specified persona."""
+        self.load_model()
+        
+        persona = self._resolve_persona(persona)
         
         print(f"🎭 Using persona: {self.personas[persona]['name']}")
         
-        wav, sr = self.load_audio(audio_path)
+        wav, sr = self._prepare_audio(audio)
         
         assert wav.shape[0] == 1 and sr == 16000, f"Expected mono 16kHz audio, got shape {wav.shape} at {sr}Hz"
         
@@ -222,16 +289,7 @@ When transcribing, focus on:
         start_time = time.time()
         
         try:
-            prompt_text = custom_prompt or "Please transcribe this speech into written format with high accuracy."
-            
-            chat = [
-                {"role": "system", "content": self.personas[persona]['system_prompt']},
-                {"role": "user", "content": f"<|audio|>{prompt_text}"}
-            ]
-            
-            text = self.tokenizer.apply_chat_template(
-                chat, tokenize=False, add_generation_prompt=True
-            )
+            text = self._build_prompt(persona, custom_prompt)
             
             model_inputs = self.processor(
                 text, wav, device=self.device, return_tensors="pt",
@@ -239,12 +297,7 @@ When transcribing, focus on:
             
             with torch.no_grad():
                 model_outputs = self.model.generate(
-                    **model_inputs,
-                    max_new_tokens=200, num_beams=4, do_sample=False, min_length=1,
-                    top_p=1.0, repetition_penalty=1.0, length_penalty=1.0,
-                    temperature=1.0, bos_token_id=self.tokenizer.bos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                    pad_token_id=self.tokenizer.pad_token_id,
+                    **model_inputs, **self._generation_kwargs()
                 )
             
             num_input_tokens = model_inputs["input_ids"].shape[-1]
@@ -269,6 +322,114 @@ When transcribing, focus on:
             print(f"❌ Error during transcription: {e}")
             raise
 
+    def transcribe_personas(self, audio, personas, custom_prompt=None):
+        """
+        Transcribe one audio file (or 16 kHz mono samples) under several
+        personas in a single call.
+        
+        The audio is decoded, feature-extracted and run through the speech
+        encoder/projector once; the projected audio embeddings are then shared
+        by every persona prompt and all prompts are decoded as one batch.
+        Returns {persona: transcription}.
+        """
+        self.load_model()
+        
+        personas = list(dict.fromkeys(self._resolve_persona(p) for p in personas))
+        if not personas:
+            return {}
+        
+        print(f"🎭 Using personas: {', '.join(self.personas[p]['name'] for p in personas)}")
+        
+        wav, sr = self._prepare_audio(audio)
+        
+        assert wav.shape[0] == 1 and sr == 16000, f"Expected mono 16kHz audio, got shape {wav.shape} at {sr}Hz"
+        
+        print(f"🤖 Generating {len(personas)} transcriptions with a shared audio encoding...")
+        start_time = time.time()
+        
+        # Decoder-only batching needs left padding so every prompt ends where generation starts
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            prompts = [self._build_prompt(persona, custom_prompt) for persona in personas]
+            
+            if hasattr(self.model, "get_audio_features") and hasattr(self.model, "get_merged_audio_embeddings"):
+                new_tokens = self._generate_shared_encoding(prompts, wav)
+            else:
+                # Older model classes: still one batched generate, but the encoder runs per row
+                print("⚠️  Model does not expose its audio encoder, batching full inputs instead")
+                model_inputs = self.processor(
+                    prompts, [wav] * len(prompts), device=self.device, return_tensors="pt",
+                ).to(self.device)
+                with torch.no_grad():
+                    model_outputs = self.model.generate(
+                        **model_inputs, **self._generation_kwargs()
+                    )
+                new_tokens = model_outputs[:, model_inputs["input_ids"].shape[-1]:]
+            
+            raw_transcriptions = self.tokenizer.batch_decode(
+                new_tokens, add_special_tokens=False, skip_special_tokens=True
+            )
+            
+            results = {
+                persona: self._format_report_text(raw.strip())
+                for persona, raw in zip(personas, raw_transcriptions)
+            }
+
+            inference_time = time.time() - start_time
+            audio_duration = wav.shape[1] / sr
+            rtf = inference_time / audio_duration
+            
+            print(f"✅ {len(results)} transcriptions completed in {inference_time:.2f} seconds (RTF: {rtf:.2f}x)")
+            
+            return results
+            
+        except Exception as e:
+            print(f"❌ Error during transcription: {e}")
+            raise
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+    def _generate_shared_encoding(self, prompts, wav):
+        """Encode ``wav`` once and batch-decode every prompt against the same audio embeddings."""
+        audio_inputs = self.processor.audio_processor(wav, device=self.device)
+        num_audio_tokens = int(audio_inputs["audio_embed_sizes"][0])
+        
+        # Expand the placeholder exactly as the processor would, once per prompt
+        audio_token = self.processor.audio_token
+        prompts = [prompt.replace(audio_token, audio_token * num_audio_tokens, 1) for prompt in prompts]
+        text_inputs = self.tokenizer(prompts, padding=True, return_tensors="pt").to(self.device)
+        
+        input_features = audio_inputs["input_features"].to(self.device, self.model.dtype)
+        input_features_mask = audio_inputs.get("input_features_mask")
+        
+        with torch.no_grad():
+            encode_start = time.time()
+            audio_embeds = self.model.get_audio_features(input_features)
+            if input_features_mask is not None:
+                audio_embeds = audio_embeds[input_features_mask.to(audio_embeds.device)]
+            audio_embeds = audio_embeds.reshape(1, -1, audio_embeds.shape[-1])
+            print(f"   Audio encoded once in {time.time() - encode_start:.2f} seconds")
+            
+            inputs_embeds = self.model.get_merged_audio_embeddings(
+                input_ids=text_inputs["input_ids"],
+                audio_features=audio_embeds.expand(len(prompts), -1, -1),
+            )
+            
+            # The model's own generate() disables the speech LoRA when no input_features are
+            # passed; the embeddings already contain the audio, so keep it enabled and go
+            # straight to the generic implementation.
+            if getattr(self.model, "_hf_peft_config_loaded", False):
+                self.model.enable_adapters()
+            
+            # With inputs_embeds only, generate() returns just the new tokens
+            return GenerationMixin.generate(
+                self.model,
+                inputs_embeds=inputs_embeds,
+                attention_mask=text_inputs["attention_mask"],
+                **self._generation_kwargs(),
+            )
+
 @click.command()
 @click.argument('audio_path', type=click.Path(exists=True))
 @click.option('--model', '-m', default="ibm-granite/granite-speech-3.3-8b", help='Hugging Face model name')
@@ -1,27 +1,244 @@
 import os
+import random
+import threading
+import time
+from collections import deque
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from open_webui.routers.audio import transcribe as original_transcribe
 
 log = logging.getLogger(__name__)
+
+# One or more transcription-service replicas, comma separated
 CUSTOM_STT_ENDPOINT = os.getenv("CUSTOM_STT_ENDPOINT", "http://transcription-service:8000")
+CUSTOM_STT_ENDPOINTS = [url.strip().rstrip("/") for url in CUSTOM_STT_ENDPOINT.split(",") if url.strip()]
+
+CONNECT_TIMEOUT = float(os.getenv("CUSTOM_STT_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("CUSTOM_STT_READ_TIMEOUT", "30"))
+DEADLINE = float(os.getenv("CUSTOM_STT_DEADLINE", "45"))  # Whole call, retries and hedges included
+MAX_RETRIES = int(os.getenv("CUSTOM_STT_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("CUSTOM_STT_BACKOFF", "0.25"))
+# Seconds before a hedged copy goes to a second replica: "auto" (the p95 of recent
+# calls' latency per byte of audio, scaled to this upload; no hedging until
+# HEDGE_MIN_SAMPLES calls have been measured), a fixed number, or 0 (off)
+HEDGE_AFTER = os.getenv("CUSTOM_STT_HEDGE_AFTER", "auto").strip().lower()
+HEDGE_AFTER = HEDGE_AFTER if HEDGE_AFTER == "auto" else float(HEDGE_AFTER)
+HEDGE_MIN_SAMPLES = 20
+# Uploads are scaled as at least this size (about 2 s of 16 kHz 16-bit audio),
+# since fixed overhead dominates short clips
+HEDGE_MIN_BYTES = 64000
+BREAKER_THRESHOLD = int(os.getenv("CUSTOM_STT_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("CUSTOM_STT_BREAKER_COOLDOWN", "30"))
+POOL_SIZE = int(os.getenv("CUSTOM_STT_POOL_SIZE", "10"))
+
+
+class STTServiceError(RuntimeError):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Replica:
+    """One transcription-service endpoint with its load and circuit-breaker state."""
+
+    def __init__(self, url):
+        self.url = url
+        self.inflight = 0
+        self.latency = None  # EWMA of successful call latency, seconds
+        self.failures = 0  # Consecutive failures
+        self.open_until = 0.0
+        self.probing = False  # Half-open: one trial call in flight
+
+    def available(self, now):
+        if self.failures < BREAKER_THRESHOLD:
+            return True
+        # Open: reject until the cooldown ends, then let a single probe through
+        return now >= self.open_until and not self.probing
+
+    def load_key(self):
+        # Fewest calls in flight first; among idle replicas avoid ones that just failed
+        return (self.inflight, self.failures, self.latency if self.latency is not None else 0.0)
+
+
+class STTClient:
+    """
+    Keep-alive client for a pool of transcription-service replicas.
+
+    Each call goes to the least-loaded healthy replica (fewest requests in
+    flight, then lowest latency). Failed calls are retried on another replica
+    with jittered exponential backoff, replicas that keep failing are taken
+    out by a circuit breaker until a probe succeeds, and a second replica is
+    tried when the first is slower than the p95 of recent calls, scaled to
+    the upload's size (hedging).
+    """
+
+    def __init__(self, endpoints):
+        if not endpoints:
+            raise ValueError("CUSTOM_STT_ENDPOINT must name at least one endpoint")
+        self.replicas = [Replica(url) for url in endpoints]
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(endpoints), pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)  # Seconds per byte of recent successful calls, all replicas
+        self._executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="custom-stt")
+
+    def _acquire(self, exclude=()):
+        """Pick the least-loaded replica the breaker allows and count the call against it."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [r for r in self.replicas if r.available(now) and r not in exclude]
+            if not candidates:
+                return None
+            replica = min(candidates, key=Replica.load_key)
+            replica.inflight += 1
+            if replica.failures >= BREAKER_THRESHOLD:
+                replica.probing = True
+            return replica
+
+    def _release(self, replica, elapsed, ok, size):
+        """``ok`` is None for a rejected request: neither a latency sample nor a failure."""
+        with self._lock:
+            replica.inflight -= 1
+            replica.probing = False
+            if ok is None:
+                return
+            if ok:
+                replica.failures = 0
+                replica.latency = elapsed if replica.latency is None else 0.8 * replica.latency + 0.2 * elapsed
+                self._latencies.append(elapsed / max(size, HEDGE_MIN_BYTES))
+            else:
+                replica.failures += 1
+                if replica.failures >= BREAKER_THRESHOLD:
+                    replica.open_until = time.monotonic() + BREAKER_COOLDOWN
+                    log.warning(f"Custom STT circuit open for {replica.url} ({replica.failures} consecutive failures)")
+
+    def hedge_after(self, size):
+        """Seconds to wait for the first replica with ``size`` bytes of audio before hedging; 0 means don't."""
+        if HEDGE_AFTER != "auto":
+            return HEDGE_AFTER
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return 0
+        # Only the slowest ~5% of calls, for their length, get a hedged copy
+        return samples[int(0.95 * (len(samples) - 1))] * max(size, HEDGE_MIN_BYTES)
+
+    def _call(self, replica, filename, audio_bytes, timeout):
+        start = time.monotonic()
+        ok = False
+        status = "error"
+        try:
+            response = self.session.post(
+                f"{replica.url}/transcribe",
+                files={"file": (filename, audio_bytes, "audio/wav")},
+                timeout=(CONNECT_TIMEOUT, timeout),
+            )
+            status = response.status_code
+            if response.status_code >= 500 or response.status_code == 429:
+                raise STTServiceError(f"{replica.url} returned {response.status_code}")
+            if response.status_code >= 400:
+                # The request itself is bad; another replica won't do better, and
+                # the replica is fine (ok stays None: no latency sample, no failure)
+                ok = None
+                raise STTServiceError(f"{replica.url} returned {response.status_code}: {response.text[:200]}", retryable=False)
+            result = response.json()
+            ok = True
+            return result
+        except requests.RequestException as e:
+            raise STTServiceError(f"{replica.url}: {e}") from e
+        finally:
+            elapsed = time.monotonic() - start
+            self._release(replica, elapsed, ok, len(audio_bytes))
+            log.info(f"Custom STT call to {replica.url} -> {status} in {elapsed * 1000:.0f} ms")
+
+    def _attempt(self, filename, audio_bytes, deadline, tried):
+        """One attempt, possibly hedged across two replicas. Returns the first successful result."""
+        replica = self._acquire(exclude=tried)
+        if replica is None:
+            replica = self._acquire()  # Everything healthy was tried already; reuse one
+        if replica is None:
+            raise STTServiceError("No transcription-service replica available (all circuits open)")
+        tried.add(replica)
+
+        timeout = max(0.1, min(READ_TIMEOUT, deadline - time.monotonic()))
+        futures = {self._executor.submit(self._call, replica, filename, audio_bytes, timeout)}
+        hedge_after = self.hedge_after(len(audio_bytes))
+        if hedge_after > 0:
+            done, _ = wait(futures, timeout=min(hedge_after, timeout))
+            if not done:
+                hedge = self._acquire(exclude=tried)
+                if hedge is not None:
+                    log.info(f"Custom STT: {replica.url} slow, hedging to {hedge.url}")
+                    tried.add(hedge)
+                    futures.add(self._executor.submit(self._call, hedge, filename, audio_bytes, timeout))
+
+        error = None
+        pending = futures
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except STTServiceError as e:
+                    error = e
+        # Losing hedges keep running in the background; their outcome still feeds the breaker
+        raise error or STTServiceError(f"Custom STT deadline of {DEADLINE:.0f}s exceeded")
+
+    def transcribe(self, file_path):
+        audio_bytes = Path(file_path).read_bytes()  # Read once so retries and hedges can resend it
+        filename = Path(file_path).name
+        start = time.monotonic()
+        deadline = start + DEADLINE
+        tried = set()
+
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                result = self._attempt(filename, audio_bytes, deadline, tried)
+                log.info(f"Custom STT transcription took {(time.monotonic() - start) * 1000:.0f} ms ({attempt + 1} attempt(s))")
+                return result
+            except STTServiceError as e:
+                if not e.retryable or attempt == MAX_RETRIES:
+                    raise
+                # Full jitter keeps retries from many callers from arriving in lockstep
+                delay = random.uniform(0, BACKOFF_BASE * (2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                log.warning(f"Custom STT attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+                if len(tried) >= len(self.replicas):
+                    tried.clear()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return [
+                {
+                    "url": r.url,
+                    "inflight": r.inflight,
+                    "latency_ms": round(r.latency * 1000) if r.latency is not None else None,
+                    "consecutive_failures": r.failures,
+                    "circuit_open": r.failures >= BREAKER_THRESHOLD,
+                }
+                for r in self.replicas
+            ]
+
+
+stt_client = STTClient(CUSTOM_STT_ENDPOINTS)
 
 def custom_transcribe(request, file_path):
     if request.app.state.config.STT_ENGINE == "custom":
         try:
-            log.info(f"Using custom STT service at {CUSTOM_STT_ENDPOINT}")
-            
-            with open(file_path, "rb") as audio_file:
-                files = {"file": (Path(file_path).name, audio_file, "audio/wav")}
-                response = requests.post(
-                    f"{CUSTOM_STT_ENDPOINT}/transcribe",
-                    files=files,
-                    timeout=30
-                )
-                response.raise_for_status()
-                return response.json()
-                
+            log.info(f"Using custom STT service at {', '.join(CUSTOM_STT_ENDPOINTS)}")
+            return stt_client.transcribe(file_path)
+
         except Exception as e:
             log.error(f"Custom STT error: {str(e)}")
             raise RuntimeError(f"Custom STT service error: {str(e)}")
@@ -30,4 +247,4 @@ def custom_transcribe(request, file_path):
 
 # Monkey patch the original function
 from open_webui.routers import audio
-audio.transcribe = custom_transcribe
\ No newline at end of file
+audio.transcribe = custom_transcribe
@@ -1,57 +1,462 @@
 #!/usr/bin/env python3
+"""
+Local model store for the transcription service.
+
+Files are kept once, content-addressed by SHA-256, under ``models/.blobs``.
+Each model directory (``models/<org>_<name>``, what the service loads from)
+holds hard links to those blobs, so shards shared between models or between
+revisions of one model take disk space only once. ``models/manifest.json``
+records every file's size and hash: ``list`` reads it instead of walking the
+tree, and ``verify`` checks links and sizes without rehashing (``--full``
+rehashes).
+
+Downloads fetch shards in parallel, skip any shard whose hash is already in
+the store, and resume interrupted transfers, either from the Hugging Face Hub
+or from a local mirror directory (``--mirror``).
+
+``convert`` (or ``download --convert``) saves a copy of a transformers model
+already cast for one device and dtype under ``models/.converted``; the
+transcription service memory-maps it instead of converting at start-up.
+"""
 import argparse
-from huggingface_hub import snapshot_download
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from huggingface_hub import HfApi, hf_hub_download
 from pathlib import Path
 import shutil
 import logging
-import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("model-manager")
 
 MODEL_DIR = Path("./models").resolve()
+BLOB_DIR = MODEL_DIR / ".blobs"
+INCOMING_DIR = MODEL_DIR / ".incoming"
+CONVERTED_DIR = MODEL_DIR / ".converted"
+CONVERSION_INFO = "conversion.json"
+MANIFEST_PATH = MODEL_DIR / "manifest.json"
+
+CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = int(os.getenv("MODEL_MANAGER_WORKERS", "4"))
+
+# Downloads and dedup hold the store lock shared while they add blobs; gc holds
+# it exclusively, so it never deletes blobs not yet recorded in the manifest
+STORE_LOCK_PATH = MODEL_DIR / ".store.lock"
+MANIFEST_LOCK_PATH = MODEL_DIR / ".manifest.lock"
+
+_manifest_lock = threading.Lock()
+
+@contextmanager
+def _file_lock(path: Path, exclusive: bool = True):
+    """flock on ``path``; held across processes as well as threads."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+@contextmanager
+def manifest_lock():
+    """Serialises manifest read-modify-write. Take it after the store lock, never before."""
+    with _manifest_lock, _file_lock(MANIFEST_LOCK_PATH):
+        yield
+
+
+def model_dir_name(model_id: str, revision: str = "main"):
+    """Directory a model is stored in; non-default revisions live side by side."""
+    name = model_id.replace("/", "_")
+    return name if revision == "main" else f"{name}@{revision}"
+
+def load_manifest():
+    if not MANIFEST_PATH.exists():
+        return {"models": {}}
+    return json.loads(MANIFEST_PATH.read_text())
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def blob_path(sha256: str):
+    return BLOB_DIR / sha256[:2] / sha256
+
+def hash_file(path, digest=None, limit=None):
+    """SHA-256 of a file (or of its first ``limit`` bytes), continuing ``digest`` if given."""
+    digest = digest or hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest
+
+def store_blob(path: Path, sha256: str):
+    """Move a verified file into the blob store, or drop it if that content is already there."""
+    blob = blob_path(sha256)
+    if blob.exists():
+        path.unlink()
+    else:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, blob)
+        blob.chmod(0o444)  # Blobs are shared through hard links; never edit them in place
+    return blob
+
+def link_blob(blob: Path, target: Path):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists() or target.is_symlink():
+        if target.exists() and os.path.samefile(blob, target):
+            return
+        target.unlink()
+    try:
+        os.link(blob, target)
+    except OSError:
+        # No hard links on this filesystem: fall back to a copy (loses the dedup for this file)
+        shutil.copy2(blob, target)
 
-def download_model(model_id: str, revision: str = "main"):
+def _remote_files(model_id: str, revision: str):
+    """File list of a Hub repo with sizes and, for LFS files, their SHA-256."""
+    info = HfApi().model_info(model_id, revision=revision, files_metadata=True)
+    files = {}
+    for sibling in info.siblings:
+        lfs = sibling.lfs
+        sha256 = lfs.get("sha256") if isinstance(lfs, dict) else getattr(lfs, "sha256", None)
+        files[sibling.rfilename] = {"size": sibling.size, "sha256": sha256}
+    return files, info.sha
+
+def _mirror_files(mirror: Path, model_id: str, revision: str):
+    """
+    File list of a model in a local mirror. The mirror can be another model
+    store (its manifest supplies the hashes) or a plain directory holding
+    ``<org>_<name>``, ``<org>/<name>`` or the model files themselves.
+    """
+    name = model_dir_name(model_id, revision)
+    manifest_path = mirror / "manifest.json"
+    if manifest_path.exists():
+        entry = json.loads(manifest_path.read_text()).get("models", {}).get(name)
+        if entry:
+            files = {rel: {"size": f["size"], "sha256": f["sha256"]} for rel, f in entry["files"].items()}
+            return mirror / name, files
+
+    for root in (mirror / name, mirror / model_id, mirror):
+        if root.is_dir():
+            break
+    else:
+        raise FileNotFoundError(f"Mirror directory {mirror} does not exist")
+    files = {}
+    for path in root.rglob("*"):
+        rel = path.relative_to(root)
+        if path.is_file() and not any(part.startswith(".") for part in rel.parts):
+            files[rel.as_posix()] = {"size": path.stat().st_size, "sha256": None}
+    return root, files
+
+def _copy_resumable(src: Path, part: Path):
+    """Copy ``src`` to ``part``, continuing a previous partial copy. Returns the SHA-256."""
+    offset = part.stat().st_size if part.exists() else 0
+    if offset > src.stat().st_size:
+        offset = 0
+    digest = hash_file(part, limit=offset) if offset else hashlib.sha256()
+    if offset:
+        logger.info(f"Resuming {src.name} at {format_size(offset)}")
+    with open(src, "rb") as fin, open(part, "r+b" if offset else "wb") as fout:
+        fin.seek(offset)
+        fout.seek(offset)
+        fout.truncate()
+        while chunk := fin.read(CHUNK_SIZE):
+            fout.write(chunk)
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _fetch_file(rel: str, meta: dict, staging: Path, model_id: str, revision: str, source_root=None):
+    """Bring one file into the blob store. Returns (rel, sha256, size, where it came from)."""
+    expected = meta.get("sha256")
+    if expected and blob_path(expected).exists():
+        return rel, expected, meta["size"], "store"
+
+    if source_root is not None:
+        path = staging / f"{rel}.part"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sha256 = _copy_resumable(source_root / rel, path)
+    else:
+        # hf_hub_download keeps .incomplete files under local_dir and resumes them
+        path = Path(hf_hub_download(repo_id=model_id, filename=rel, revision=revision, local_dir=staging))
+        sha256 = hash_file(path).hexdigest()
+
+    if expected and sha256 != expected:
+        path.unlink()
+        raise ValueError(f"Checksum mismatch for {rel}: expected {expected}, got {sha256}")
+    size = path.stat().st_size
+    store_blob(path, sha256)
+    return rel, sha256, size, "mirror" if source_root is not None else "hub"
+
+def download_model(model_id: str, revision: str = "main", mirror=None, workers: int = DEFAULT_WORKERS):
     """Download a model and store it in the local models directory"""
     try:
-        logger.info(f"Downloading {model_id}...")
-        
-        # Create model-specific directory
-        model_path = MODEL_DIR / model_id.replace("/", "_")
-        model_path.mkdir(parents=True, exist_ok=True)
-        
-        # Download using huggingface_hub
-        snapshot_download(
-            repo_id=model_id,
-            revision=revision,
-            local_dir=model_path,
-            local_dir_use_symlinks=False,
-            resume_download=True
-        )
-        
-        logger.info(f"Model saved to: {model_path}")
-        return True
-        
+        # Shared: other downloads run alongside, gc waits until this one is in the manifest
+        with _file_lock(STORE_LOCK_PATH, exclusive=False):
+            return _download_model(model_id, revision, mirror, workers)
     except Exception as e:
         logger.error(f"Failed to download {model_id}: {str(e)}")
         return False
 
+def _download_model(model_id, revision, mirror, workers):
+    name = model_dir_name(model_id, revision)
+    source = f"mirror {mirror}" if mirror else "the Hugging Face Hub"
+    logger.info(f"Downloading {model_id} ({revision}) from {source}...")
+
+    if mirror:
+        source_root, files = _mirror_files(Path(mirror).resolve(), model_id, revision)
+        commit = None
+    else:
+        files, commit = _remote_files(model_id, revision)
+        source_root = None
+
+    staging = INCOMING_DIR / name
+    staging.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    # Bytes by origin: downloaded from the Hub, copied from the mirror, already in the store
+    sizes = {"hub": 0, "mirror": 0, "store": 0}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(_fetch_file, rel, meta, staging, model_id, revision, source_root)
+            for rel, meta in files.items()
+        ]
+        for future in as_completed(futures):
+            rel, sha256, size, origin = future.result()
+            entries[rel] = {"sha256": sha256, "size": size}
+            sizes[origin] += size
+
+    # Create model-specific directory
+    model_path = MODEL_DIR / name
+    with manifest_lock():
+        manifest = load_manifest()
+        previous = manifest["models"].get(name, {}).get("files", {})
+        for rel, entry in entries.items():
+            link_blob(blob_path(entry["sha256"]), model_path / rel)
+        # Files the previous revision had and this one doesn't
+        for rel in set(previous) - set(entries):
+            (model_path / rel).unlink(missing_ok=True)
+
+        manifest["models"][name] = {
+            "model_id": model_id,
+            "revision": revision,
+            "commit": commit,
+            "files": entries,
+            "size": sum(entry["size"] for entry in entries.values()),
+            "updated_at": time.time(),
+        }
+        save_manifest(manifest)
+    shutil.rmtree(staging, ignore_errors=True)
+
+    copied = f"{format_size(sizes['mirror'])} copied from the mirror" if mirror else f"{format_size(sizes['hub'])} downloaded"
+    logger.info(f"Model saved to: {model_path} ({copied}, {format_size(sizes['store'])} already in the store)")
+    if previous and set(entry["sha256"] for entry in previous.values()) - set(entry["sha256"] for entry in entries.values()):
+        logger.info("Files of the previous revision are still in the store; run gc to free them")
+    return True
+
+def collect_garbage():
+    """Delete blobs no model references any more. Returns the bytes freed."""
+    # Exclusive: waits for running downloads, whose new blobs aren't in the manifest yet
+    with _file_lock(STORE_LOCK_PATH), manifest_lock():
+        manifest = load_manifest()
+        referenced = {
+            entry["sha256"]
+            for model in manifest["models"].values()
+            for entry in model["files"].values()
+        }
+        freed = 0
+        if BLOB_DIR.exists():
+            for blob in BLOB_DIR.glob("*/*"):
+                if blob.name not in referenced:
+                    freed += blob.stat().st_size
+                    blob.unlink()
+            for shard in BLOB_DIR.glob("*"):
+                if shard.is_dir() and not any(shard.iterdir()):
+                    shard.rmdir()
+    return freed
+
 def list_models():
     """List all locally available models"""
     if not MODEL_DIR.exists():
         logger.info("Models directory does not exist yet.")
         return
-        
-    models = [d.name for d in MODEL_DIR.glob("*") if d.is_dir()]
-    
+
+    managed = load_manifest()["models"]
+    models = sorted(d.name for d in MODEL_DIR.glob("*") if d.is_dir() and not d.name.startswith("."))
+
     if not models:
         print("\nNo models found in the local directory.")
         return
-    
+
     print("\nAvailable models:")
+    unique = {}
     for model in models:
-        size = get_directory_size(MODEL_DIR / model)
-        print(f"- {model} ({format_size(size)})")
+        entry = managed.get(model)
+        if entry:
+            print(f"- {model} ({format_size(entry['size'])}, {len(entry['files'])} files)")
+            unique.update({f["sha256"]: f["size"] for f in entry["files"].values()})
+        else:
+            # Not in the manifest (downloaded before the blob store): measure it the slow way
+            size = get_directory_size(MODEL_DIR / model)
+            print(f"- {model} ({format_size(size)}, not deduplicated; run `dedup`)")
+
+    logical = sum(managed[model]["size"] for model in models if model in managed)
+    if logical:
+        print(f"\nBlob store: {format_size(sum(unique.values()))} on disk for {format_size(logical)} of model files")
+
+def verify_model(model_id: str, revision: str = "main", full: bool = False):
+    """Check a model against the manifest. Only rehashes with ``full``."""
+    name = model_dir_name(model_id, revision)
+    entry = load_manifest()["models"].get(name)
+    if not entry:
+        logger.error(f"Model {model_id} is not in the manifest")
+        return False
+
+    def check(item):
+        rel, meta = item
+        target = MODEL_DIR / name / rel
+        blob = blob_path(meta["sha256"])
+        if not target.exists():
+            return f"{rel}: missing"
+        if not blob.exists():
+            return f"{rel}: blob {meta['sha256'][:12]} missing"
+        if target.stat().st_size != meta["size"]:
+            return f"{rel}: size {target.stat().st_size} != {meta['size']}"
+        linked = os.path.samefile(blob, target)
+        if full:
+            paths = [blob] if linked else [blob, target]
+            for path in paths:
+                if hash_file(path).hexdigest() != meta["sha256"]:
+                    return f"{rel}: checksum mismatch ({path})"
+        return None
+
+    with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as pool:
+        problems = [problem for problem in pool.map(check, entry["files"].items()) if problem]
+
+    for problem in problems:
+        print(f"- {problem}")
+    if problems:
+        logger.error(f"Model {model_id} failed verification ({len(problems)} problem(s))")
+        return False
+    logger.info(f"Model {model_id} verified ({len(entry['files'])} files{', rehashed' if full else ''})")
+    return True
+
+def dedup_models(names=None):
+    """Move model directories downloaded before the blob store into it."""
+    with _file_lock(STORE_LOCK_PATH, exclusive=False), manifest_lock():
+        manifest = load_manifest()
+        if not names:
+            names = [
+                d.name for d in MODEL_DIR.glob("*")
+                if d.is_dir() and not d.name.startswith(".") and d.name not in manifest["models"]
+            ]
+        saved = 0
+        for name in names:
+            model_path = MODEL_DIR / name
+            entries = {}
+            for path in sorted(p for p in model_path.rglob("*") if p.is_file()):
+                rel = path.relative_to(model_path).as_posix()
+                if rel.startswith(".cache/"):
+                    continue
+                sha256 = hash_file(path).hexdigest()
+                size = path.stat().st_size
+                blob = blob_path(sha256)
+                if blob.exists():
+                    saved += size
+                    link_blob(blob, path)
+                else:
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    os.link(path, blob)
+                    blob.chmod(0o444)
+                entries[rel] = {"sha256": sha256, "size": size}
+            revision = name.partition("@")[2] or "main"
+            manifest["models"][name] = {
+                "model_id": name,
+                "revision": revision,
+                "commit": None,
+                "files": entries,
+                "size": sum(entry["size"] for entry in entries.values()),
+                "updated_at": time.time(),
+            }
+            logger.info(f"Added {name} to the blob store ({len(entries)} files)")
+        save_manifest(manifest)
+    logger.info(f"Deduplication saved {format_size(saved)}")
+
+def converted_model_dir(name: str, device: str, dtype: str):
+    """Same layout as ``converted_model_dir`` in transcription-service/asr_engines.py."""
+    # One copy per device type: cuda:0 and cuda:1 share it
+    return CONVERTED_DIR / name / f"{device.split(':')[0]}-{dtype}"
+
+def is_ctranslate2_model(model_path: Path) -> bool:
+    """A CTranslate2 conversion (same rule as ``is_ctranslate2_model`` in transcription-service/asr_engines.py)."""
+    config_path = model_path / "config.json"
+    try:
+        config = json.loads(config_path.read_text()) if config_path.exists() else {}
+    except ValueError:
+        config = {}
+    # CTranslate2 repos ship a config.json too; a transformers checkpoint saved
+    # as model.bin is told apart by naming its architecture
+    return (model_path / "model.bin").exists() and "model_type" not in config and "architectures" not in config
+
+def convert_model(model_id: str, revision: str = "main", device: str = "cpu", dtype: str = "float32"):
+    """Save a copy of a downloaded transformers model cast to ``dtype`` for ``device``"""
+    name = model_dir_name(model_id, revision)
+    model_path = MODEL_DIR / name
+    if not model_path.exists():
+        logger.error(f"Model {model_id} not found locally; download it first")
+        return False
+    if is_ctranslate2_model(model_path):
+        logger.info(f"{model_id} is a CTranslate2 model; it is quantized when loaded, nothing to convert")
+        return True
+
+    try:
+        import torch
+        from transformers import AutoConfig, AutoModelForCTC, AutoModelForSpeechSeq2Seq, AutoProcessor
+
+        output_dir = converted_model_dir(name, device, dtype)
+        logger.info(f"Converting {model_id} to {dtype} for {device}...")
+        start = time.time()
+        config = AutoConfig.from_pretrained(model_path)
+        # CTC models (wav2vec2 and friends) have no seq2seq head
+        auto_class = AutoModelForSpeechSeq2Seq if config.is_encoder_decoder or "granite" in config.model_type else AutoModelForCTC
+        model = auto_class.from_pretrained(model_path, torch_dtype=getattr(torch, dtype), low_cpu_mem_usage=True)
+
+        # Write to a temporary directory so an interrupted conversion is never picked up
+        tmp_dir = output_dir.with_name(output_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        model.save_pretrained(tmp_dir, safe_serialization=True)
+        AutoProcessor.from_pretrained(model_path).save_pretrained(tmp_dir)
+        (tmp_dir / CONVERSION_INFO).write_text(json.dumps({
+            "model_id": model_id,
+            "revision": revision,
+            "device": device,
+            "dtype": dtype,
+            "source_commit": load_manifest()["models"].get(name, {}).get("commit"),
+            "converted_at": time.time(),
+        }, indent=2))
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.replace(tmp_dir, output_dir)
+
+        logger.info(
+            f"Converted {model_id} in {time.time() - start:.1f}s "
+            f"({format_size(get_directory_size(output_dir))}): {output_dir}"
+        )
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to convert {model_id}: {str(e)}")
+        return False
 
 def get_directory_size(directory):
     """Get the total size of a directory in bytes"""
@@ -69,17 +474,25 @@ def format_size(size_bytes):
         size_bytes /= 1024
     return f"{size_bytes:.2f} PB"
 
-def remove_model(model_id: str):
+def remove_model(model_id: str, revision: str = "main"):
     """Remove a model from the local models directory"""
-    model_path = MODEL_DIR / model_id.replace("/", "_")
-    
+    name = model_dir_name(model_id, revision)
+    model_path = MODEL_DIR / name
+
     if not model_path.exists():
         logger.error(f"Model {model_id} not found locally")
         return False
-    
+
     try:
         shutil.rmtree(model_path)
-        logger.info(f"Model {model_id} removed successfully")
+        shutil.rmtree(CONVERTED_DIR / name, ignore_errors=True)
+        with manifest_lock():
+            manifest = load_manifest()
+            manifest["models"].pop(name, None)
+            save_manifest(manifest)
+        # Outside the manifest lock: gc takes the store lock first
+        freed = collect_garbage()
+        logger.info(f"Model {model_id} removed successfully ({format_size(freed)} of blobs freed)")
         return True
     except Exception as e:
         logger.error(f"Failed to remove {model_id}: {str(e)}")
@@ -88,29 +501,66 @@ def remove_model(model_id: str):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Hugging Face Model Manager")
     subparsers = parser.add_subparsers(dest="command")
-    
+
     # Create models directory if it doesn't exist
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    
+
     # Download command
     dl_parser = subparsers.add_parser("download", help="Download a model")
     dl_parser.add_argument("model_id", help="Hugging Face model ID")
     dl_parser.add_argument("--revision", default="main", help="Model revision")
-    
+    dl_parser.add_argument("--mirror", help="Copy from a local mirror directory instead of the Hub")
+    dl_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Files fetched in parallel")
+    dl_parser.add_argument("--convert", action="store_true", help="Also save a copy pre-converted for --device/--dtype")
+    dl_parser.add_argument("--device", default="cpu", help="Device the converted copy is for (cpu or cuda)")
+    dl_parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "bfloat16"], help="Dtype of the converted copy")
+
     # List command
     subparsers.add_parser("list", help="List local models")
-    
+
     # Remove command
     rm_parser = subparsers.add_parser("remove", help="Remove a model")
     rm_parser.add_argument("model_id", help="Model ID to remove")
-    
+    rm_parser.add_argument("--revision", default="main", help="Model revision")
+
+    # Verify command
+    verify_parser = subparsers.add_parser("verify", help="Check a model against the manifest")
+    verify_parser.add_argument("model_id", help="Model ID to verify")
+    verify_parser.add_argument("--revision", default="main", help="Model revision")
+    verify_parser.add_argument("--full", action="store_true", help="Rehash every file")
+
+    # Dedup command
+    dedup_parser = subparsers.add_parser("dedup", help="Move existing model directories into the blob store")
+    dedup_parser.add_argument("names", nargs="*", help="Model directory names (default: all unmanaged)")
+
+    # Convert command
+    convert_parser = subparsers.add_parser("convert", help="Save a copy cast for one device and dtype")
+    convert_parser.add_argument("model_id", help="Model ID to convert")
+    convert_parser.add_argument("--revision", default="main", help="Model revision")
+    convert_parser.add_argument("--device", default="cpu", help="Device the copy is for (cpu or cuda)")
+    convert_parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "bfloat16"], help="Dtype of the copy")
+
+    # Garbage collection
+    subparsers.add_parser("gc", help="Delete blobs no model references")
+
     args = parser.parse_args()
-    
+
     if args.command == "download":
-        download_model(args.model_id, args.revision)
+        if download_model(args.model_id, args.revision, args.mirror, args.workers) and args.convert:
+            convert_model(args.model_id, args.revision, args.device, args.dtype)
     elif args.command == "list":
         list_models()
     elif args.command == "remove":
-        remove_model(args.model_id)
+        remove_model(args.model_id, args.revision)
+    elif args.command == "verify":
+        if not verify_model(args.model_id, args.revision, args.full):
+            raise SystemExit(1)
+    elif args.command == "convert":
+        if not convert_model(args.model_id, args.revision, args.device, args.dtype):
+            raise SystemExit(1)
+    elif args.command == "dedup":
+        dedup_models(args.names)
+    elif args.command == "gc":
+        logger.info(f"Freed {format_size(collect_garbage())}")
     else:
-        parser.print_help()
\ No newline at end of file
+        parser.print_help()
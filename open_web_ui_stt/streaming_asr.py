@@ -0,0 +1,138 @@
+"""
+Incremental streaming ASR with a local-agreement commit policy.
+
+Audio is appended to a rolling window that only holds audio whose text has
+not been committed yet. Every time enough new audio has arrived the window is
+re-transcribed with word timestamps; the words on which two successive
+hypotheses agree (longest common prefix) are committed as final, the window is
+trimmed at the end of the last committed word, and the rest is reported as a
+partial result. Committed text is never recomputed, and because the window is
+trimmed on every commit (or force-committed once it reaches ``max_window_s``),
+compute per second of audio stays flat however long the stream runs.
+"""
+import re
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# (start_s, end_s, text) with times relative to the start of the stream
+Word = Tuple[float, float, str]
+
+_NORMALIZE_RE = re.compile(r"[^\w']+")
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE_RE.sub("", text.lower())
+
+
+def join_words(words: List[Word]) -> str:
+    return " ".join(word[2] for word in words)
+
+
+class LocalAgreementStreamer:
+    def __init__(
+        self,
+        transcribe: Callable[[np.ndarray], List[Word]],
+        sample_rate: int = 16000,
+        min_chunk_s: float = 1.0,
+        max_window_s: float = 15.0,
+    ):
+        """
+        Args:
+            transcribe: Returns the words of a float32 mono window, with
+                timestamps relative to the start of that window.
+            sample_rate: Sample rate of the audio passed to ``insert_audio``.
+            min_chunk_s: New audio needed before the window is re-transcribed.
+            max_window_s: Longest window kept without agreement before the
+                current hypothesis is committed anyway.
+        """
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.min_chunk_s = min_chunk_s
+        self.max_window_s = max_window_s
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0  # Stream time of buffer[0]
+        self.committed: List[Word] = []
+        self.hypothesis: List[Word] = []  # Uncommitted words from the last pass
+        self._pending = 0  # Samples received since the last pass
+
+    @property
+    def committed_end(self) -> float:
+        return self.committed[-1][1] if self.committed else 0.0
+
+    @property
+    def window_s(self) -> float:
+        return len(self.buffer) / self.sample_rate
+
+    def insert_audio(self, audio: np.ndarray):
+        self.buffer = np.concatenate([self.buffer, audio.astype(np.float32, copy=False)])
+        self._pending += len(audio)
+
+    def ready(self) -> bool:
+        return self._pending >= self.min_chunk_s * self.sample_rate
+
+    def process(self) -> Tuple[List[Word], List[Word]]:
+        """Re-transcribe the window. Returns (newly committed words, current partial words)."""
+        self._pending = 0
+        words = self._hypothesize()
+
+        agreed = 0
+        for old, new in zip(self.hypothesis, words):
+            if _normalize(old[2]) != _normalize(new[2]):
+                break
+            agreed += 1
+        commit = words[:agreed]
+        self.hypothesis = words[agreed:]
+
+        if not commit and self.window_s >= self.max_window_s:
+            # No agreement for a whole window (or silence): take the best guess rather than grow
+            commit, self.hypothesis = self.hypothesis, []
+            if not commit:
+                self._trim(self.buffer_offset + self.window_s - self.min_chunk_s)
+
+        if commit:
+            self.committed.extend(commit)
+            self._trim(commit[-1][1])
+        return commit, self.hypothesis
+
+    def finish(self) -> List[Word]:
+        """End of utterance/stream: commit whatever the window still holds and start over."""
+        commit = self._hypothesize() if len(self.buffer) else []
+        self.reset()
+        return commit
+
+    def _hypothesize(self) -> List[Word]:
+        offset = self.buffer_offset
+        window_end = offset + self.window_s
+        words = []
+        for start, end, text in self.transcribe(self.buffer):
+            text = text.strip()
+            if not text:
+                continue
+            start = offset + (start or 0.0)
+            end = offset + end if end is not None else window_end
+            words.append((start, end, text))
+
+        # Drop words that belong to audio already committed (the trim point can split a word)
+        words = [word for word in words if word[0] >= self.committed_end - 0.1]
+        return self._drop_repeated_prefix(words)
+
+    def _drop_repeated_prefix(self, words: List[Word]) -> List[Word]:
+        """Remove words at the start of the window that repeat the committed tail."""
+        if not words or not self.committed or words[0][0] - self.committed_end > 1.0:
+            return words
+        for n in range(min(5, len(words), len(self.committed)), 0, -1):
+            tail = [_normalize(word[2]) for word in self.committed[-n:]]
+            head = [_normalize(word[2]) for word in words[:n]]
+            if tail == head:
+                return words[n:]
+        return words
+
+    def _trim(self, stream_time: float):
+        cut = int(round((stream_time - self.buffer_offset) * self.sample_rate))
+        cut = max(0, min(cut, len(self.buffer)))
+        self.buffer = self.buffer[cut:]
+        self.buffer_offset += cut / self.sample_rate
@@ -0,0 +1,268 @@
+"""
+ASR engines for the transcription service.
+
+The service used to push every model through a transformers ``pipeline``,
+including CTranslate2 conversions such as ``Systran/faster-whisper-*`` that
+only run properly on their own runtime. Each engine wraps one runtime behind
+the same ``transcribe(audio_bytes) -> str`` call, and ``create_engine`` picks
+the right one from what is on disk:
+
+- ``ctranslate2``: faster-whisper on CTranslate2 (int8 on CPU, configurable
+  threads, Silero VAD filtering) for directories with a CTranslate2
+  ``model.bin``;
+- ``granite``: IBM Granite Speech (speech-aware LLM; prompt + generate);
+- ``transformers``: the original pipeline, for regular Hugging Face models.
+
+Transformers-based engines load a copy made by ``model_manager.py convert``
+(already cast to the engine's dtype for the device) when there is one, which
+is memory-mapped as is instead of being converted on every start.
+"""
+import io
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger("transcription-service")
+
+CONVERSION_INFO = "conversion.json"
+
+# Bytes per parameter once loaded, by the dtype (or CTranslate2 compute type) an engine loads in
+DTYPE_BYTES = {
+    "float32": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int16": 2,
+    "int8": 1,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+}
+
+
+def converted_model_dir(model_dir, device, dtype) -> Path:
+    """Same layout as ``converted_model_dir`` in model_manager.py."""
+    model_dir = Path(model_dir)
+    return model_dir.parent / ".converted" / model_dir.name / f"{device.split(':')[0]}-{dtype}"
+
+
+def pretrained_source(model_dir, device, dtype):
+    """The pre-converted copy of ``model_dir`` for this device and dtype if it exists, else ``model_dir``."""
+    converted = converted_model_dir(model_dir, device, dtype)
+    if (converted / CONVERSION_INFO).exists():
+        logger.info(f"Using weights pre-converted to {dtype} for {device}: {converted}")
+        return converted, True
+    return Path(model_dir), False
+
+
+def _read_config(model_dir) -> dict:
+    config_path = Path(model_dir) / "config.json"
+    try:
+        return json.loads(config_path.read_text()) if config_path.exists() else {}
+    except ValueError:
+        return {}
+
+
+def is_ctranslate2_model(model_dir) -> bool:
+    """A CTranslate2 conversion (same rule as ``is_ctranslate2_model`` in model_manager.py)."""
+    config = _read_config(model_dir)
+    # CTranslate2 repos ship a config.json too; a transformers checkpoint saved
+    # as model.bin is told apart by naming its architecture
+    return (Path(model_dir) / "model.bin").exists() and "model_type" not in config and "architectures" not in config
+
+
+def detect_model_format(model_dir) -> str:
+    """'ctranslate2' for CTranslate2 conversions, 'granite' for Granite Speech, otherwise 'transformers'."""
+    if is_ctranslate2_model(model_dir):
+        return "ctranslate2"
+    if _read_config(model_dir).get("model_type") == "granite_speech":
+        return "granite"
+    return "transformers"
+
+
+class TransformersEngine:
+    name = "transformers"
+
+    @staticmethod
+    def load_dtype(device="cpu", **options) -> str:
+        # The pipeline loads in float32 by default
+        return "float32"
+
+    def __init__(self, model_dir, device="cpu", chunk_length=5.0, stride_length=1.0):
+        from transformers import pipeline
+
+        source, _ = pretrained_source(model_dir, device, self.load_dtype(device))
+        self.pipeline = pipeline(
+            "automatic-speech-recognition",
+            model=str(source),
+            device=device,
+            chunk_length_s=chunk_length,
+            stride_length_s=stride_length
+        )
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        # The pipeline decodes raw file bytes itself (via ffmpeg)
+        result = self.pipeline(audio_bytes)
+        return result["text"] if isinstance(result, dict) else result[0]["text"]
+
+
+class CTranslate2Engine:
+    name = "ctranslate2"
+
+    @staticmethod
+    def load_dtype(device="cpu", compute_type=None, **options) -> str:
+        # int8 weights are the big CPU win; keep fp16 on GPU
+        compute_type = compute_type or ("int8" if device == "cpu" else "float16")
+        if compute_type == "auto":
+            return "int8" if device == "cpu" else "float16"
+        if compute_type == "default":
+            # Whatever the conversion stored; faster-whisper repos are float16
+            return "float16"
+        return compute_type
+
+    def __init__(
+        self,
+        model_dir,
+        device="cpu",
+        compute_type=None,
+        cpu_threads=0,
+        num_workers=1,
+        beam_size=5,
+        vad_filter=True,
+    ):
+        from faster_whisper import WhisperModel
+
+        self.compute_type = compute_type or self.load_dtype(device)
+        self.beam_size = beam_size
+        self.vad_filter = vad_filter
+        self.model = WhisperModel(
+            str(model_dir),
+            device=device,
+            compute_type=self.compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
+        )
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        segments, info = self.model.transcribe(
+            io.BytesIO(audio_bytes),
+            beam_size=self.beam_size,
+            vad_filter=self.vad_filter,
+        )
+        # Segments are generated lazily; joining them runs the decode
+        text = "".join(segment.text for segment in segments).strip()
+        logger.info(
+            f"Transcribed {info.duration:.1f}s of audio "
+            f"({info.duration_after_vad:.1f}s after VAD, language={info.language})"
+        )
+        return text
+
+
+class GraniteSpeechEngine:
+    name = "granite"
+    sample_rate = 16000
+
+    @staticmethod
+    def load_dtype(device="cpu", **options) -> str:
+        # bf16 matmuls are slow or missing on most CPUs
+        return "float32" if device == "cpu" else "bfloat16"
+
+    def __init__(self, model_dir, device="cpu", max_new_tokens=200):
+        import torch
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
+
+        self.device = device
+        self.max_new_tokens = max_new_tokens
+        dtype = self.load_dtype(device)
+        source, converted = pretrained_source(model_dir, device, dtype)
+        self.processor = AutoProcessor.from_pretrained(str(source))
+        self.tokenizer = self.processor.tokenizer
+        if converted:
+            # Already in the right dtype: map the weights straight onto the device
+            self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
+                str(source), torch_dtype=getattr(torch, dtype), low_cpu_mem_usage=True, device_map=device
+            )
+        else:
+            self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
+                str(source), torch_dtype=getattr(torch, dtype), low_cpu_mem_usage=True
+            ).to(device)
+        chat = [{"role": "user", "content": "<|audio|>can you transcribe the speech into a written format?"}]
+        self.prompt = self.tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
+
+    def _load_audio(self, audio_bytes: bytes):
+        import soundfile as sf
+        import torch
+        import torchaudio
+
+        audio, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+        wav = torch.from_numpy(audio.mean(axis=1)).unsqueeze(0)
+        if sr != self.sample_rate:
+            wav = torchaudio.functional.resample(wav, sr, self.sample_rate)
+        return wav
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        import torch
+
+        wav = self._load_audio(audio_bytes)
+        inputs = self.processor(self.prompt, wav, device=self.device, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens, num_beams=1, do_sample=False)
+        new_tokens = outputs[:, inputs["input_ids"].shape[-1]:]
+        return self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)[0].strip()
+
+
+ENGINES = {
+    TransformersEngine.name: TransformersEngine,
+    CTranslate2Engine.name: CTranslate2Engine,
+    GraniteSpeechEngine.name: GraniteSpeechEngine,
+}
+
+
+def resolve_engine(model_dir, engine="auto") -> str:
+    """The engine name ``create_engine`` uses for ``model_dir``."""
+    if engine == "auto":
+        engine = detect_model_format(model_dir)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown ASR engine '{engine}', expected one of {['auto', *ENGINES]}")
+    return engine
+
+
+def load_dtype(model_dir, engine="auto", device="cpu", **options) -> str:
+    """The dtype ``create_engine`` would load ``model_dir``'s weights in, without loading them."""
+    engine = resolve_engine(model_dir, engine)
+    if engine == CTranslate2Engine.name:
+        options.setdefault("compute_type", os.getenv("ASR_COMPUTE_TYPE") or None)
+    return ENGINES[engine].load_dtype(device, **options)
+
+
+def create_engine(model_dir, engine="auto", device="cpu", **options):
+    """
+    Build the engine for ``model_dir``. ``engine='auto'`` chooses from the
+    model's format; ``options`` are read from the ASR_* environment when not
+    given.
+    """
+    engine = resolve_engine(model_dir, engine)
+
+    logger.info(f"Loading {model_dir} with the {engine} engine on {device}")
+    if engine == CTranslate2Engine.name:
+        return CTranslate2Engine(
+            model_dir,
+            device=device,
+            compute_type=options.get("compute_type", os.getenv("ASR_COMPUTE_TYPE") or None),
+            cpu_threads=options.get("cpu_threads", int(os.getenv("ASR_CPU_THREADS", "0"))),
+            num_workers=options.get("num_workers", int(os.getenv("ASR_NUM_WORKERS", "1"))),
+            beam_size=options.get("beam_size", int(os.getenv("ASR_BEAM_SIZE", "5"))),
+            vad_filter=options.get("vad_filter", os.getenv("ASR_VAD_FILTER", "true").lower() in ("1", "true", "yes")),
+        )
+    if engine == GraniteSpeechEngine.name:
+        return GraniteSpeechEngine(
+            model_dir,
+            device=device,
+            max_new_tokens=options.get("max_new_tokens", int(os.getenv("ASR_MAX_NEW_TOKENS", "200"))),
+        )
+    return TransformersEngine(
+        model_dir,
+        device=device,
+        chunk_length=options.get("chunk_length", float(os.getenv("ASR_CHUNK_LENGTH", "5"))),
+        stride_length=options.get("stride_length", float(os.getenv("ASR_STRIDE_LENGTH", "1"))),
+    )
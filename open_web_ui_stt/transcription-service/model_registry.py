@@ -0,0 +1,279 @@
+"""
+Multi-model residency for the transcription service.
+
+Instead of binding one ``ASR_MODEL_ID`` for the life of the process, models
+are loaded on first request and kept resident under a RAM budget. When a new
+model does not fit, the least recently used idle models are evicted first;
+models that are serving a request are never evicted (if nothing can be freed
+the new model is loaded over budget and a warning is logged).
+
+A model's footprint is estimated as its parameter count (read from the
+checkpoint headers, not loaded) times the size of the dtype its engine loads
+it in: a bf16 checkpoint loaded as float32 on CPU takes twice its file size,
+a float16 CTranslate2 model loaded as int8 half of it. That is what the
+budget is accounted in. A load reserves that estimate before it starts, so
+concurrent loads of different models cannot each fit and together overshoot.
+Load, hit and eviction counts are kept per model and exposed through
+``stats`` for the ``/metrics`` endpoint.
+"""
+import gc
+import json
+import logging
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from huggingface_hub import snapshot_download
+
+from asr_engines import DTYPE_BYTES, create_engine, is_ctranslate2_model, load_dtype
+
+logger = logging.getLogger("transcription-service")
+
+# Checkpoint formats whose size is only known per file; safetensors are counted exactly
+WEIGHT_SUFFIXES = (".bin", ".pt", ".pth", ".ckpt")
+
+# Short names accepted in requests
+DEFAULT_ALIASES = {
+    "tiny": "Systran/faster-whisper-tiny",
+    "base": "Systran/faster-whisper-base",
+    "small": "Systran/faster-whisper-small",
+    "medium": "Systran/faster-whisper-medium",
+    "large-v3": "Systran/faster-whisper-large-v3",
+    "granite": "ibm-granite/granite-speech-3.3-2b",
+}
+
+
+def _safetensors_parameters(path: Path) -> int:
+    # An 8-byte little-endian header length, then a JSON header with every tensor's shape
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    return sum(math.prod(info["shape"]) for name, info in header.items() if name != "__metadata__")
+
+
+def parameter_count(model_dir: Path) -> int:
+    """Parameters in a checkpoint, without loading it."""
+    model_dir = Path(model_dir)
+    files = [path for path in model_dir.rglob("*") if path.is_file() and ".cache" not in path.parts]
+    safetensors = [path for path in files if path.suffix == ".safetensors"]
+    if safetensors:
+        # Repos often ship the same weights as .bin as well; count them once
+        return sum(_safetensors_parameters(path) for path in safetensors)
+
+    size = sum(path.stat().st_size for path in files if path.suffix in WEIGHT_SUFFIXES)
+    if is_ctranslate2_model(model_dir):
+        # CTranslate2 conversions (e.g. faster-whisper) are stored as float16
+        stored = "float16"
+    else:
+        config_path = model_dir / "config.json"
+        config = json.loads(config_path.read_text()) if config_path.exists() else {}
+        stored = config.get("torch_dtype") or "float32"
+    return size // DTYPE_BYTES.get(stored, 4)
+
+
+def estimate_footprint(model_dir: Path, engine: str = "auto", device: str = "cpu") -> int:
+    """Bytes the model's weights take once ``engine`` has loaded them on ``device``."""
+    return parameter_count(model_dir) * DTYPE_BYTES.get(load_dtype(model_dir, engine, device), 4)
+
+
+class _Resident:
+    def __init__(self, engine, size: int, load_seconds: float):
+        self.engine = engine
+        self.size = size
+        self.load_seconds = load_seconds
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        model_path: Path,
+        device: str = "cpu",
+        engine: str = "auto",
+        budget_bytes: int = 0,
+        default_model: Optional[str] = None,
+        aliases: Optional[Dict[str, str]] = None,
+        allowed: Optional[Iterable[str]] = None,
+    ):
+        """
+        Args:
+            model_path: Where models are stored/downloaded (``<id with _>`` subdirectories).
+            device: Device every engine is created on.
+            engine: Engine name or 'auto' (see ``asr_engines.create_engine``).
+            budget_bytes: RAM budget for resident models; 0 means unlimited.
+            default_model: Model used when a request doesn't name one.
+            aliases: Short name -> model ID.
+            allowed: Model IDs requests may load besides the aliases and the
+                default. Keeps clients from pulling arbitrary repos.
+        """
+        self.model_path = Path(model_path)
+        self.device = device
+        self.engine = engine
+        self.budget_bytes = budget_bytes
+        self.aliases = dict(DEFAULT_ALIASES if aliases is None else aliases)
+        self.default_model = self.aliases.get(default_model, default_model)
+        self.allowed = set(self.aliases.values()) | set(allowed or ())
+        if self.default_model:
+            self.allowed.add(self.default_model)
+
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()  # LRU order, oldest first
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._reserved: Dict[str, int] = {}  # Budget held by loads in progress
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self.events = []  # Recent load/evict events, newest last
+
+    def resolve(self, model: Optional[str]) -> str:
+        model_id = self.aliases.get(model, model) if model else self.default_model
+        if not model_id:
+            raise ValueError("No model requested and no default model configured")
+        if model_id not in self.allowed:
+            raise ValueError(f"Model '{model}' is not available; choose one of {sorted(self.aliases)} or {sorted(self.allowed)}")
+        return model_id
+
+    @property
+    def used_bytes(self) -> int:
+        """Resident models plus loads in progress."""
+        return sum(resident.size for resident in self._resident.values()) + sum(self._reserved.values())
+
+    def _metric(self, model_id: str) -> Dict[str, float]:
+        return self._metrics.setdefault(
+            model_id, {"loads": 0, "evictions": 0, "hits": 0, "load_seconds": 0.0}
+        )
+
+    def _record_event(self, event: str, model_id: str, **details):
+        self.events.append({"event": event, "model": model_id, "time": time.time(), **details})
+        del self.events[:-100]
+
+    def _model_dir(self, model_id: str) -> Path:
+        model_dir = self.model_path / model_id.replace("/", "_")
+        if not model_dir.exists():
+            logger.info(f"Model not found locally, downloading {model_id}...")
+            snapshot_download(repo_id=model_id, cache_dir=self.model_path, local_dir=model_dir)
+        return model_dir
+
+    def _make_room(self, needed: int):
+        """Evict idle models, least recently used first, until ``needed`` more bytes fit."""
+        if self.budget_bytes <= 0:
+            return
+        for model_id in list(self._resident):
+            if self.used_bytes + needed <= self.budget_bytes:
+                return
+            resident = self._resident[model_id]
+            if resident.in_use:
+                continue
+            del self._resident[model_id]
+            self._metric(model_id)["evictions"] += 1
+            self._record_event("evict", model_id, bytes=resident.size)
+            logger.info(f"Evicted {model_id} ({resident.size / 1024 ** 2:.0f} MB) to stay within the memory budget")
+            del resident
+        if self.used_bytes + needed > self.budget_bytes:
+            logger.warning(
+                f"Memory budget exceeded: {(self.used_bytes + needed) / 1024 ** 2:.0f} MB needed, "
+                f"{self.budget_bytes / 1024 ** 2:.0f} MB allowed (all resident models are busy or loading)"
+            )
+
+    def _release_memory(self):
+        gc.collect()
+        if self.device.startswith("cuda"):
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def _load(self, model_id: str) -> _Resident:
+        # One loader per model; other requests for it wait here instead of loading twice
+        with self._lock:
+            loading = self._loading.setdefault(model_id, threading.Lock())
+        with loading:
+            with self._lock:
+                resident = self._resident.get(model_id)
+                if resident is not None:
+                    return resident
+
+            model_dir = self._model_dir(model_id)
+            size = estimate_footprint(model_dir, self.engine, self.device)
+            with self._lock:
+                evicting = len(self._resident)
+                self._make_room(size)
+                evicted = evicting != len(self._resident)
+                self._reserved[model_id] = size
+            if evicted:
+                self._release_memory()
+
+            start = time.time()
+            try:
+                engine = create_engine(model_dir, engine=self.engine, device=self.device)
+            except Exception:
+                with self._lock:
+                    del self._reserved[model_id]
+                raise
+            load_seconds = time.time() - start
+            resident = _Resident(engine, size, load_seconds)
+            with self._lock:
+                # The reservation becomes the resident model's share
+                del self._reserved[model_id]
+                self._resident[model_id] = resident
+                metric = self._metric(model_id)
+                metric["loads"] += 1
+                metric["load_seconds"] += load_seconds
+                self._record_event("load", model_id, bytes=size, seconds=round(load_seconds, 2))
+            logger.info(
+                f"Loaded {model_id} ({engine.name}, {size / 1024 ** 2:.0f} MB) in {load_seconds:.1f}s; "
+                f"{self.used_bytes / 1024 ** 2:.0f} MB resident"
+            )
+            return resident
+
+    @contextmanager
+    def use(self, model: Optional[str] = None):
+        """Borrow the engine for ``model`` (ID, alias, or None for the default), loading it if needed."""
+        model_id = self.resolve(model)
+        with self._lock:
+            resident = self._resident.get(model_id)
+            if resident is not None:
+                self._metric(model_id)["hits"] += 1
+                resident.in_use += 1
+        if resident is None:
+            while True:
+                resident = self._load(model_id)
+                with self._lock:
+                    # Could have been evicted between loading and here; load again if so
+                    if self._resident.get(model_id) is resident:
+                        resident.in_use += 1
+                        break
+        try:
+            yield resident.engine
+        finally:
+            with self._lock:
+                resident.in_use -= 1
+                resident.last_used = time.time()
+                if model_id in self._resident:
+                    self._resident.move_to_end(model_id)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "reserved_bytes": sum(self._reserved.values()),
+                "default_model": self.default_model,
+                "aliases": self.aliases,
+                "resident": {
+                    model_id: {
+                        "engine": resident.engine.name,
+                        "bytes": resident.size,
+                        "in_use": resident.in_use,
+                        "load_seconds": round(resident.load_seconds, 2),
+                        "last_used": resident.last_used,
+                    }
+                    for model_id, resident in self._resident.items()
+                },
+                "models": {model_id: dict(metric) for model_id, metric in self._metrics.items()},
+                "events": list(self.events[-20:]),
+            }
@@ -1,12 +1,13 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
+from typing import Optional
 import torch
-from transformers import pipeline
-from huggingface_hub import snapshot_download
-import tempfile
+from model_registry import DEFAULT_ALIASES, ModelRegistry
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -15,9 +16,35 @@ logger = logging.getLogger("transcription-service")
 # Environment variables
 MODEL_ID = os.getenv("ASR_MODEL_ID", "Systran/faster-whisper-tiny")
 MODEL_PATH = Path(os.getenv("ASR_MODEL_PATH", "/models"))
-CHUNK_LENGTH = float(os.getenv("ASR_CHUNK_LENGTH", "5"))
-STRIDE_LENGTH = float(os.getenv("ASR_STRIDE_LENGTH", "1"))
+# auto picks CTranslate2 (faster-whisper) or transformers from the model's files
+ENGINE = os.getenv("ASR_ENGINE", "auto")
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# Models stay loaded until they have to make room under this budget; 0 = no limit
+MEMORY_BUDGET_MB = int(os.getenv("ASR_MEMORY_BUDGET_MB", "0"))
+# Extra short names for the `model` form field, e.g. "fast=Systran/faster-whisper-tiny,best=..."
+MODEL_ALIASES = os.getenv("ASR_MODEL_ALIASES", "")
+# Full model IDs clients may request besides the aliases
+ALLOWED_MODELS = [m.strip() for m in os.getenv("ASR_ALLOWED_MODELS", "").split(",") if m.strip()]
+
+
+def parse_aliases(value):
+    aliases = dict(DEFAULT_ALIASES)
+    for item in value.split(","):
+        name, _, model_id = item.partition("=")
+        if name.strip() and model_id.strip():
+            aliases[name.strip()] = model_id.strip()
+    return aliases
+
+
+registry = ModelRegistry(
+    MODEL_PATH,
+    device=DEVICE,
+    engine=ENGINE,
+    budget_bytes=MEMORY_BUDGET_MB * 1024 * 1024,
+    default_model=MODEL_ID,
+    aliases=parse_aliases(MODEL_ALIASES),
+    allowed=ALLOWED_MODELS,
+)
 
 app = FastAPI(title="Transcription Service")
 
@@ -30,62 +57,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the transcription model
+# Load the default model up front; others load on first request
 @app.on_event("startup")
 async def startup_event():
-    global transcriber
-    
     try:
-        # Check if model exists locally
-        model_dir = MODEL_PATH / MODEL_ID.replace("/", "_")
-        
-        if not model_dir.exists():
-            logger.info(f"Model not found locally, downloading {MODEL_ID}...")
-            model_dir = snapshot_download(
-                repo_id=MODEL_ID,
-                cache_dir=MODEL_PATH,
-                local_dir=model_dir,
-                local_dir_use_symlinks=False
-            )
-        else:
-            logger.info(f"Using locally available model: {model_dir}")
-        
         logger.info(f"Initializing transcriber with device: {DEVICE}")
-        transcriber = pipeline(
-            "automatic-speech-recognition",
-            model=model_dir,
-            device=DEVICE,
-            chunk_length_s=CHUNK_LENGTH,
-            stride_length_s=STRIDE_LENGTH
-        )
-        logger.info("Transcription model successfully loaded")
+        with registry.use() as transcriber:
+            logger.info(f"Transcription model successfully loaded ({transcriber.name} engine)")
         
     except Exception as e:
         logger.error(f"Model initialization failed: {str(e)}")
         raise
 
+
+def transcribe_with(model, content):
+    with registry.use(model) as transcriber:
+        return transcriber.transcribe(content)
+
+
 @app.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(file: UploadFile = File(...), model: Optional[str] = Form(None)):
     if not file:
         raise HTTPException(status_code=400, detail="No audio file provided")
+    try:
+        registry.resolve(model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file_path = temp_file.name
-            content = await file.read()
-            temp_file.write(content)
-        
-        logger.info(f"Processing audio file: {file.filename}")
+        # Engines decode straight from memory; no temporary file
+        content = await file.read()
         
-        # Perform transcription
-        result = transcriber(temp_file_path)
+        logger.info(f"Processing audio file: {file.filename} (model: {model or MODEL_ID})")
         
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
+        # Perform transcription (and any model load) off the event loop
+        start_time = time.time()
+        text = await asyncio.to_thread(transcribe_with, model, content)
+        logger.info(f"Transcription took {time.time() - start_time:.2f}s")
         
         # Return the transcription result
-        return {"text": result["text"] if isinstance(result, dict) else result[0]["text"]}
+        return {"text": text}
         
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
@@ -93,4 +104,13 @@ async def transcribe_audio(file: UploadFile = File(...)):
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model": MODEL_ID}
\ No newline at end of file
+    stats = registry.stats
+    return {
+        "status": "healthy",
+        "model": registry.default_model,
+        "resident_models": {model_id: info["engine"] for model_id, info in stats["resident"].items()},
+    }
+
+@app.get("/metrics")
+async def metrics():
+    return registry.stats
@@ -1,13 +1,16 @@
 import torch
 from transformers import pipeline
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File
 import uvicorn
 import numpy as np
+import asyncio
 import base64
 import logging
+import time
 import wave
 import io
 import os
+from streaming_asr import LocalAgreementStreamer, join_words
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("transcription-service")
@@ -20,6 +23,9 @@ DEVICE = 0 if torch.cuda.is_available() else "cpu"
 CHUNK_LENGTH = int(os.getenv("ASR_CHUNK_LENGTH", 5))
 STRIDE_LENGTH = int(os.getenv("ASR_STRIDE_LENGTH", 1))
 SAMPLE_RATE = 16000
+# Streaming: re-transcribe after this much new audio, never hold more than this uncommitted
+STREAM_MIN_CHUNK_S = float(os.getenv("ASR_STREAM_MIN_CHUNK_S", 1.0))
+STREAM_MAX_WINDOW_S = float(os.getenv("ASR_STREAM_MAX_WINDOW_S", 15.0))
 
 logger.info(f"Initializing ASR model: {MODEL_ID}")
 
@@ -39,29 +45,72 @@ except Exception as e:
 async def health_check():
     return {"status": "healthy", "model": MODEL_ID}
 
+def transcribe_words(audio):
+    """Words with timestamps (seconds, relative to ``audio``) for the streaming window."""
+    start_time = time.time()
+    result = transcriber(
+        {"raw": np.array(audio), "sampling_rate": SAMPLE_RATE},
+        return_timestamps="word",
+    )
+    elapsed = time.time() - start_time
+    logger.debug(f"Streaming pass: {len(audio) / SAMPLE_RATE:.1f}s window in {elapsed:.2f}s")
+    return [
+        (chunk["timestamp"][0], chunk["timestamp"][1], chunk["text"])
+        for chunk in result.get("chunks", [])
+    ]
+
+async def send_results(websocket, committed, partial):
+    if committed:
+        await websocket.send_json({
+            "type": "final",
+            "text": join_words(committed),
+            "start": committed[0][0],
+            "end": committed[-1][1],
+        })
+    await websocket.send_json({"type": "partial", "text": join_words(partial)})
+
 @app.websocket("/ws/transcribe")
 async def websocket_transcription(websocket: WebSocket):
+    """
+    Streams 16 kHz mono int16 PCM in binary messages. Replies with JSON:
+    ``{"type": "final", ...}`` for text that will not change any more and
+    ``{"type": "partial", "text": ...}`` for the current unstable tail.
+    Send the text message ``EOS`` to flush the rest of an utterance as final.
+    """
     await websocket.accept()
     logger.info("New WebSocket connection")
     
-    audio_buffer = []
+    streamer = LocalAgreementStreamer(
+        transcribe_words,
+        sample_rate=SAMPLE_RATE,
+        min_chunk_s=STREAM_MIN_CHUNK_S,
+        max_window_s=STREAM_MAX_WINDOW_S,
+    )
     try:
         while True:
-            data = await websocket.receive_bytes()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
             
-            # Convert bytes to numpy array
-            audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
-            audio_buffer.append(audio)
-            
-            if len(audio_buffer) >= 3:  # Process every 3 chunks
-                combined = np.concatenate(audio_buffer)
-                result = transcriber(combined, sampling_rate=SAMPLE_RATE)
-                await websocket.send_text(result["text"])
-                audio_buffer = [audio_buffer[-1]]  # Keep last chunk for context
+            if message.get("bytes") is not None:
+                # Convert bytes to numpy array
+                audio = np.frombuffer(message["bytes"], dtype=np.int16).astype(np.float32) / 32768.0
+                streamer.insert_audio(audio)
                 
+                if streamer.ready():
+                    committed, partial = await asyncio.to_thread(streamer.process)
+                    await send_results(websocket, committed, partial)
+            
+            elif (message.get("text") or "").strip().upper() == "EOS":
+                committed = await asyncio.to_thread(streamer.finish)
+                await send_results(websocket, committed, [])
+    
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
         await websocket.close(code=1011)
+    logger.info("WebSocket connection closed")
 
 @app.post("/transcribe")
 async def batch_transcription(file: UploadFile = File(...)):
@@ -0,0 +1,187 @@
+"""
+One-time audio ingest for uploaded recordings.
+
+Browsers upload whatever MediaRecorder produced (usually WebM/Opus, often
+labelled ``.wav``). Instead of keeping that file and decoding/resampling it
+again for every transcription and retranscription, each upload is converted
+once to 16 kHz mono:
+
+- a compact copy (FLAC by default, or Ogg/Opus) replaces the original and is
+  what ``/api/audio/{id}`` serves for playback;
+- the model-ready float32 samples are cached as ``.npy`` under ``cache/`` and
+  memory-mapped on use, so later transcriptions skip preprocessing entirely.
+
+The sample cache is bounded by a byte budget (least recently used files are
+evicted first); a miss rebuilds it from the compact copy, which is already
+16 kHz mono and only needs decoding.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from math import gcd
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+
+# format name -> (soundfile format, subtype, extension, media type)
+STORAGE_FORMATS = {
+    "flac": ("FLAC", "PCM_16", ".flac", "audio/flac"),
+    "opus": ("OGG", "OPUS", ".ogg", "audio/ogg"),
+}
+
+MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".webm": "audio/webm",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+}
+
+
+def media_type_for(filename: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(filename)[1].lower(), "application/octet-stream")
+
+
+def _decode_ffmpeg(path: str) -> np.ndarray:
+    """Decode, downmix and resample in a single ffmpeg pass straight into float32."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+            "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "f32le", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg could not decode {path}: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32).copy()
+
+
+def _decode_soundfile(path: str) -> np.ndarray:
+    audio, sr = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != TARGET_SAMPLE_RATE:
+        from scipy.signal import resample_poly
+
+        g = gcd(sr, TARGET_SAMPLE_RATE)
+        audio = resample_poly(audio, TARGET_SAMPLE_RATE // g, sr // g).astype(np.float32)
+    return audio
+
+
+def decode_audio(path: str) -> np.ndarray:
+    """Any supported upload -> 16 kHz mono float32."""
+    try:
+        # libsndfile handles WAV/FLAC/Ogg in-process without spawning ffmpeg
+        return _decode_soundfile(path)
+    except RuntimeError:  # soundfile's LibsndfileError
+        if shutil.which("ffmpeg") is None:
+            raise ValueError(f"Unsupported audio format for {path} (ffmpeg not installed)")
+        return _decode_ffmpeg(path)
+
+
+class AudioIngest:
+    def __init__(self, audio_dir: str, storage_format: str = "flac", cache_max_bytes: int = 512 * 1024 * 1024):
+        if storage_format not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format '{storage_format}', expected one of {list(STORAGE_FORMATS)}")
+        self.audio_dir = audio_dir
+        self.storage_format = storage_format
+        self.cache_dir = os.path.join(audio_dir, "cache")
+        self.cache_max_bytes = cache_max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, recording_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{recording_id}.npy")
+
+    def ingest(self, src_path: str, recording_id: str) -> dict:
+        """
+        Convert an upload once: write the compact copy and the sample cache,
+        then delete the original. Returns fields to merge into the record.
+        """
+        audio = decode_audio(src_path)
+        if audio.size == 0:
+            raise ValueError("Uploaded audio contains no samples")
+
+        src_size = os.path.getsize(src_path)
+        sf_format, subtype, extension, _ = STORAGE_FORMATS[self.storage_format]
+        filename = f"{recording_id}{extension}"
+        dst_path = os.path.join(self.audio_dir, filename)
+        sf.write(dst_path, audio, TARGET_SAMPLE_RATE, format=sf_format, subtype=subtype)
+        self._write_cache(recording_id, audio)
+
+        if os.path.abspath(src_path) != os.path.abspath(dst_path):
+            os.remove(src_path)
+        logger.info(
+            f"Ingested {recording_id}: {src_size / 1024:.0f} KiB upload -> "
+            f"{os.path.getsize(dst_path) / 1024:.0f} KiB {self.storage_format}"
+        )
+        return {
+            "filename": filename,
+            "duration": round(audio.size / TARGET_SAMPLE_RATE, 3),
+        }
+
+    def load(self, recording: dict) -> np.ndarray:
+        """
+        Model-ready 16 kHz mono float32 samples for a recording, memory-mapped
+        read-only from the cache. Rebuilt from the stored audio on a miss.
+        """
+        path = self.cache_path(recording["id"])
+        try:
+            audio = np.load(path, mmap_mode="r")
+            os.utime(path)  # Mark as recently used for eviction
+            return audio
+        except (FileNotFoundError, ValueError):
+            pass
+        source = os.path.join(self.audio_dir, recording["filename"])
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Audio file not found: {source}")
+        # Recordings from before ingest existed still hold the raw upload; decode_audio covers both
+        self._write_cache(recording["id"], decode_audio(source))
+        return np.load(path, mmap_mode="r")
+
+    def drop_cache(self, recording_id: str):
+        """Delete a recording's cached samples (the stored audio is left alone)."""
+        try:
+            os.remove(self.cache_path(recording_id))
+        except FileNotFoundError:
+            pass
+
+    def cache_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".npy"))
+
+    def _write_cache(self, recording_id: str, audio: np.ndarray):
+        path = self.cache_path(recording_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(audio, dtype=np.float32))
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop least recently used cache files until the cache fits its budget."""
+        with self._lock:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.name.endswith(".npy") and entry.path != keep
+            ]
+            total = sum(entry.stat().st_size for entry in entries)
+            if keep is not None and os.path.exists(keep):
+                total += os.path.getsize(keep)
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                if total <= self.cache_max_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
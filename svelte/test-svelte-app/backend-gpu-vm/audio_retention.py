@@ -0,0 +1,139 @@
+"""
+Disk budget for stored recordings.
+
+``audio_files/`` used to grow forever. The retention manager periodically
+(and after each upload) adds up the stored audio and, while it is over
+budget, evicts the oldest recordings first. With ``keep_transcripts`` the
+record and its transcription stay and only the audio is removed (the record
+is marked ``audio_evicted``); otherwise the whole recording is deleted.
+Recordings still waiting for or undergoing transcription are never evicted.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+from recording_events import STATUS_QUEUED, STATUS_TRANSCRIBING
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRetention:
+    def __init__(
+        self,
+        recordings,
+        audio_dir: str,
+        max_bytes: int,
+        keep_transcripts: bool = True,
+        interval: float = 300.0,
+        on_evicted: Optional[Callable[[dict, bool], None]] = None,
+    ):
+        """
+        Args:
+            recordings: The RecordingStore holding recording metadata.
+            audio_dir: Directory the recordings' ``filename`` is relative to.
+            max_bytes: Disk budget for stored audio; 0 disables eviction.
+            keep_transcripts: Keep evicted records (without audio) instead of deleting them.
+            interval: Seconds between background checks.
+            on_evicted: Called with (record, deleted) after each eviction.
+        """
+        self.recordings = recordings
+        self.audio_dir = audio_dir
+        self.max_bytes = max_bytes
+        self.keep_transcripts = keep_transcripts
+        self.interval = interval
+        self.on_evicted = on_evicted
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+        self._lock = threading.Lock()
+        self._task = None
+
+    def _audio_size(self, rec: dict) -> int:
+        if rec.get("audio_evicted"):
+            return 0
+        try:
+            return os.path.getsize(os.path.join(self.audio_dir, rec["filename"]))
+        except OSError:
+            return 0
+
+    def usage(self) -> int:
+        return sum(self._audio_size(rec) for rec in self.recordings.all())
+
+    def enforce(self) -> List[str]:
+        """Evict oldest recordings until stored audio fits the budget. Returns evicted IDs."""
+        if self.max_bytes <= 0:
+            return []
+        evicted = []
+        with self._lock:
+            records = self.recordings.all()  # Oldest first
+            sizes = {rec["id"]: self._audio_size(rec) for rec in records}
+            total = sum(sizes.values())
+            for rec in records:
+                if total <= self.max_bytes:
+                    break
+                size = sizes[rec["id"]]
+                if size == 0 or rec.get("status") in (STATUS_QUEUED, STATUS_TRANSCRIBING):
+                    continue
+                try:
+                    os.remove(os.path.join(self.audio_dir, rec["filename"]))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"Could not evict audio for {rec['id']}: {e}")
+                    continue
+                total -= size
+                self.evicted_count += 1
+                self.evicted_bytes += size
+                evicted.append(rec["id"])
+
+                if self.keep_transcripts:
+                    updated = self.recordings.update(rec["id"], audio_evicted=True)
+                    deleted = False
+                else:
+                    updated = self.recordings.delete(rec["id"])
+                    deleted = True
+                if updated is not None and self.on_evicted is not None:
+                    self.on_evicted(updated, deleted)
+
+        if evicted:
+            logger.info(
+                f"Retention evicted audio for {len(evicted)} recording(s); "
+                f"{total / 1024 / 1024:.1f} MB of {self.max_bytes / 1024 / 1024:.1f} MB used"
+            )
+        return evicted
+
+    async def enforce_async(self) -> List[str]:
+        return await asyncio.to_thread(self.enforce)
+
+    def start(self):
+        """Start the periodic check. Must be called from the running event loop."""
+        if self.max_bytes > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Audio retention: {self.max_bytes / 1024 / 1024:.0f} MB budget, "
+                f"{'keeping' if self.keep_transcripts else 'deleting'} transcripts of evicted recordings"
+            )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.enforce_async()
+            except Exception as e:
+                logger.error(f"Retention check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "max_bytes": self.max_bytes,
+            "keep_transcripts": self.keep_transcripts,
+            "evicted_count": self.evicted_count,
+            "evicted_bytes": self.evicted_bytes,
+        }
@@ -0,0 +1,123 @@
+"""
+Byte-range audio responses for recording playback.
+
+``FileResponse`` always sent the whole file with no validators, so every
+seek in the browser's <audio> element re-downloaded the recording. This
+serves single ``Range: bytes=...`` requests with 206 Partial Content, and
+answers conditional requests (``If-None-Match`` / ``If-Modified-Since``,
+``If-Range``) from an ETag and Last-Modified derived from the file's size
+and mtime. Stored audio never changes once ingested, so clients may cache it.
+"""
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+CACHE_CONTROL = "private, max-age=3600"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range into inclusive (start, end). Returns None for
+    anything we don't serve partially (multiple ranges, other units, garbage);
+    raises ValueError when the range can't be satisfied.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def audio_file_response(request: Request, path: str, media_type: str, filename: Optional[str] = None) -> Response:
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range validator means the client's partial copy is outdated: send everything
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status,
+        headers=headers,
+        media_type=media_type,
+    )
@@ -1,15 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 import shutil
-import time
 from datetime import datetime
 import asyncio
 import logging
 from transcriber_transformers import GraniteTranscriber
+from recording_store import RecordingStore
+from recording_sync import list_recordings
+from recording_events import RecordingEvents, STATUS_QUEUED, STATUS_TRANSCRIBING, STATUS_DONE, STATUS_ERROR
+from transcription_queue import TranscriptionQueue, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from audio_ingest import AudioIngest, media_type_for
+from audio_streaming import audio_file_response
+from audio_retention import AudioRetention
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,7 +41,12 @@ class AudioRecording(BaseModel):
     filename: str
     duration: Optional[float] = None
     transcription: Optional[str] = None
+    status: Optional[str] = STATUS_QUEUED
     persona: Optional[str] = "veterinary_radiologist"
+    persona_transcriptions: Optional[Dict[str, str]] = None
+
+class PersonaComparison(BaseModel):
+    personas: List[str]
 
 items = [
     {"name": "Item 1", "value": "Value 1"},
@@ -47,8 +57,26 @@ items = [
 AUDIO_DIR = "audio_files"
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
-# Store audio metadata
-recordings = []
+# Store audio metadata (SQLite-backed, indexed by recording ID)
+RECORDINGS_DB = os.environ.get("RECORDINGS_DB", os.path.join(AUDIO_DIR, "recordings.db"))
+recordings = RecordingStore(RECORDINGS_DB)
+
+# Uploads are converted once to 16 kHz mono; transcriptions read the cached samples
+audio_ingest = AudioIngest(
+    AUDIO_DIR,
+    storage_format=os.environ.get("AUDIO_STORAGE_FORMAT", "flac"),
+    cache_max_bytes=int(os.environ.get("AUDIO_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Push channel for status changes (see /ws/recordings)
+events = RecordingEvents()
+
+def update_recording(recording_id, **fields):
+    """Persist changes to a recording and push them to connected clients."""
+    recording = recordings.update(recording_id, **fields)
+    if recording is not None:
+        events.recording_changed(recording)
+    return recording
 
 # Initialize Granite transcriber
 transcriber = None
@@ -71,6 +99,12 @@ async def startup_event():
     logger.info("Starting up application...")
     # Run in a separate thread to avoid blocking startup
     asyncio.create_task(async_initialize_transcriber())
+    # Start the worker pool and resume jobs interrupted by the last shutdown
+    transcription_queue.start()
+    audio_retention.start()
+    for rec in recordings.all():
+        if rec.get("status") in (STATUS_QUEUED, STATUS_TRANSCRIBING):
+            transcription_queue.submit(rec["id"], priority=PRIORITY_BACKGROUND)
 
 async def async_initialize_transcriber():
     try:
@@ -80,7 +114,7 @@ async def async_initialize_transcriber():
     except Exception as e:
         logger.error(f"Error during transcriber initialization: {e}")
 
-async def transcribe_audio(file_path, persona="veterinary_radiologist"):
+async def transcribe_audio(audio, persona="veterinary_radiologist"):
     if transcriber is None:
         logger.info("Transcriber not yet initialized, initializing now...")
         await asyncio.to_thread(initialize_transcriber)
@@ -89,7 +123,7 @@ async def transcribe_audio(file_path, persona="veterinary_radiologist"):
         # Run transcription in a thread pool to avoid blocking
         result = await asyncio.to_thread(
             transcriber.transcribe, 
-            file_path, 
+            audio, 
             persona=persona
         )
         return result
@@ -97,6 +131,22 @@ async def transcribe_audio(file_path, persona="veterinary_radiologist"):
         logger.error(f"Transcription error: {e}")
         raise
 
+async def transcribe_audio_personas(audio, personas):
+    if transcriber is None:
+        logger.info("Transcriber not yet initialized, initializing now...")
+        await asyncio.to_thread(initialize_transcriber)
+    
+    try:
+        # One decode + encoder pass shared by every persona prompt
+        return await asyncio.to_thread(
+            transcriber.transcribe_personas,
+            audio,
+            personas
+        )
+    except Exception as e:
+        logger.error(f"Transcription error: {e}")
+        raise
+
 @app.get("/")
 def read_root():
     return {"message": "Hello from Granite Speech FastAPI!", "status": "running"}
@@ -106,6 +156,8 @@ def health_check():
     return {
         "status": "healthy",
         "transcriber_ready": transcriber is not None,
+        "transcription_queue": transcription_queue.stats,
+        "audio_retention": audio_retention.stats,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -133,7 +185,7 @@ async def upload_audio(
 ):
     # Generate timestamp and filename
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    recording_id = f"rec_{int(time.time())}"
+    recording_id = recordings.new_id()
     file_extension = os.path.splitext(file.filename)[1] if file.filename else ".wav"
     filename = f"{recording_id}{file_extension}"
     
@@ -147,6 +199,17 @@ async def upload_audio(
         logger.error(f"Error saving audio file: {e}")
         raise HTTPException(status_code=500, detail="Failed to save audio file")
     
+    # Convert once: compact 16 kHz mono copy for playback plus cached model-ready samples
+    try:
+        ingested = await asyncio.to_thread(audio_ingest.ingest, file_path, recording_id)
+    except Exception as e:
+        logger.error(f"Error ingesting audio file: {e}")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+    filename = ingested["filename"]
+    duration = ingested["duration"]
+    
     # Transcribe the audio asynchronously
     transcription = "Transcribing..." # Initial state
     
@@ -160,67 +223,124 @@ async def upload_audio(
         persona=persona
     )
     
-    # Add to recordings list
-    recordings.append(recording.dict())
+    # Add to recordings store
+    events.recording_changed(recordings.add(recording.dict()))
+    
+    # Queue transcription; interactive uploads go ahead of background work
+    queue_position = transcription_queue.submit(recording_id, priority=PRIORITY_INTERACTIVE)
     
-    # Start async transcription
-    asyncio.create_task(update_transcription(recording_id, file_path, persona))
+    # Keep stored audio within its disk budget
+    asyncio.create_task(audio_retention.enforce_async())
     
-    return {"status": "success", "recording": recording.dict()}
+    return {"status": "success", "recording": recording.dict(), "queue_position": queue_position}
 
-async def update_transcription(recording_id, file_path, persona="veterinary_radiologist"):
+async def update_transcription(recording_id: str):
+    """Worker-pool handler: transcribes one recording and stores the result."""
+    rec = recordings.get(recording_id)
+    if rec is None:
+        return  # Deleted before a worker picked it up
+    persona = rec.get("persona") or "veterinary_radiologist"
+    pending_personas = rec.get("pending_personas")
     try:
+        update_recording(recording_id, status=STATUS_TRANSCRIBING)
+        # Memory-mapped samples from ingest; no decoding or resampling
+        audio = await asyncio.to_thread(audio_ingest.load, rec)
+        if pending_personas:
+            # The recording's own persona rides along; the extra batch row is cheap
+            personas = list(dict.fromkeys([persona, *pending_personas]))
+            logger.info(f"Starting transcription for {recording_id} with personas {personas}")
+            results = await transcribe_audio_personas(audio, personas)
+            # Personas requested while this job ran stay pending for the rerun
+            current = recordings.get(recording_id) or {}
+            remaining = [p for p in current.get("pending_personas") or [] if p not in personas]
+            fields = {
+                "persona_transcriptions": {**(current.get("persona_transcriptions") or {}), **results},
+                "pending_personas": remaining or None,
+                "status": STATUS_DONE,
+            }
+            if persona in results:
+                fields["transcription"] = results[persona]
+            if update_recording(recording_id, **fields) is not None:
+                logger.info(f"Persona transcriptions completed for {recording_id}")
+            return
+        
         logger.info(f"Starting transcription for {recording_id} with persona {persona}")
         # Perform actual transcription
-        transcription = await transcribe_audio(file_path, persona=persona)
+        transcription = await transcribe_audio(audio, persona=persona)
         
         # Update recording with transcription
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = transcription
-                logger.info(f"Transcription completed for {recording_id}")
-                break
+        if update_recording(recording_id, transcription=transcription, status=STATUS_DONE) is not None:
+            logger.info(f"Transcription completed for {recording_id}")
     except Exception as e:
         # Handle errors
         error_message = f"Transcription error: {str(e)}"
         logger.error(error_message)
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = error_message
-                break
+        update_recording(recording_id, transcription=error_message, status=STATUS_ERROR, pending_personas=None)
+
+# Fixed-size pool of transcription workers
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "1"))
+transcription_queue = TranscriptionQueue(
+    update_transcription,
+    num_workers=TRANSCRIPTION_WORKERS,
+    on_positions=events.queue_changed,
+)
+
+def on_audio_evicted(rec, deleted):
+    audio_ingest.drop_cache(rec["id"])
+    if deleted:
+        events.recording_deleted(rec["id"])
+    else:
+        events.recording_changed(rec)
+
+# Disk budget for stored audio (0 = unlimited); oldest recordings are evicted first
+audio_retention = AudioRetention(
+    recordings,
+    AUDIO_DIR,
+    max_bytes=int(os.environ.get("AUDIO_DISK_BUDGET_MB", "0")) * 1024 * 1024,
+    keep_transcripts=os.environ.get("RETENTION_KEEP_TRANSCRIPTS", "true").lower() not in ("0", "false", "no"),
+    interval=float(os.environ.get("RETENTION_INTERVAL_S", "300")),
+    on_evicted=on_audio_evicted,
+)
 
 @app.get("/api/audio")
-def get_recordings():
-    return {"recordings": recordings}
-
-@app.get("/api/audio/{recording_id}")
-def get_audio_file(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            file_path = os.path.join(AUDIO_DIR, rec["filename"])
-            if os.path.exists(file_path):
-                return FileResponse(
-                    path=file_path, 
-                    media_type="audio/wav", 
-                    filename=rec["filename"]
-                )
+def get_recordings(
+    request: Request,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """List recordings: everything, a newest-first page (limit/cursor), or changes since a version"""
+    return list_recordings(recordings, request, since=since, limit=limit, cursor=cursor)
+
+@app.api_route("/api/audio/{recording_id}", methods=["GET", "HEAD"])
+def get_audio_file(recording_id: str, request: Request):
+    """Stream a recording's audio; supports Range requests and ETag/Last-Modified revalidation"""
+    rec = recordings.get(recording_id)
+    if rec:
+        if rec.get("audio_evicted"):
+            raise HTTPException(status_code=410, detail="Audio removed by the retention policy; the transcript is still available")
+        file_path = os.path.join(AUDIO_DIR, rec["filename"])
+        if os.path.exists(file_path):
+            return audio_file_response(
+                request,
+                file_path,
+                media_type=media_type_for(rec["filename"]),
+                filename=rec["filename"],
+            )
     
     raise HTTPException(status_code=404, detail="Recording not found")
 
 @app.delete("/api/audio/{recording_id}")
 def delete_recording(recording_id: str):
     """Delete a specific recording and its file"""
-    global recordings
-    
-    # Find the recording
-    recording_to_delete = None
-    for i, rec in enumerate(recordings):
-        if rec["id"] == recording_id:
-            recording_to_delete = recordings.pop(i)
-            break
+    # Remove the recording from the store
+    recording_to_delete = recordings.delete(recording_id)
     
     if not recording_to_delete:
         raise HTTPException(status_code=404, detail="Recording not found")
+    transcription_queue.cancel(recording_id)
+    events.recording_deleted(recording_id)
+    audio_ingest.drop_cache(recording_id)
     
     # Delete the physical file
     file_path = os.path.join(AUDIO_DIR, recording_to_delete["filename"])
@@ -230,20 +350,20 @@ def delete_recording(recording_id: str):
             logger.info(f"Deleted file: {file_path}")
         except OSError as e:
             logger.error(f"Error deleting file {file_path}: {e}")
-            # Don't raise an error here since we already removed from recordings list
+            # Don't raise an error here since we already removed the record from the store
     
     return {"status": "success", "message": f"Recording {recording_id} deleted"}
 
 @app.delete("/api/audio")
 def clear_all_recordings():
     """Delete all recordings and their files"""
-    global recordings
-    
     deleted_count = 0
     failed_deletes = []
     
-    # Delete all physical files
-    for rec in recordings:
+    # Remove every record from the store, then delete their files
+    removed = recordings.clear()
+    for rec in removed:
+        audio_ingest.drop_cache(rec["id"])
         file_path = os.path.join(AUDIO_DIR, rec["filename"])
         if os.path.exists(file_path):
             try:
@@ -254,9 +374,9 @@ def clear_all_recordings():
                 logger.error(f"Error deleting file {file_path}: {e}")
                 failed_deletes.append(rec["filename"])
     
-    # Clear the recordings list
-    recordings_count = len(recordings)
-    recordings.clear()
+    recordings_count = len(removed)
+    transcription_queue.cancel_all()
+    events.recordings_cleared()
     
     if failed_deletes:
         return {
@@ -270,36 +390,70 @@ def clear_all_recordings():
             "message": f"Successfully cleared {recordings_count} recordings and deleted {deleted_count} files"
         }
 
+@app.websocket("/ws/recordings")
+async def recording_events_ws(websocket: WebSocket):
+    """Pushes recording status changes (queued, transcribing, done, error) and final text."""
+    await events.stream(websocket)
+
 @app.get("/api/transcription/{recording_id}")
 def get_transcription(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            return {"transcription": rec.get("transcription", "Not available")}
+    rec = recordings.get(recording_id)
+    if rec:
+        return {
+            "transcription": rec.get("transcription", "Not available"),
+            "status": rec.get("status"),
+            "persona_transcriptions": rec.get("persona_transcriptions") or {},
+            "queue_position": transcription_queue.position(recording_id),
+        }
     
     raise HTTPException(status_code=404, detail="Recording not found")
 
 @app.post("/api/transcription/{recording_id}/retranscribe")
 async def retranscribe(recording_id: str, persona: str = "veterinary_radiologist"):
     """Retranscribe a recording with a different persona"""
-    # Find the recording
-    recording = None
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            recording = rec
-            break
+    rec = recordings.get(recording_id)
+    if rec and rec.get("audio_evicted"):
+        raise HTTPException(status_code=410, detail="Audio removed by the retention policy")
+    
+    # Update persona and reset transcription
+    recording = update_recording(recording_id, persona=persona, transcription="Retranscribing...", status=STATUS_QUEUED)
     
     if not recording:
         raise HTTPException(status_code=404, detail="Recording not found")
     
-    # Update persona and reset transcription
-    recording["persona"] = persona
-    recording["transcription"] = "Retranscribing..."
+    # Queue transcription behind interactive uploads
+    queue_position = transcription_queue.submit(recording_id, priority=PRIORITY_BACKGROUND)
     
-    # Start transcription
-    file_path = os.path.join(AUDIO_DIR, recording["filename"])
-    asyncio.create_task(update_transcription(recording_id, file_path, persona))
+    return {"status": "success", "message": "Retranscription queued", "queue_position": queue_position}
+
+@app.post("/api/transcription/{recording_id}/personas")
+async def transcribe_personas(recording_id: str, request: PersonaComparison):
+    """Transcribe a recording under several personas in one job (audio is encoded once)"""
+    if not request.personas:
+        raise HTTPException(status_code=400, detail="At least one persona is required")
+    if transcriber is not None:
+        unknown = [p for p in request.personas if p not in transcriber.personas]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown personas: {', '.join(unknown)}")
     
-    return {"status": "success", "message": "Retranscription started"}
+    rec = recordings.get(recording_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if rec.get("audio_evicted"):
+        raise HTTPException(status_code=410, detail="Audio removed by the retention policy")
+    
+    # Merge with personas still waiting from an earlier request
+    personas = list(dict.fromkeys([*(rec.get("pending_personas") or []), *request.personas]))
+    update_recording(recording_id, pending_personas=personas, status=STATUS_QUEUED)
+    
+    queue_position = transcription_queue.submit(recording_id, priority=PRIORITY_BACKGROUND)
+    
+    return {
+        "status": "success",
+        "message": f"Transcription queued for {len(personas)} personas",
+        "personas": personas,
+        "queue_position": queue_position,
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,87 @@
+"""
+Paginated and delta-synced listing for ``GET /api/audio``.
+
+Returning every recording on every call made the payload grow with history.
+Clients can now page through recordings newest-first with an opaque cursor,
+or ask only for what changed since the store version they last saw. Every
+response's ETag combines that version with the query, so asking again for an
+unchanged page costs a 304.
+"""
+import base64
+import hashlib
+import json
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(record: dict) -> str:
+    raw = json.dumps([record["created_at"], record["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, recording_id = json.loads(raw)
+        return float(created_at), str(recording_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def list_recordings(
+    store,
+    request: Request,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Response:
+    """
+    - no parameters: every recording, oldest first (what older clients expect);
+    - ``since``: records changed and IDs deleted after that version, oldest
+      change first; ``reset`` is set when the client is too far behind and
+      gets the full list instead;
+    - ``limit`` (+ ``cursor``): newest-first page and the ``next_cursor`` to
+      continue from. With ``since``, ``limit`` caps the number of changes and
+      ``has_more`` says whether to call again with the returned ``version``.
+    """
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    # Validated before the ETag check: a bad cursor is a 400, never a 304
+    before = decode_cursor(cursor) if cursor else None
+
+    version = store.version
+    etag = f'"v{version}"'
+    if since is not None or limit is not None:
+        # Different pages or deltas of the same version must not share a tag
+        query = json.dumps([since, limit, list(before) if before and since is None else None])
+        etag = f'"v{version}-{hashlib.sha1(query.encode()).hexdigest()[:12]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if since is not None:
+        body = store.changes(since, limit=limit)
+        if body is None:
+            body = {"recordings": store.all(), "deleted": [], "version": version, "has_more": False, "reset": True}
+    elif limit is not None:
+        page = store.page(limit, before=before)
+        body = {
+            "recordings": page,
+            "version": version,
+            "next_cursor": encode_cursor(page[-1]) if len(page) == limit else None,
+        }
+    else:
+        body = {"recordings": store.all(), "version": version}
+    return JSONResponse(body, headers=headers)
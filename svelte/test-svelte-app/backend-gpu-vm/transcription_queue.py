@@ -0,0 +1,176 @@
+"""
+Bounded transcription worker pool.
+
+A fixed number of asyncio workers pull recording IDs from a priority queue
+and run the transcription handler, so uploads can't pile up unbounded
+``asyncio.to_thread`` calls against one model. Interactive uploads jump
+ahead of retranscriptions and recovered jobs, deleting a recording cancels
+its pending job, and clients can ask for (or are pushed) their position.
+
+The queue itself only holds IDs; the job state (status, persona, file) lives
+in the recording store, which is what makes it survive restarts: on startup
+every recording still marked queued/transcribing is submitted again.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # Fresh uploads from the recorder UI
+PRIORITY_BACKGROUND = 10  # Retranscriptions and jobs recovered after a restart
+
+
+class TranscriptionQueue:
+    def __init__(
+        self,
+        handler: Callable[[str], Awaitable[None]],
+        num_workers: int = 1,
+        on_positions: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """
+        Args:
+            handler: Coroutine function that transcribes one recording by ID.
+            num_workers: Number of transcriptions allowed to run at once.
+            on_positions: Called with {recording_id: position} (1-based)
+                whenever the queue order changes.
+        """
+        self.handler = handler
+        self.num_workers = num_workers
+        self.on_positions = on_positions
+        self._heap: List[list] = []  # [priority, seq, recording_id, cancelled]
+        self._seq = itertools.count()
+        self._queued: Dict[str, list] = {}
+        self._running = set()
+        self._rerun = set()
+        self._jobs = None
+        self._loop = None
+        self._workers = []
+
+    def start(self):
+        """Start the workers. Must be called from the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._jobs = asyncio.Semaphore(len(self._queued))
+        self._workers = [
+            asyncio.create_task(self._worker(n)) for n in range(self.num_workers)
+        ]
+        logger.info(f"Started {self.num_workers} transcription worker(s)")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _on_loop(self, fn, *args):
+        """Run ``fn`` on the event loop; sync endpoints call us from a worker thread."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop or self._loop is None:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def submit(self, recording_id: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[int]:
+        """
+        Queue a recording for transcription and return its queue position.
+        A recording that is already running is transcribed again once it
+        finishes (its persona may have changed); returns None in that case.
+        """
+        if recording_id in self._running:
+            self._rerun.add(recording_id)
+            return None
+        entry = self._queued.get(recording_id)
+        if entry is not None and entry[0] <= priority:
+            return self.position(recording_id)
+        if entry is not None:
+            entry[3] = True  # Re-queue at the higher priority
+        entry = [priority, next(self._seq), recording_id, False]
+        heapq.heappush(self._heap, entry)
+        self._queued[recording_id] = entry
+        if self._jobs is not None:
+            self._jobs.release()
+        self._publish_positions()
+        return self.position(recording_id)
+
+    def cancel(self, recording_id: str):
+        """
+        Drop a recording's pending job. A transcription that is already
+        running can't be interrupted inside the model, but its result is
+        discarded because the record is gone from the store.
+        """
+        self._on_loop(self._cancel, recording_id)
+
+    def _cancel(self, recording_id: str):
+        self._rerun.discard(recording_id)
+        entry = self._queued.pop(recording_id, None)
+        if entry is not None:
+            entry[3] = True
+            logger.info(f"Cancelled queued transcription for {recording_id}")
+            self._publish_positions()
+
+    def cancel_all(self):
+        self._on_loop(self._cancel_all)
+
+    def _cancel_all(self):
+        for entry in self._queued.values():
+            entry[3] = True
+        self._queued.clear()
+        self._rerun.clear()
+        self._publish_positions()
+
+    def positions(self) -> Dict[str, int]:
+        ordered = sorted(entry for entry in self._queued.values())
+        return {entry[2]: n + 1 for n, entry in enumerate(ordered)}
+
+    def position(self, recording_id: str) -> Optional[int]:
+        """1-based queue position, 0 while transcribing, None if not queued."""
+        if recording_id in self._running:
+            return 0
+        if recording_id not in self._queued:
+            return None
+        return self.positions()[recording_id]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "workers": self.num_workers,
+            "queued": len(self._queued),
+            "running": len(self._running),
+        }
+
+    def _publish_positions(self):
+        if self.on_positions is not None:
+            self.on_positions(self.positions())
+
+    def _pop(self) -> Optional[str]:
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if not entry[3]:
+                del self._queued[entry[2]]
+                return entry[2]
+        return None
+
+    async def _worker(self, n: int):
+        while True:
+            await self._jobs.acquire()
+            recording_id = self._pop()
+            if recording_id is None:
+                continue  # Job was cancelled after it was counted
+            self._running.add(recording_id)
+            self._publish_positions()
+            try:
+                await self.handler(recording_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {n} failed on {recording_id}: {e}")
+            finally:
+                self._running.discard(recording_id)
+            if recording_id in self._rerun:
+                self._rerun.discard(recording_id)
+                self.submit(recording_id, PRIORITY_BACKGROUND)
@@ -1,15 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 import shutil
-import time
 from datetime import datetime
 import asyncio
 import torch
 from transformers import pipeline
+from recording_store import RecordingStore
+from recording_sync import list_recordings
+from recording_events import RecordingEvents, STATUS_QUEUED, STATUS_TRANSCRIBING, STATUS_DONE, STATUS_ERROR
+from transcription_queue import TranscriptionQueue, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from audio_ingest import AudioIngest, TARGET_SAMPLE_RATE, media_type_for
+from audio_streaming import audio_file_response
+from audio_retention import AudioRetention
 
 app = FastAPI()
 
@@ -32,6 +37,7 @@ class AudioRecording(BaseModel):
     filename: str
     duration: Optional[float] = None
     transcription: Optional[str] = None
+    status: Optional[str] = STATUS_QUEUED
 
 items = [
     {"name": "Item 1", "value": "Value 1"},
@@ -42,8 +48,26 @@ items = [
 AUDIO_DIR = "audio_files"
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
-# Store audio metadata
-recordings = []
+# Store audio metadata (SQLite-backed, indexed by recording ID)
+RECORDINGS_DB = os.environ.get("RECORDINGS_DB", os.path.join(AUDIO_DIR, "recordings.db"))
+recordings = RecordingStore(RECORDINGS_DB)
+
+# Uploads are converted once to 16 kHz mono; transcriptions read the cached samples
+audio_ingest = AudioIngest(
+    AUDIO_DIR,
+    storage_format=os.environ.get("AUDIO_STORAGE_FORMAT", "flac"),
+    cache_max_bytes=int(os.environ.get("AUDIO_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Push channel for status changes (see /ws/recordings)
+events = RecordingEvents()
+
+def update_recording(recording_id, **fields):
+    """Persist changes to a recording and push them to connected clients."""
+    recording = recordings.update(recording_id, **fields)
+    if recording is not None:
+        events.recording_changed(recording)
+    return recording
 
 # Initialize ASR pipeline
 # Using whisper-small as it has good performance on Mac M1
@@ -65,18 +89,26 @@ def initialize_asr():
 async def startup_event():
     # Run in a separate thread to avoid blocking startup
     asyncio.create_task(async_initialize_asr())
+    # Start the worker pool and resume jobs interrupted by the last shutdown
+    transcription_queue.start()
+    audio_retention.start()
+    for rec in recordings.all():
+        if rec.get("status") in (STATUS_QUEUED, STATUS_TRANSCRIBING):
+            transcription_queue.submit(rec["id"], priority=PRIORITY_BACKGROUND)
 
 async def async_initialize_asr():
     # Run the CPU-bound operation in a thread pool
     await asyncio.to_thread(initialize_asr)
 
-async def transcribe_audio(file_path):
+async def transcribe_audio(audio):
     if asr_pipeline is None:
         print("ASR model not yet initialized, initializing now...")
         await asyncio.to_thread(initialize_asr)
     
-    # Run transcription in a thread pool to avoid blocking
-    result = await asyncio.to_thread(asr_pipeline, file_path)
+    # Run transcription in a thread pool to avoid blocking; audio is already 16 kHz mono
+    result = await asyncio.to_thread(
+        asr_pipeline, {"raw": audio, "sampling_rate": TARGET_SAMPLE_RATE}
+    )
     return result["text"]
 
 @app.get("/")
@@ -96,7 +128,7 @@ def add_item(item: Item):
 async def upload_audio(file: UploadFile = File(...), duration: Optional[float] = None):
     # Generate timestamp and filename
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    recording_id = f"rec_{int(time.time())}"
+    recording_id = recordings.new_id()
     file_extension = os.path.splitext(file.filename)[1] if file.filename else ".wav"
     filename = f"{recording_id}{file_extension}"
     
@@ -104,6 +136,16 @@ async def upload_audio(file: UploadFile = File(...), duration: Optional[float] =
     file_path = os.path.join(AUDIO_DIR, filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+
+    # Convert once: compact 16 kHz mono copy for playback plus cached model-ready samples
+    try:
+        ingested = await asyncio.to_thread(audio_ingest.ingest, file_path, recording_id)
+    except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+    filename = ingested["filename"]
+    duration = ingested["duration"]
     
     # Transcribe the audio asynchronously
     transcription = "Transcribing..." # Initial state
@@ -117,64 +159,100 @@ async def upload_audio(file: UploadFile = File(...), duration: Optional[float] =
         transcription=transcription
     )
     
-    # Add to recordings list
-    recordings.append(recording.dict())
+    # Add to recordings store
+    events.recording_changed(recordings.add(recording.dict()))
     
-    # Start async transcription
-    asyncio.create_task(update_transcription(recording_id, file_path))
+    # Queue transcription; interactive uploads go ahead of background work
+    queue_position = transcription_queue.submit(recording_id, priority=PRIORITY_INTERACTIVE)
     
-    return {"status": "success", "recording": recording.dict()}
+    # Keep stored audio within its disk budget
+    asyncio.create_task(audio_retention.enforce_async())
+    
+    return {"status": "success", "recording": recording.dict(), "queue_position": queue_position}
 
-async def update_transcription(recording_id, file_path):
+async def update_transcription(recording_id: str):
+    """Worker-pool handler: transcribes one recording and stores the result."""
+    rec = recordings.get(recording_id)
+    if rec is None:
+        return  # Deleted before a worker picked it up
     try:
+        update_recording(recording_id, status=STATUS_TRANSCRIBING)
+        # Memory-mapped samples from ingest; no decoding or resampling
+        audio = await asyncio.to_thread(audio_ingest.load, rec)
         # Perform actual transcription
-        transcription = await transcribe_audio(file_path)
+        transcription = await transcribe_audio(audio)
         
         # Update recording with transcription
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = transcription
-                break
+        update_recording(recording_id, transcription=transcription, status=STATUS_DONE)
     except Exception as e:
         # Handle errors
         error_message = f"Transcription error: {str(e)}"
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = error_message
-                break
+        update_recording(recording_id, transcription=error_message, status=STATUS_ERROR)
+
+# Fixed-size pool of transcription workers
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "1"))
+transcription_queue = TranscriptionQueue(
+    update_transcription,
+    num_workers=TRANSCRIPTION_WORKERS,
+    on_positions=events.queue_changed,
+)
+
+def on_audio_evicted(rec, deleted):
+    audio_ingest.drop_cache(rec["id"])
+    if deleted:
+        events.recording_deleted(rec["id"])
+    else:
+        events.recording_changed(rec)
+
+# Disk budget for stored audio (0 = unlimited); oldest recordings are evicted first
+audio_retention = AudioRetention(
+    recordings,
+    AUDIO_DIR,
+    max_bytes=int(os.environ.get("AUDIO_DISK_BUDGET_MB", "0")) * 1024 * 1024,
+    keep_transcripts=os.environ.get("RETENTION_KEEP_TRANSCRIPTS", "true").lower() not in ("0", "false", "no"),
+    interval=float(os.environ.get("RETENTION_INTERVAL_S", "300")),
+    on_evicted=on_audio_evicted,
+)
 
 @app.get("/api/audio")
-def get_recordings():
-    return {"recordings": recordings}
-
-@app.get("/api/audio/{recording_id}")
-def get_audio_file(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            file_path = os.path.join(AUDIO_DIR, rec["filename"])
-            if os.path.exists(file_path):
-                return FileResponse(
-                    path=file_path, 
-                    media_type="audio/wav", 
-                    filename=rec["filename"]
-                )
+def get_recordings(
+    request: Request,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """List recordings: everything, a newest-first page (limit/cursor), or changes since a version"""
+    return list_recordings(recordings, request, since=since, limit=limit, cursor=cursor)
+
+@app.api_route("/api/audio/{recording_id}", methods=["GET", "HEAD"])
+def get_audio_file(recording_id: str, request: Request):
+    """Stream a recording's audio; supports Range requests and ETag/Last-Modified revalidation"""
+    rec = recordings.get(recording_id)
+    if rec:
+        if rec.get("audio_evicted"):
+            raise HTTPException(status_code=410, detail="Audio removed by the retention policy; the transcript is still available")
+        file_path = os.path.join(AUDIO_DIR, rec["filename"])
+        if os.path.exists(file_path):
+            return audio_file_response(
+                request,
+                file_path,
+                media_type=media_type_for(rec["filename"]),
+                filename=rec["filename"],
+            )
     
     raise HTTPException(status_code=404, detail="Recording not found")
 
 @app.delete("/api/audio/{recording_id}")
 def delete_recording(recording_id: str):
     """Delete a specific recording and its file"""
-    global recordings
-    
-    # Find the recording
-    recording_to_delete = None
-    for i, rec in enumerate(recordings):
-        if rec["id"] == recording_id:
-            recording_to_delete = recordings.pop(i)
-            break
+    # Remove the recording from the store
+    recording_to_delete = recordings.delete(recording_id)
     
     if not recording_to_delete:
         raise HTTPException(status_code=404, detail="Recording not found")
+    transcription_queue.cancel(recording_id)
+    events.recording_deleted(recording_id)
+    audio_ingest.drop_cache(recording_id)
     
     # Delete the physical file
     file_path = os.path.join(AUDIO_DIR, recording_to_delete["filename"])
@@ -184,20 +262,20 @@ def delete_recording(recording_id: str):
             print(f"Deleted file: {file_path}")
         except OSError as e:
             print(f"Error deleting file {file_path}: {e}")
-            # Don't raise an error here since we already removed from recordings list
+            # Don't raise an error here since we already removed the record from the store
     
     return {"status": "success", "message": f"Recording {recording_id} deleted"}
 
 @app.delete("/api/audio")
 def clear_all_recordings():
     """Delete all recordings and their files"""
-    global recordings
-    
     deleted_count = 0
     failed_deletes = []
     
-    # Delete all physical files
-    for rec in recordings:
+    # Remove every record from the store, then delete their files
+    removed = recordings.clear()
+    for rec in removed:
+        audio_ingest.drop_cache(rec["id"])
         file_path = os.path.join(AUDIO_DIR, rec["filename"])
         if os.path.exists(file_path):
             try:
@@ -208,9 +286,9 @@ def clear_all_recordings():
                 print(f"Error deleting file {file_path}: {e}")
                 failed_deletes.append(rec["filename"])
     
-    # Clear the recordings list
-    recordings_count = len(recordings)
-    recordings.clear()
+    recordings_count = len(removed)
+    transcription_queue.cancel_all()
+    events.recordings_cleared()
     
     if failed_deletes:
         return {
@@ -224,10 +302,19 @@ def clear_all_recordings():
             "message": f"Successfully cleared {recordings_count} recordings and deleted {deleted_count} files"
         }
 
+@app.websocket("/ws/recordings")
+async def recording_events_ws(websocket: WebSocket):
+    """Pushes recording status changes (queued, transcribing, done, error) and final text."""
+    await events.stream(websocket)
+
 @app.get("/api/transcription/{recording_id}")
 def get_transcription(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            return {"transcription": rec.get("transcription", "Not available")}
+    rec = recordings.get(recording_id)
+    if rec:
+        return {
+            "transcription": rec.get("transcription", "Not available"),
+            "status": rec.get("status"),
+            "queue_position": transcription_queue.position(recording_id),
+        }
     
     raise HTTPException(status_code=404, detail="Recording not found")
\ No newline at end of file
@@ -1,15 +1,21 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 import shutil
-import time
 from datetime import datetime
 import asyncio
+import numpy as np
 import torch
 import nemo.collections.asr as nemo_asr
+from recording_store import RecordingStore
+from recording_sync import list_recordings
+from recording_events import RecordingEvents, STATUS_QUEUED, STATUS_TRANSCRIBING, STATUS_DONE, STATUS_ERROR
+from transcription_queue import TranscriptionQueue, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from audio_ingest import AudioIngest, TARGET_SAMPLE_RATE, media_type_for
+from audio_streaming import audio_file_response
+from audio_retention import AudioRetention
 
 app = FastAPI()
 
@@ -31,6 +37,7 @@ class AudioRecording(BaseModel):
     filename: str
     duration: Optional[float] = None
     transcription: Optional[str] = None
+    status: Optional[str] = STATUS_QUEUED
 
 items = [
     {"name": "Item 1", "value": "Value 1"},
@@ -40,7 +47,26 @@ items = [
 AUDIO_DIR = "audio_files"
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
-recordings = []
+# Store audio metadata (SQLite-backed, indexed by recording ID)
+RECORDINGS_DB = os.environ.get("RECORDINGS_DB", os.path.join(AUDIO_DIR, "recordings.db"))
+recordings = RecordingStore(RECORDINGS_DB)
+
+# Uploads are converted once to 16 kHz mono; transcriptions read the cached samples
+audio_ingest = AudioIngest(
+    AUDIO_DIR,
+    storage_format=os.environ.get("AUDIO_STORAGE_FORMAT", "flac"),
+    cache_max_bytes=int(os.environ.get("AUDIO_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Push channel for status changes (see /ws/recordings)
+events = RecordingEvents()
+
+def update_recording(recording_id, **fields):
+    """Persist changes to a recording and push them to connected clients."""
+    recording = recordings.update(recording_id, **fields)
+    if recording is not None:
+        events.recording_changed(recording)
+    return recording
 
 # Initialize ASR model (NVIDIA NeMo Parakeet)
 asr_model = None
@@ -69,11 +95,17 @@ def initialize_asr():
 @app.on_event("startup")
 async def startup_event():
     asyncio.create_task(async_initialize_asr())
+    # Start the worker pool and resume jobs interrupted by the last shutdown
+    transcription_queue.start()
+    audio_retention.start()
+    for rec in recordings.all():
+        if rec.get("status") in (STATUS_QUEUED, STATUS_TRANSCRIBING):
+            transcription_queue.submit(rec["id"], priority=PRIORITY_BACKGROUND)
 
 async def async_initialize_asr():
     await asyncio.to_thread(initialize_asr)
 
-async def transcribe_audio(file_path: str) -> str:
+async def transcribe_audio(audio) -> str:
     global asr_model 
     if asr_model is None:
         print("ASR model not yet initialized or initialization failed. Attempting to initialize now...")
@@ -84,11 +116,11 @@ async def transcribe_audio(file_path: str) -> str:
             print("ASR model could not be initialized. Transcription failed.")
             raise RuntimeError("ASR model is not available for transcription.")
     
-    print(f"Transcribing audio file: {file_path} using NVIDIA NeMo Parakeet...")
+    print(f"Transcribing {len(audio) / TARGET_SAMPLE_RATE:.1f}s of audio using NVIDIA NeMo Parakeet...")
     try:
-        # NeMo's transcribe method expects a list of file paths
+        # NeMo's transcribe method accepts a list of 16 kHz mono float32 arrays (NeMo >= 2.3)
         # It returns a list of ASRResult objects or just strings depending on configuration and version.
-        transcription_results = await asyncio.to_thread(asr_model.transcribe, [file_path])
+        transcription_results = await asyncio.to_thread(asr_model.transcribe, [np.asarray(audio)])
         
         if transcription_results and len(transcription_results) > 0:
             # The result for Parakeet should have a .text attribute if it's an ASRResult object.
@@ -99,12 +131,11 @@ async def transcribe_audio(file_path: str) -> str:
             return transcribed_text
         else:
             print("Transcription returned no results or an unexpected format.")
-            return "Transcription failed or produced no output."
+            raise RuntimeError("Transcription failed or produced no output.")
     except Exception as e:
         print(f"Error during transcription: {e}")
-        # Optionally, re-raise or return a specific error message
-        # For robustness, ensure asr_model is still valid or attempt re-initialization if appropriate
-        return f"Transcription error: {str(e)}"
+        # The caller records the recording as STATUS_ERROR with this message
+        raise
 
 
 # --- Endpoints ---
@@ -125,13 +156,23 @@ def add_item(item: Item):
 @app.post("/api/audio")
 async def upload_audio(file: UploadFile = File(...), duration: Optional[float] = None):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    recording_id = f"rec_{int(time.time())}"
+    recording_id = recordings.new_id()
     file_extension = os.path.splitext(file.filename)[1] if file.filename else ".wav"
     filename = f"{recording_id}{file_extension}"
     
     file_path = os.path.join(AUDIO_DIR, filename)
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+
+    # Convert once: compact 16 kHz mono copy for playback plus cached model-ready samples
+    try:
+        ingested = await asyncio.to_thread(audio_ingest.ingest, file_path, recording_id)
+    except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
+    filename = ingested["filename"]
+    duration = ingested["duration"]
     
     transcription = "Transcribing..." 
     
@@ -143,56 +184,94 @@ async def upload_audio(file: UploadFile = File(...), duration: Optional[float] =
         transcription=transcription
     )
     
-    recordings.append(recording.dict())
+    events.recording_changed(recordings.add(recording.dict()))
     
-    asyncio.create_task(update_transcription(recording_id, file_path))
+    # Queue transcription; interactive uploads go ahead of background work
+    queue_position = transcription_queue.submit(recording_id, priority=PRIORITY_INTERACTIVE)
     
-    return {"status": "success", "recording": recording.dict()}
+    # Keep stored audio within its disk budget
+    asyncio.create_task(audio_retention.enforce_async())
+    
+    return {"status": "success", "recording": recording.dict(), "queue_position": queue_position}
 
-async def update_transcription(recording_id: str, file_path: str):
+async def update_transcription(recording_id: str):
+    """Worker-pool handler: transcribes one recording and stores the result."""
+    rec = recordings.get(recording_id)
+    if rec is None:
+        return  # Deleted before a worker picked it up
     try:
-        transcription = await transcribe_audio(file_path)
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = transcription
-                print(f"Updated transcription for {recording_id}: {transcription[:100]}...")
-                break
+        update_recording(recording_id, status=STATUS_TRANSCRIBING)
+        # Memory-mapped samples from ingest; no decoding or resampling
+        audio = await asyncio.to_thread(audio_ingest.load, rec)
+        transcription = await transcribe_audio(audio)
+        if update_recording(recording_id, transcription=transcription, status=STATUS_DONE) is not None:
+            print(f"Updated transcription for {recording_id}: {transcription[:100]}...")
     except Exception as e:
         error_message = f"Transcription error: {str(e)}"
         print(f"Error updating transcription for {recording_id}: {e}")
-        for rec in recordings:
-            if rec["id"] == recording_id:
-                rec["transcription"] = error_message
-                break
+        update_recording(recording_id, transcription=error_message, status=STATUS_ERROR)
+
+# Fixed-size pool of transcription workers
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "1"))
+transcription_queue = TranscriptionQueue(
+    update_transcription,
+    num_workers=TRANSCRIPTION_WORKERS,
+    on_positions=events.queue_changed,
+)
+
+def on_audio_evicted(rec, deleted):
+    audio_ingest.drop_cache(rec["id"])
+    if deleted:
+        events.recording_deleted(rec["id"])
+    else:
+        events.recording_changed(rec)
+
+# Disk budget for stored audio (0 = unlimited); oldest recordings are evicted first
+audio_retention = AudioRetention(
+    recordings,
+    AUDIO_DIR,
+    max_bytes=int(os.environ.get("AUDIO_DISK_BUDGET_MB", "0")) * 1024 * 1024,
+    keep_transcripts=os.environ.get("RETENTION_KEEP_TRANSCRIPTS", "true").lower() not in ("0", "false", "no"),
+    interval=float(os.environ.get("RETENTION_INTERVAL_S", "300")),
+    on_evicted=on_audio_evicted,
+)
 
 @app.get("/api/audio")
-def get_recordings():
-    return {"recordings": recordings}
-
-@app.get("/api/audio/{recording_id}")
-def get_audio_file(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            file_path = os.path.join(AUDIO_DIR, rec["filename"])
-            if os.path.exists(file_path):
-                return FileResponse(
-                    path=file_path, 
-                    media_type="audio/wav", # Assuming WAV, Parakeet also supports FLAC
-                    filename=rec["filename"]
-                )
+def get_recordings(
+    request: Request,
+    since: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """List recordings: everything, a newest-first page (limit/cursor), or changes since a version"""
+    return list_recordings(recordings, request, since=since, limit=limit, cursor=cursor)
+
+@app.api_route("/api/audio/{recording_id}", methods=["GET", "HEAD"])
+def get_audio_file(recording_id: str, request: Request):
+    """Stream a recording's audio; supports Range requests and ETag/Last-Modified revalidation"""
+    rec = recordings.get(recording_id)
+    if rec:
+        if rec.get("audio_evicted"):
+            raise HTTPException(status_code=410, detail="Audio removed by the retention policy; the transcript is still available")
+        file_path = os.path.join(AUDIO_DIR, rec["filename"])
+        if os.path.exists(file_path):
+            return audio_file_response(
+                request,
+                file_path,
+                media_type=media_type_for(rec["filename"]),
+                filename=rec["filename"],
+            )
     raise HTTPException(status_code=404, detail="Recording not found")
 
 @app.delete("/api/audio/{recording_id}")
 def delete_recording(recording_id: str):
-    global recordings
-    recording_to_delete = None
-    for i, rec in enumerate(recordings):
-        if rec["id"] == recording_id:
-            recording_to_delete = recordings.pop(i)
-            break
+    recording_to_delete = recordings.delete(recording_id)
     
     if not recording_to_delete:
         raise HTTPException(status_code=404, detail="Recording not found")
+    transcription_queue.cancel(recording_id)
+    events.recording_deleted(recording_id)
+    audio_ingest.drop_cache(recording_id)
     
     file_path = os.path.join(AUDIO_DIR, recording_to_delete["filename"])
     if os.path.exists(file_path):
@@ -206,11 +285,13 @@ def delete_recording(recording_id: str):
 
 @app.delete("/api/audio")
 def clear_all_recordings():
-    global recordings
     deleted_count = 0
     failed_deletes = []
     
-    for rec in recordings:
+    # Remove every record from the store, then delete their files
+    removed = recordings.clear()
+    for rec in removed:
+        audio_ingest.drop_cache(rec["id"])
         file_path = os.path.join(AUDIO_DIR, rec["filename"])
         if os.path.exists(file_path):
             try:
@@ -220,8 +301,9 @@ def clear_all_recordings():
                 print(f"Error deleting file {file_path}: {e}")
                 failed_deletes.append(rec["filename"])
     
-    recordings_count = len(recordings)
-    recordings.clear()
+    recordings_count = len(removed)
+    transcription_queue.cancel_all()
+    events.recordings_cleared()
     
     if failed_deletes:
         return {
@@ -235,9 +317,18 @@ def clear_all_recordings():
             "message": f"Successfully cleared {recordings_count} recordings and deleted {deleted_count} files"
         }
 
+@app.websocket("/ws/recordings")
+async def recording_events_ws(websocket: WebSocket):
+    """Pushes recording status changes (queued, transcribing, done, error) and final text."""
+    await events.stream(websocket)
+
 @app.get("/api/transcription/{recording_id}")
 def get_transcription(recording_id: str):
-    for rec in recordings:
-        if rec["id"] == recording_id:
-            return {"transcription": rec.get("transcription", "Not available")}
+    rec = recordings.get(recording_id)
+    if rec:
+        return {
+            "transcription": rec.get("transcription", "Not available"),
+            "status": rec.get("status"),
+            "queue_position": transcription_queue.position(recording_id),
+        }
     raise HTTPException(status_code=404, detail="Recording not found")
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Push channel for recording status changes.
+
+Backends publish an event whenever a recording is queued, starts
+transcribing, finishes or fails (and when it is deleted); every connected
+WebSocket client receives it immediately, so the frontend no longer has to
+poll ``/api/audio`` or ``/api/transcription/{id}``.
+"""
+import asyncio
+import logging
+from typing import Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+# Transcription lifecycle of a recording
+STATUS_QUEUED = "queued"
+STATUS_TRANSCRIBING = "transcribing"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+class RecordingEvents:
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict):
+        """
+        Fan an event out to every subscriber. Safe to call from sync endpoints,
+        which FastAPI runs in a worker thread.
+        """
+        loop = self._loop
+        if loop is None:
+            return  # No client has ever connected
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._deliver(event)
+        else:
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Slow client: drop its oldest event rather than block everyone else.
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def recording_changed(self, recording: dict):
+        self.publish({"event": "recording", "recording": recording})
+
+    def recording_deleted(self, recording_id: str):
+        self.publish({"event": "deleted", "id": recording_id})
+
+    def recordings_cleared(self):
+        self.publish({"event": "cleared"})
+
+    def queue_changed(self, positions: dict):
+        """``positions`` maps each queued recording ID to its 1-based place in line."""
+        self.publish({"event": "queue", "positions": positions})
+
+    async def stream(self, websocket: WebSocket):
+        """Serve one WebSocket client until it disconnects."""
+        await websocket.accept()
+        queue = self.subscribe()
+        logger.info(f"Event client connected ({self.subscriber_count} total)")
+
+        async def sender():
+            while True:
+                await websocket.send_json(await queue.get())
+
+        async def receiver():
+            # Clients don't send anything meaningful; this only notices the disconnect.
+            while True:
+                await websocket.receive_text()
+
+        tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error and not isinstance(error, WebSocketDisconnect):
+                    logger.warning(f"Event client dropped: {error}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.unsubscribe(queue)
+            logger.info(f"Event client disconnected ({self.subscriber_count} total)")
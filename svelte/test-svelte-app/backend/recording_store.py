@@ -0,0 +1,250 @@
+"""
+Persistent recording metadata store for the FastAPI backends.
+
+Records are kept in an in-memory dict keyed by recording ID (O(1) lookups)
+and written through to SQLite in WAL mode, so the list survives restarts
+and readers never block the writer. Time-ordered pagination is served from
+an index on (created_at, id).
+
+Every write bumps a store-wide version number that is stamped on the record
+(deletions leave a tombstone with theirs), so clients can ask for only what
+changed since the version they last saw.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Tombstones kept for delta sync; clients older than that must resync fully
+MAX_TOMBSTONES = 10000
+
+
+class RecordingStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS recordings (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recordings_created ON recordings (created_at, id)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(recordings)")]
+        if "version" not in columns:
+            # Databases from before delta sync: number existing records in creation order
+            self._conn.execute("ALTER TABLE recordings ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            rows = self._conn.execute("SELECT id, data FROM recordings ORDER BY created_at, id").fetchall()
+            for version, (rec_id, data) in enumerate(rows, start=1):
+                record = {**json.loads(data), "version": version}
+                self._conn.execute(
+                    "UPDATE recordings SET version = ?, data = ? WHERE id = ?",
+                    (version, json.dumps(record), rec_id),
+                )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recordings_version ON recordings (version)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tombstones (
+                id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        self._index: Dict[str, dict] = {}
+        for rec_id, data in self._conn.execute("SELECT id, data FROM recordings"):
+            self._index[rec_id] = json.loads(data)
+
+        self._version = max(
+            self._conn.execute("SELECT COALESCE(MAX(version), 0) FROM recordings").fetchone()[0],
+            self._conn.execute("SELECT COALESCE(MAX(version), 0) FROM tombstones").fetchone()[0],
+            self._meta("version"),
+        )
+        # Changes at or below this version may be missing from the tombstones
+        self._horizon = self._meta("horizon")
+
+    def _meta(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, key: str, value: int):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    def _bury(self, recording_ids: List[str]):
+        """Record deletions for delta sync, pruning the oldest tombstones past the cap."""
+        for rec_id in recording_ids:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tombstones (id, version) VALUES (?, ?)",
+                (rec_id, self._next_version()),
+            )
+        # Remember the version even if the store ends up empty
+        self._set_meta("version", self._version)
+        excess = self._conn.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0] - MAX_TOMBSTONES
+        if excess > 0:
+            pruned = self._conn.execute(
+                "SELECT MAX(version) FROM (SELECT version FROM tombstones ORDER BY version LIMIT ?)",
+                (excess,),
+            ).fetchone()[0]
+            self._conn.execute("DELETE FROM tombstones WHERE version <= ?", (pruned,))
+            self._horizon = pruned
+            self._set_meta("horizon", pruned)
+
+    @property
+    def version(self) -> int:
+        """Store-wide version; changes whenever any record is added, updated or deleted."""
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, recording_id: str) -> bool:
+        return recording_id in self._index
+
+    def new_id(self) -> str:
+        """Time-prefixed ID with a random suffix; unique even for uploads in the same millisecond."""
+        with self._lock:
+            while True:
+                recording_id = f"rec_{int(time.time() * 1000)}_{secrets.token_hex(4)}"
+                if recording_id not in self._index:
+                    return recording_id
+
+    def add(self, record: dict) -> dict:
+        """Insert a new record. ``record['id']`` must come from ``new_id``."""
+        record = dict(record)
+        record.setdefault("created_at", time.time())
+        with self._lock:
+            if record["id"] in self._index:
+                raise KeyError(f"Recording {record['id']} already exists")
+            record["version"] = self._next_version()
+            self._conn.execute(
+                "INSERT INTO recordings (id, created_at, version, data) VALUES (?, ?, ?, ?)",
+                (record["id"], record["created_at"], record["version"], json.dumps(record)),
+            )
+            self._index[record["id"]] = record
+        return dict(record)
+
+    def get(self, recording_id: str) -> Optional[dict]:
+        record = self._index.get(recording_id)
+        return dict(record) if record is not None else None
+
+    def update(self, recording_id: str, **fields) -> Optional[dict]:
+        """Merge ``fields`` into a record and persist it. Returns None if the record is gone."""
+        with self._lock:
+            record = self._index.get(recording_id)
+            if record is None:
+                return None
+            updated = {**record, **fields, "version": self._next_version()}
+            self._conn.execute(
+                "UPDATE recordings SET version = ?, data = ? WHERE id = ?",
+                (updated["version"], json.dumps(updated), recording_id),
+            )
+            self._index[recording_id] = updated
+        return dict(updated)
+
+    def delete(self, recording_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._index.pop(recording_id, None)
+            if record is not None:
+                self._conn.execute("DELETE FROM recordings WHERE id = ?", (recording_id,))
+                self._bury([recording_id])
+        return record
+
+    def clear(self) -> List[dict]:
+        """Remove every record and return what was removed."""
+        with self._lock:
+            removed = list(self._index.values())
+            self._conn.execute("DELETE FROM recordings")
+            self._index.clear()
+            self._bury([rec["id"] for rec in removed])
+        return removed
+
+    def all(self) -> List[dict]:
+        """All records, oldest first."""
+        return sorted(self._index.values(), key=lambda r: (r["created_at"], r["id"]))
+
+    def page(self, limit: int = 50, before: Optional[Tuple[float, str]] = None) -> List[dict]:
+        """
+        Newest-first page of at most ``limit`` records. ``before`` is the
+        (created_at, id) of the last record of the previous page.
+        """
+        with self._lock:
+            if before is None:
+                rows = self._conn.execute(
+                    "SELECT id FROM recordings ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (limit,),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id FROM recordings WHERE (created_at, id) < (?, ?) "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (before[0], before[1], limit),
+                ).fetchall()
+        return [dict(self._index[rec_id]) for (rec_id,) in rows if rec_id in self._index]
+
+    def changes(self, since: int, limit: Optional[int] = None) -> Optional[dict]:
+        """
+        What changed after version ``since``, oldest change first:
+        ``{"recordings": [...], "deleted": [ids], "version": v, "has_more": bool}``.
+        ``version`` is what to pass as ``since`` next time; with ``limit`` it
+        stops at the last change returned. Returns None if deletions that old
+        were already pruned and the caller has to reload everything.
+        """
+        with self._lock:
+            if since < self._horizon:
+                return None
+            query = (
+                "SELECT id, version, 0 FROM recordings WHERE version > ? "
+                "UNION ALL SELECT id, version, 1 FROM tombstones WHERE version > ? "
+                "ORDER BY version"
+            )
+            params = [since, since]
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit + 1)
+            rows = self._conn.execute(query, params).fetchall()
+            current = self._version
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+        changed, deleted = [], []
+        for rec_id, _, is_tombstone in rows:
+            if is_tombstone:
+                if rec_id not in self._index:
+                    deleted.append(rec_id)
+            elif rec_id in self._index:
+                changed.append(dict(self._index[rec_id]))
+        return {
+            "recordings": changed,
+            "deleted": deleted,
+            "version": rows[-1][1] if has_more else current,
+            "has_more": has_more,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()